@@ -1,54 +1,127 @@
+import copyreg
+import inspect
 import pandas as pd
 import numpy as np
+from matrix_engine import PriceMatrix, Segments, wilder_rsi, positions_from_signal, run_matrix, rebalance_rows, top_n_mask
+from matrix_engine import bars, frame_bars
+import indicators
+from indicators import IndicatorCache
+from expressions import Expr, Evaluator, as_signal, param, sma, rsi, roc, sign, where, vote
+from kernels import run_kernel, hysteresis_kernel, stops_kernel
+from costs import CostModel
+from portfolio import frame_portfolio_daily
+import perf
+
+# TradingStrategy methods every strategy's spans are recorded for (see perf)
+INSTRUMENTED_METHODS = ['compute_signals', 'compute_signals_matrix', 'compute_returns', 'run']
 
 class TradingStrategy():
     """Base class for all strategies"""
     name: str = "Unspecified strategy"
     description: str = ""
+    # signals depend on other tickers, so the universe can't be split into ticker blocks
+    cross_sectional: bool = False
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        perf.instrument(cls, INSTRUMENTED_METHODS)
 
-    def __init__(self,**kwargs):
+    def __init__(self, cost_model: CostModel = None, portfolio=None, **kwargs):
+        # trading costs netted out of strat_rtn into net_rtn (default frictionless)
+        self.cost_model = cost_model or CostModel()
+        # portfolio.PortfolioConstructor weighting the tickers (default equal weight each day)
+        self.portfolio = portfolio
         self.params = kwargs
 
     #abstract method
     def compute_signals(self, df: pd.DataFrame) -> pd.DataFrame:
         """
-        Main method: takes long-format df and returns df with at least 'signal' 
-        and 'pos' columns added.
+        Main method: takes long-format df (rows grouped by Ticker, in date order, as
+        wrangle_data returns it) and returns df with at least 'signal' and 'pos' columns
+        added. Per-ticker windows go through matrix_engine.Segments.
         """
         df['signal'] = 0
         df['pos'] = 0
         return df
 
+    def compute_signals_matrix(self, pm: PriceMatrix, cache: IndicatorCache = None, state: dict = None) -> dict[str, np.ndarray]:
+        """
+        Matrix-engine counterpart of compute_signals: takes a PriceMatrix and returns
+        (dates x tickers) arrays keyed by the column names compute_signals would add,
+        including at least 'signal' and 'pos'. Indicators come from the indicator layer
+        (`cache`, default the process-wide INDICATOR_CACHE).
+        Strategies with recursive indicators keep their per-ticker carry in `state`
+        (filled on a fresh run, resumed from when populated; see warmup_bars).
+        """
+        return {
+            'signal': np.zeros(pm.shape, dtype=np.int64),
+            'pos': np.zeros(pm.shape, dtype=np.int64),
+        }
+
+    def warmup_bars(self) -> int:
+        """
+        Trailing history rows compute_signals_matrix needs in front of new bars so that
+        the last history row and every new row come out exactly as in a full run.
+        None means the strategy can't be resumed and needs the full history.
+        """
+        return None
+
+    @classmethod
+    def param_defaults(cls) -> dict:
+        """{name: default} of the strategy's own parameters, i.e. not cost_model/portfolio."""
+        common = inspect.signature(TradingStrategy.__init__).parameters
+        return {
+            name: p.default
+            for name, p in inspect.signature(cls.__init__).parameters.items()
+            if p.default is not inspect.Parameter.empty and name not in common
+        }
+
+    @classmethod
+    def sweep_positions(cls, pm: PriceMatrix, params: pd.DataFrame, cache: IndicatorCache = None) -> np.ndarray:
+        """
+        Positions for a batch of configs (one row of `params` each) as a
+        (configs x dates x tickers) array. Subclasses override this to broadcast
+        over the parameter axis; the default just loops over the rows.
+        """
+        configs = params.to_dict('records') if len(params.columns) else [{}] * len(params)
+        return np.stack([cls(**config).compute_signals_matrix(pm, cache)['pos'] for config in configs])
+
     def compute_returns(self, df: pd.DataFrame) -> pd.DataFrame:
         """
-        Computes per-stock returns + strategy returns, then adds equal-weighted portfolio cumulative.
+        Computes per-stock returns + strategy returns (gross, plus turnover and net of
+        self.cost_model), then adds the portfolio cumulative (self.portfolio weights,
+        default equal weight).
         Assumes df has 'Close', 'pos' (from signals), and 'Ticker' column.
         """
         df = df.copy()
+        seg = Segments.from_frame(df)
     
-        df['returns'] = df.groupby('Ticker')['Close'].pct_change()
+        df['returns'] = seg.pct_change(df['Close'])
         df['strat_rtn'] = df['pos'] * df['returns']
+        # costs from position changes within each ticker (flat before its first bar)
+        df['turnover'] = np.abs(df['pos'] - seg.shift(df['pos'], 1, fill=0.0))
+        df['net_rtn'] = df['strat_rtn'] - self.cost_model.costs(df['turnover'].to_numpy())
     
         # 3. Per-stock cumulative strategy return (optional, but useful for comparison)
-        df['cumulative_rtn'] = (
-            (1 + df['strat_rtn'])
-            .groupby(df['Ticker'])
-            .cumprod()
-            .fillna(1)
-            )
+        df['cumulative_rtn'] = seg.cumprod(1 + df['strat_rtn'])
+        df['cumulative_rtn'] = df['cumulative_rtn'].fillna(1)
         
         # 4. Portfolio-level: equal-weighted average daily strat return per date
         #    (this is the key step for combined portfolio)
-        port_daily_ret = (
-            df.pivot_table(
-                index='Date',
-                columns='Ticker',
-                values='strat_rtn',
-                aggfunc='mean'          # equal weight = average across stocks
+        if self.portfolio is not None:
+            # other weightings need the dates x tickers returns (see portfolio)
+            port_daily_ret = frame_portfolio_daily(df, self.portfolio)
+        else:
+            port_daily_ret = (
+                df.pivot_table(
+                    index='Date',
+                    columns='Ticker',
+                    values='strat_rtn',
+                    aggfunc='mean'          # equal weight = average across stocks
+                )
+                .mean(axis=1)               # final portfolio daily return
+                .rename('portfolio_daily_ret')
             )
-            .mean(axis=1)               # final portfolio daily return
-            .rename('portfolio_daily_ret')
-        )
     
         # 5. Portfolio cumulative return (starts at 1)
         port_cum = (1 + port_daily_ret).cumprod().rename('port_cumulative_rtn')
@@ -63,13 +136,19 @@ class TradingStrategy():
     
         return df
 
-    def run(self, df: pd.DataFrame) -> pd.DataFrame:
+    def run(self, df: pd.DataFrame, engine: str = "pandas") -> pd.DataFrame:
         """
         Combines signals and returns in chain.
+        engine="matrix" runs the dense dates x tickers path (no pivot/merge) and
+        returns the same long-format columns.
         """
+        if engine == "matrix":
+            return run_matrix(self, df)
         df = self.compute_signals(df)
         return self.compute_returns(df)
     
+perf.instrument(TradingStrategy, INSTRUMENTED_METHODS)
+
 class BuyAndHold(TradingStrategy):
     name = "Buy & Hold"
     description = "Passive benchmark - always long"
@@ -78,6 +157,18 @@ class BuyAndHold(TradingStrategy):
         df['signal'] = 1
         df['pos'] = 1
         return df
+
+    def compute_signals_matrix(self, pm: PriceMatrix, cache: IndicatorCache = None, state: dict = None) -> dict[str, np.ndarray]:
+        # long on a ticker's own bars only, so it doesn't trade before listing
+        held = pm.present.astype(np.int64)
+        return {
+            'signal': held,
+            'pos': held.copy(),
+        }
+
+    def warmup_bars(self) -> int:
+        # previous close for the first new return
+        return 1
     
 class MovingAverageCrossover(TradingStrategy):
     name = "MA Crossover"
@@ -89,30 +180,53 @@ class MovingAverageCrossover(TradingStrategy):
         self.long_win = long_win
 
     def compute_signals(self, df: pd.DataFrame) -> pd.DataFrame:
-        # vectorized
-        df['short_ma'] = (
-            df.groupby('Ticker')['Close']
-              .rolling(self.short_win, min_periods=self.short_win)
-              .mean()
-              .reset_index(level=0, drop=True)  # drop Ticker level from index
-        )
-        
-        df['long_ma'] = (
-            df.groupby('Ticker')['Close']
-              .rolling(self.long_win, min_periods=self.long_win)
-              .mean()
-              .reset_index(level=0, drop=True)
-        )
+        # vectorized, one pass over all tickers
+        seg = Segments.from_frame(df)
+        df['short_ma'] = seg.rolling_mean(df['Close'], frame_bars(self.short_win, df))
+        df['long_ma'] = seg.rolling_mean(df['Close'], frame_bars(self.long_win, df))
         
         df['signal'] = 0
         df.loc[df['short_ma'] > df['long_ma'], 'signal'] = 1
         df.loc[df['short_ma'] < df['long_ma'], 'signal'] = -1
         
-        # Position still needs groupby shift (this one is unavoidable and fast)
-        df['pos'] = df.groupby('Ticker')['signal'].shift(1).fillna(0)
+        # trade on the next bar
+        df['pos'] = seg.shift(df['signal'], 1, fill=0.0)
         
         return df
 
+    def compute_signals_matrix(self, pm: PriceMatrix, cache: IndicatorCache = None, state: dict = None) -> dict[str, np.ndarray]:
+        short_ma = indicators.sma(pm, self.short_win, cache)
+        long_ma = indicators.sma(pm, self.long_win, cache)
+        signal = np.zeros(pm.shape, dtype=np.int64)
+        signal[short_ma > long_ma] = 1
+        signal[short_ma < long_ma] = -1
+        return {
+            'short_ma': short_ma,
+            'long_ma': long_ma,
+            'signal': signal,
+            'pos': positions_from_signal(signal, pm.present),
+        }
+
+    def warmup_bars(self) -> int:
+        # windows given as time spans depend on the bars, so they need the full history
+        if not all(isinstance(w, (int, np.integer)) for w in (self.short_win, self.long_win)):
+            return None
+        return max(self.short_win, self.long_win)
+
+    @classmethod
+    def sweep_positions(cls, pm: PriceMatrix, params: pd.DataFrame, cache: IndicatorCache = None) -> np.ndarray:
+        # windows in bars first: a grid may mix bar counts and time spans ('2h', 3)
+        short_win = np.array([bars(w, pm.dates) for w in params['short_win']])
+        long_win = np.array([bars(w, pm.dates) for w in params['long_win']])
+        # one rolling mean per distinct window, then compare across the parameter axis
+        windows = np.unique(np.concatenate([short_win, long_win]))
+        mas = np.stack([indicators.sma(pm, w, cache) for w in windows])
+        spread = mas[np.searchsorted(windows, short_win)]
+        spread -= mas[np.searchsorted(windows, long_win)]
+        # sign of the spread is the signal; NaN (window not yet full) means flat
+        signal = np.nan_to_num(np.sign(spread, out=spread), copy=False)
+        return positions_from_signal(signal, pm.present)
+
 class RSIMeanReversion(TradingStrategy):
     name = "RSI Oversold/Overbought"
     description = "Classic mean-reversion"
@@ -124,29 +238,56 @@ class RSIMeanReversion(TradingStrategy):
         self.sell_level = sell_level
 
     def compute_signals(self, df: pd.DataFrame) -> pd.DataFrame:
-        delta = df.groupby('Ticker')['Close'].diff()
-        gain = delta.where(delta > 0, 0.0)
-        loss = -delta.where(delta< 0, 0.0)
-        avg_gain = gain.rolling(window = self.period, min_periods = self.period).mean()
-        avg_loss = loss.rolling(window = self.period, min_periods = self.period).mean()
-        #EMA smoothing
-        avg_gain = avg_gain.where(
-            avg_gain.isna(),
-            gain.ewm(com = self.period - 1, min_periods = self.period, adjust = False).mean()
-        )
-        avg_loss = avg_loss.where(
-            avg_loss.isna(),
-            loss.ewm(com = self.period - 1, min_periods = self.period, adjust = False).mean()
-        )
-        rs = avg_gain /avg_loss
+        # Wilder smoothing restarts at each ticker, so no ticker's RSI sees the previous one's tail
+        seg = Segments.from_frame(df)
+        delta = seg.diff(df['Close'].to_numpy(dtype=np.float64))
+        gain = np.where(delta > 0, delta, 0.0)
+        loss = np.where(delta < 0, -delta, 0.0)
+        #EMA smoothing (com = period - 1), NaN until `period` bars
+        period = frame_bars(self.period, df)
+        avg_gain = seg.ewm_mean(gain, 1.0 / period, min_periods=period)
+        avg_loss = seg.ewm_mean(loss, 1.0 / period, min_periods=period)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rs = avg_gain / avg_loss
         rsi = 100.0 - (100.0 / (1.0 + rs))
         df['rsi'] = rsi
         df['signal'] = 0
         df.loc[df['rsi'] < self.buy_level, 'signal'] = 1
         df.loc[df['rsi'] > self.sell_level, 'signal'] = -1
-        df['pos'] = df.groupby('Ticker')['signal'].shift(1).fillna(0)
+        df['pos'] = seg.shift(df['signal'], 1, fill=0.0)
         return df
 
+    def compute_signals_matrix(self, pm: PriceMatrix, cache: IndicatorCache = None, state: dict = None) -> dict[str, np.ndarray]:
+        # columns are tickers, so the smoothing never runs across a ticker boundary
+        if state is not None:
+            rsi = wilder_rsi(pm.close, pm.present, bars(self.period, pm.dates), state)
+        else:
+            rsi = indicators.wilder_rsi(pm, self.period, cache)
+        signal = np.zeros(pm.shape, dtype=np.int64)
+        signal[rsi < self.buy_level] = 1
+        signal[rsi > self.sell_level] = -1
+        return {
+            'rsi': rsi,
+            'signal': signal,
+            'pos': positions_from_signal(signal, pm.present),
+        }
+
+    def warmup_bars(self) -> int:
+        # Wilder averages live in `state`; only the previous close is needed
+        return 1
+
+    @classmethod
+    def sweep_positions(cls, pm: PriceMatrix, params: pd.DataFrame, cache: IndicatorCache = None) -> np.ndarray:
+        period = np.array([bars(p, pm.dates) for p in params['period']])
+        periods = np.unique(period)
+        rsis = np.stack([indicators.wilder_rsi(pm, p, cache) for p in periods])
+        rsi = rsis[np.searchsorted(periods, period)]
+        buy_level = params['buy_level'].to_numpy()[:, None, None]
+        sell_level = params['sell_level'].to_numpy()[:, None, None]
+        signal = np.where(rsi > sell_level, -1, 0)
+        signal[rsi < buy_level] = 1
+        return positions_from_signal(signal, pm.present)
+
 class TimeSeriesMomentum(TradingStrategy):
     name = "Momentum (ROC)"
     description = "Time-series momentum"
@@ -157,19 +298,289 @@ class TimeSeriesMomentum(TradingStrategy):
         self.threshold = threshold
 
     def compute_signals(self, df: pd.DataFrame) -> pd.DataFrame:
-        df['momentum'] = df.groupby('Ticker')['Close'].pct_change(periods = self.lookback)
+        seg = Segments.from_frame(df)
+        df['momentum'] = seg.pct_change(df['Close'], periods = frame_bars(self.lookback, df))
         df['signal'] = np.where(df['momentum'] > self.threshold, 1, 0)
-        df['pos'] = df.groupby('Ticker')['signal'].shift(1).fillna(0)
+        df['pos'] = seg.shift(df['signal'], 1, fill=0.0)
         return df
+
+    def compute_signals_matrix(self, pm: PriceMatrix, cache: IndicatorCache = None, state: dict = None) -> dict[str, np.ndarray]:
+        momentum = indicators.roc(pm, self.lookback, cache)
+        signal = np.where(momentum > self.threshold, 1, 0)
+        return {
+            'momentum': momentum,
+            'signal': signal,
+            'pos': positions_from_signal(signal, pm.present),
+        }
+
+    def warmup_bars(self) -> int:
+        if not isinstance(self.lookback, (int, np.integer)):
+            return None
+        return self.lookback + 1
+
+    @classmethod
+    def sweep_positions(cls, pm: PriceMatrix, params: pd.DataFrame, cache: IndicatorCache = None) -> np.ndarray:
+        lookback = np.array([bars(n, pm.dates) for n in params['lookback']])
+        lookbacks = np.unique(lookback)
+        rocs = np.stack([indicators.roc(pm, n, cache) for n in lookbacks])
+        momentum = rocs[np.searchsorted(lookbacks, lookback)]
+        signal = np.where(momentum > params['threshold'].to_numpy()[:, None, None], 1, 0)
+        return positions_from_signal(signal, pm.present)
     
+class CrossSectionalMomentum(TradingStrategy):
+    name = "Cross-sectional Momentum"
+    description = "Hold the top-N tickers by ROC, re-ranked at the start of each rebalance period"
+    cross_sectional = True
+
+    def __init__(self, lookback: int = 126, top_n: int = 3, rebalance_freq: str = 'M', **kwargs):
+        super().__init__(**kwargs)
+        self.lookback = lookback
+        self.top_n = top_n
+        self.rebalance_freq = rebalance_freq
+
+    def compute_signals(self, df: pd.DataFrame) -> pd.DataFrame:
+        # ranks across tickers, so go through the matrix and scatter back
+        pm = PriceMatrix.from_long(df)
+        for col, arr in self.compute_signals_matrix(pm).items():
+            df[col] = pm.to_long(arr)
+        return df
+
+    def compute_signals_matrix(self, pm: PriceMatrix, cache: IndicatorCache = None, state: dict = None) -> dict[str, np.ndarray]:
+        momentum = indicators.roc(pm, self.lookback, cache)
+        rebalance = rebalance_rows(pm.dates, self.rebalance_freq)
+        # rank only on rebalance rows, then each row holds its latest selection
+        selected = top_n_mask(momentum[rebalance], self.top_n)
+        signal = selected[np.cumsum(rebalance) - 1].astype(np.int64)
+        return {
+            'momentum': momentum,
+            'signal': signal,
+            'pos': positions_from_signal(signal, pm.present),
+        }
+
+class KernelStrategy(TradingStrategy):
+    """
+    Base for path-dependent strategies whose signal is a per-bar state machine
+    (see kernels.run_kernel): subclasses set `kernel` and `n_state` and supply the
+    kernel's input matrices and parameters. Runs compiled when numba is installed.
+    """
+    kernel = None
+    n_state: int = 0
+
+    def kernel_inputs(self, pm: PriceMatrix, cache: IndicatorCache = None) -> dict[str, np.ndarray]:
+        """
+        Named (dates x tickers) inputs, passed to the kernel in this order and
+        returned as extra columns (except Close, which the frame already has).
+        """
+        raise NotImplementedError
+
+    def kernel_params(self) -> tuple:
+        raise NotImplementedError
+
+    def compute_signals(self, df: pd.DataFrame) -> pd.DataFrame:
+        # no whole-column pandas form, so go through the matrix and scatter back
+        pm = PriceMatrix.from_long(df)
+        for col, arr in self.compute_signals_matrix(pm).items():
+            df[col] = pm.to_long(arr)
+        return df
+
+    def compute_signals_matrix(self, pm: PriceMatrix, cache: IndicatorCache = None, state: dict = None) -> dict[str, np.ndarray]:
+        inputs = self.kernel_inputs(pm, cache)
+        signal = run_kernel(type(self).kernel, tuple(inputs.values()), self.kernel_params(), self.n_state)
+        signal = signal.astype(np.int64)
+        return {
+            **{col: arr for col, arr in inputs.items() if col != 'Close'},
+            'signal': signal,
+            'pos': positions_from_signal(signal, pm.present),
+        }
+
+class RSIHysteresis(KernelStrategy):
+    name = "RSI Hysteresis"
+    description = "Mean-reversion that holds each side until RSI crosses the opposite level"
+    kernel = staticmethod(hysteresis_kernel)
+    n_state = 1
+
+    def __init__(self, period: int = 14, buy_level: int = 30, sell_level: int = 70, **kwargs):
+        super().__init__(**kwargs)
+        self.period = period
+        self.buy_level = buy_level
+        self.sell_level = sell_level
+
+    def kernel_inputs(self, pm: PriceMatrix, cache: IndicatorCache = None) -> dict[str, np.ndarray]:
+        return {'rsi': indicators.wilder_rsi(pm, self.period, cache)}
+
+    def kernel_params(self) -> tuple:
+        return (self.buy_level, self.sell_level)
+
+class MACrossoverStops(KernelStrategy):
+    name = "MA Crossover + Stops"
+    description = "MA crossover with stop-loss, trailing stop and holding-period limits"
+    kernel = staticmethod(stops_kernel)
+    n_state = 5
+
+    def __init__(self, short_win: int = 50, long_win: int = 200, stop_loss: float = 0.1,
+                 trailing_stop: float = 0.0, min_hold: int = 0, max_hold: int = 0, **kwargs):
+        super().__init__(**kwargs)
+        self.short_win = short_win
+        self.long_win = long_win
+        self.stop_loss = stop_loss
+        self.trailing_stop = trailing_stop
+        self.min_hold = min_hold
+        self.max_hold = max_hold
+
+    def kernel_inputs(self, pm: PriceMatrix, cache: IndicatorCache = None) -> dict[str, np.ndarray]:
+        short_ma = indicators.sma(pm, self.short_win, cache)
+        long_ma = indicators.sma(pm, self.long_win, cache)
+        # crossover signal the stops are applied to
+        raw = np.nan_to_num(np.sign(short_ma - long_ma))
+        return {'Close': pm.close, 'raw_signal': raw}
+
+    def kernel_params(self) -> tuple:
+        return (self.stop_loss, self.trailing_stop, self.min_hold, self.max_hold)
+
+class CompositeStrategy(TradingStrategy):
+    """
+    Strategy whose signal is an expression over indicators (see expressions): its value
+    per bar, booleans as 1/0 and NaN as flat, traded on the next bar. The expression's
+    param() leaves are the strategy's parameters. Use CompositeStrategy(template=...)
+    directly, or register_composite for a named, registered strategy class.
+    """
+    name = "Composite"
+    description = "Signal expression over indicators"
+    # the class's expression, with param() leaves for its parameters
+    template: Expr = None
+
+    def __init__(self, template: Expr = None, **kwargs):
+        template = type(self).template if template is None else template
+        values = {name: kwargs.pop(name, default) for name, default in template.params().items()}
+        super().__init__(**kwargs)
+        for name, value in values.items():
+            setattr(self, name, value)
+        self.expr = template.bind(values)
+
+    def compute_signals(self, df: pd.DataFrame) -> pd.DataFrame:
+        # the expression evaluates on the matrix, so go through it and scatter back
+        pm = PriceMatrix.from_long(df)
+        for col, arr in self.compute_signals_matrix(pm).items():
+            df[col] = pm.to_long(arr)
+        return df
+
+    def compute_signals_matrix(self, pm: PriceMatrix, cache: IndicatorCache = None, state: dict = None) -> dict[str, np.ndarray]:
+        return composite_signals({None: self}, pm, cache)[None]
+
+    def warmup_bars(self) -> int:
+        return self.expr.warmup()
+
+    @classmethod
+    def sweep_positions(cls, pm: PriceMatrix, params: pd.DataFrame, cache: IndicatorCache = None) -> np.ndarray:
+        # every config's expression in one batch, so the subexpressions they share run once
+        configs = params.to_dict('records') if len(params.columns) else [{}] * len(params)
+        signals = Evaluator(pm, cache).evaluate([cls.template.bind(config) for config in configs])
+        return positions_from_signal(np.stack([as_signal(sig) for sig in signals]), pm.present)
+
+
+def composite_signals(strategies: dict, pm: PriceMatrix, cache: IndicatorCache = None) -> dict[str, dict[str, np.ndarray]]:
+    """
+    compute_signals_matrix of many CompositeStrategy instances at once: their
+    expressions are evaluated as one batch, so indicators and any other subexpressions
+    they have in common are computed once for all of them.
+    """
+    evaluator = Evaluator(pm, cache)
+    values = evaluator.evaluate([strat.expr for strat in strategies.values()])
+    out = {}
+    for name, value in zip(strategies, values):
+        signal = as_signal(value)
+        out[name] = {'signal': signal, 'pos': positions_from_signal(signal, pm.present)}
+    return out
+
+
+_COMPOSITE_CLASSES = {}
+
+
+class _CompositeClass(type):
+    # runtime composite classes aren't importable by name, so they pickle by template
+    # (see _reduce_composite_class), e.g. when parallel_sweep sends one to its workers
+    pass
+
+
+def _composite_class(template: Expr, name: str, description: str = "") -> type:
+    key = (template.key, name, description)
+    cls = _COMPOSITE_CLASSES.get(key)
+    if cls is None:
+        params = template.params()
+
+        def __init__(self, **kwargs):
+            CompositeStrategy.__init__(self, **kwargs)
+
+        # a signature listing the parameters, for param_grid and the service's defaults
+        __init__.__signature__ = inspect.Signature(
+            [inspect.Parameter('self', inspect.Parameter.POSITIONAL_OR_KEYWORD)]
+            + [inspect.Parameter(p, inspect.Parameter.KEYWORD_ONLY, default=d) for p, d in params.items()]
+            + [inspect.Parameter('kwargs', inspect.Parameter.VAR_KEYWORD)])
+        cls = _COMPOSITE_CLASSES[key] = _CompositeClass("CompositeStrategy", (CompositeStrategy,), {
+            '__init__': __init__, '__reduce__': _reduce_composite,
+            'template': template, 'name': name, 'description': description,
+        })
+    return cls
+
+
+def _composite_instance(template: Expr, name: str, description: str, state: dict) -> CompositeStrategy:
+    strategy = object.__new__(_composite_class(template, name, description))
+    strategy.__dict__.update(state)
+    return strategy
+
+
+def _reduce_composite(self):
+    # registered classes are made at runtime, so unpickling rebuilds the class from its template
+    cls = type(self)
+    return _composite_instance, (cls.template, cls.name, cls.description, vars(self))
+
+
+def _reduce_composite_class(cls):
+    return _composite_class, (cls.template, cls.name, cls.description)
+
+
+copyreg.pickle(_CompositeClass, _reduce_composite_class)
+
+
+def register_composite(key: str, template: Expr, name: str = None, description: str = "") -> type:
+    """
+    Register an expression as a strategy class under STRATEGY_REGISTRY[key], with its
+    param() leaves as __init__ parameters (so it works with get_strategy, sweeps,
+    precompute_signals and the service like any other strategy). Returns the class.
+    """
+    if key in STRATEGY_REGISTRY:
+        raise ValueError(f"Strategy {key!r} is already registered")
+    cls = _composite_class(template, name or key, description)
+    STRATEGY_REGISTRY[key] = cls
+    return cls
+
 STRATEGY_REGISTRY = {
     "buy_and_hold": BuyAndHold,
     "mavg": MovingAverageCrossover,
     "rsi": RSIMeanReversion,
     "momentum": TimeSeriesMomentum,
+    "xs_momentum": CrossSectionalMomentum,
+    "rsi_hysteresis": RSIHysteresis,
+    "mavg_stops": MACrossoverStops,
     # add more here later
 }
 
+register_composite(
+    "mavg_rsi_filter",
+    (sma(param('short_win', 50)) > sma(param('long_win', 200))) & (rsi(param('period', 14)) < param('max_rsi', 70)),
+    name="MA Crossover + RSI filter",
+    description="Long while the short MA is above the long MA, unless RSI is overbought",
+)
+register_composite(
+    "vote_mavg_rsi_momentum",
+    vote(sign(sma(param('short_win', 50)) - sma(param('long_win', 200))),
+         where(rsi(param('period', 14)) < param('buy_level', 30), 1,
+               where(rsi(param('period', 14)) > param('sell_level', 70), -1, 0)),
+         sign(roc(param('lookback', 126)))),
+    name="Vote: MA / RSI / Momentum",
+    description="Majority vote of the MA crossover, RSI and momentum signals",
+)
+
 def get_strategy(name: str, **params) -> TradingStrategy:
     "Factory function for clean entry point from Streamlit"
     strategy_class = STRATEGY_REGISTRY.get(name)
@@ -1,26 +1,38 @@
+import numpy as np
 import pandas as pd
+from pathlib import Path
+from price_store import DATA_DIR, PRICE_STORE, load_long, load_matrix
+from compact import to_compact
+from perf import timed
 
-def wrangle_data(selected_stocks: list[str]) -> pd.DataFrame:
-    all_data = []
+@timed('wrangle_data', rows=len)
+def wrangle_data(selected_stocks: list[str], columns: list[str] = None, compact: bool = False,
+                 rule: str = None, data_dir: Path = DATA_DIR, store: Path = PRICE_STORE,
+                 start=None, base: dict[str, float] = None) -> pd.DataFrame:
+    # one read from the memory-mapped price store (rebuilt whenever a data/*.csv changes),
+    # already sorted by Ticker then Date; `columns` (must include 'Close') skips the rest.
+    # Intraday data: data_dir/store = INTRADAY_DATA_DIR/INTRADAY_STORE, and `rule` (e.g. '1h')
+    # resamples the bars (see price_store.resample_store)
+    # `start` reads only the bars from that date on; with `base` (first_closes of the
+    # tickers) they come out normalized exactly as in the full history
+    combined = load_long(selected_stocks, columns, data_dir, store, rule, start)
     
-    for stock in selected_stocks:
-        df = pd.read_csv(f"data/{stock}.csv")
-        
-        # Sort just in case
-        df['Date'] = pd.to_datetime(df['Date'])
-        df = df.sort_values('Date')
-        
-        # Normalize
-        price_col = 'Close'
-        df[price_col] = pd.to_numeric(df[price_col], downcast='float')
-        df[price_col] = df[price_col] / df[price_col].iloc[0]
-        
-        df['Ticker'] = stock
-        all_data.append(df)
+    # Normalize
+    price_col = 'Close'
+    close = pd.to_numeric(combined[price_col], downcast='float')
+    first = close.groupby(combined['Ticker']).transform('first')
+    if base is not None:
+        # tickers without a stored first close list within the slice, so its first bar is theirs
+        first = combined['Ticker'].map(base).astype(close.dtype).fillna(first)
+    combined[price_col] = close / first
     
-    combined = pd.concat(all_data, ignore_index=True)
-    
-    # tidy index and confirm sort
-    combined = combined.sort_values(['Ticker', 'Date']).reset_index(drop=True)
-    
-    return combined
\ No newline at end of file
+    # opt-in compact schema (categorical Ticker, int32 day Date, ...); the matrix engine accepts it
+    return to_compact(combined) if compact else combined
+
+
+def first_closes(selected_stocks: list[str], data_dir: Path = DATA_DIR, store: Path = PRICE_STORE) -> dict[str, float]:
+    """Each ticker's first close, which wrangle_data normalizes by (NaN if it has no bars)."""
+    _, close = load_matrix(selected_stocks, 'Close', data_dir, store)
+    close = np.asarray(close)
+    first = close[np.argmax(~np.isnan(close), axis=0), np.arange(close.shape[1])]
+    return dict(zip(selected_stocks, first.tolist()))
@@ -0,0 +1,268 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from matrix_engine import PriceMatrix
+from signal_store import SIGNALS_PATH
+from metrics import periods_per_year, portfolio_sums, portfolio_metrics
+from perf import timed
+
+# per-strategy prefix sums next to the signals dataset (leading underscore: parquet readers skip it)
+AGGREGATES_PATH = SIGNALS_PATH / "_aggregates"
+META = "meta.json"
+TRADING_DAYS = 252
+# running sums kept per (date, ticker); row t holds the sum over dates before t
+PREFIXES = ['log', 'sum', 'sumsq', 'count']
+# per-date sums across every ticker with a return (see metrics.portfolio_sums): the equal-weight portfolio
+PORTFOLIO = ['port_sum', 'port_count', 'port_exposure', 'port_turnover']
+
+
+def prefix_rows(strat_rtn: np.ndarray, last: dict = None) -> dict[str, np.ndarray]:
+    # NaN (no return that day) adds nothing and isn't counted
+    valid = ~np.isnan(strat_rtn)
+    rtn = np.where(valid, strat_rtn, 0.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log = np.log1p(rtn)
+    rows = {
+        'log': np.cumsum(log, axis=0),
+        'sum': np.cumsum(rtn, axis=0),
+        'sumsq': np.cumsum(rtn * rtn, axis=0),
+        'count': np.cumsum(valid, axis=0, dtype=np.int64),
+    }
+    if last is not None:
+        for kind in PREFIXES:
+            rows[kind] += last[kind]
+    return rows
+
+
+def _save_array(path: Path, arr: np.ndarray):
+    tmp = path.with_suffix('.tmp.npy')
+    np.save(tmp, arr)
+    os.replace(tmp, path)
+
+
+class AggregatesWriter():
+    """
+    Builds the aggregates one block of tickers at a time: the per-ticker prefix sums
+    go straight into memory-mapped .npy files and the portfolio's per-date sum and
+    count are accumulated, so memory depends on the block size, not the universe.
+    Blocks must use dates from the writer's date axis. meta.json is written last by
+    close(), so readers never see a half-built set.
+    """
+
+    def __init__(self, dates: pd.DatetimeIndex, tickers: list[str], strategies: list[str],
+                 path: Path = AGGREGATES_PATH):
+        path.mkdir(parents=True, exist_ok=True)
+        (path / META).unlink(missing_ok=True)
+        self.path = path
+        self.dates = pd.DatetimeIndex(dates)
+        self.tickers = list(tickers)
+        self.strategies = list(strategies)
+        self._index = {t: j for j, t in enumerate(self.tickers)}
+        _save_array(path / "dates.npy", self.dates.to_numpy())
+        shape = (len(self.dates) + 1, len(self.tickers))
+        # column-major, so each block of tickers is one contiguous write
+        self._prefix = {
+            name: {
+                kind: np.lib.format.open_memmap(path / f"{name}.{kind}.npy", mode='w+', shape=shape,
+                                                dtype=np.int64 if kind == 'count' else np.float64,
+                                                fortran_order=True)
+                for kind in PREFIXES
+            }
+            for name in self.strategies
+        }
+        self._port = {
+            name: {kind: np.zeros(len(self.dates), dtype=np.int64 if kind == 'port_count' else np.float64)
+                   for kind in PORTFOLIO}
+            for name in self.strategies
+        }
+
+    @timed('AggregatesWriter.add')
+    def add(self, pm: PriceMatrix, results: dict):
+        """Fold in one block: `results` as from run_strategies on `pm`."""
+        rows = self.dates.get_indexer(pm.dates)
+        if (rows < 0).any():
+            raise ValueError("Block has dates outside the writer's date axis")
+        cols = [self._index[t] for t in pm.tickers]
+        for name in self.strategies:
+            strat_rtn = results[name]['strat_rtn']
+            # the block's returns on the full date axis (NaN where it has no bar)
+            full = np.full((len(self.dates), len(cols)), np.nan)
+            full[rows] = strat_rtn
+            prefix = prefix_rows(full)
+            for kind in PREFIXES:
+                self._prefix[name][kind][1:, cols] = prefix[kind]
+            sums = portfolio_sums(strat_rtn, results[name]['pos'], results[name].get('turnover'))
+            for kind, arr in sums.items():
+                self._port[name][f'port_{kind}'][rows] += arr
+
+    def close(self):
+        for name in self.strategies:
+            for arr in self._prefix[name].values():
+                arr.flush()
+            for kind, arr in self._port[name].items():
+                _save_array(self.path / f"{name}.{kind}.npy", arr)
+        self._prefix = {}
+        with open(self.path / META, 'w') as f:
+            json.dump({'tickers': self.tickers, 'strategies': self.strategies}, f)
+
+
+def write_aggregates(pm: PriceMatrix, results: dict, path: Path = AGGREGATES_PATH):
+    """
+    Store, per strategy, (dates + 1) x tickers prefix sums of log(1 + strat_rtn),
+    strat_rtn, strat_rtn**2 and the count of returns, with a leading zero row so
+    any date range is a difference of two rows, plus the portfolio's per-date
+    sum and count of strat_rtn.
+    """
+    writer = AggregatesWriter(pm.dates, pm.tickers, list(results), path)
+    writer.add(pm, results)
+    writer.close()
+
+
+def append_aggregates(pm: PriceMatrix, results: dict, path: Path = AGGREGATES_PATH):
+    """Extend the stored prefix sums with the bars of an incremental update (dated after the stored ones)."""
+    with open(path / META) as f:
+        meta = json.load(f)
+    if meta['tickers'] != list(pm.tickers):
+        raise ValueError("Ticker set changed since the aggregates were written")
+    dates = np.load(path / "dates.npy")
+    _save_array(path / "dates.npy", np.concatenate([dates, pm.dates.to_numpy()]))
+    for name, res in results.items():
+        stored = {kind: np.load(path / f"{name}.{kind}.npy") for kind in PREFIXES}
+        rows = prefix_rows(res['strat_rtn'], {kind: arr[-1] for kind, arr in stored.items()})
+        for kind in PREFIXES:
+            _save_array(path / f"{name}.{kind}.npy", np.vstack([stored[kind], rows[kind]]))
+        sums = portfolio_sums(res['strat_rtn'], res['pos'], res.get('turnover'))
+        for kind, arr in sums.items():
+            stored_port = np.load(path / f"{name}.port_{kind}.npy")
+            _save_array(path / f"{name}.port_{kind}.npy", np.concatenate([stored_port, arr]))
+
+
+def range_stats(n, total_log, total, total_sq, periods_per_year: float = TRADING_DAYS) -> dict:
+    # mean/std (ddof=1) of the per-bar returns from their sum and sum of squares
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = total / n
+        var = np.maximum(total_sq - n * mean * mean, 0.0) / (n - 1)
+        sharpe = mean / np.sqrt(var) * periods_per_year ** 0.5
+    return {
+        'total_return': np.expm1(total_log),
+        'mean': mean,
+        'std': np.sqrt(var),
+        'sharpe': sharpe,
+        'days': n,
+    }
+
+
+class SignalAggregates():
+    """
+    Range queries over the stored prefix sums. Per-ticker stats for tickers S over
+    [start, end] are two row lookups per ticker, O(|S|). The equal-weight portfolio
+    (daily mean over the tickers with a return, as in parquet_cache.py) is not a
+    per-ticker sum, so its daily series is built once per (strategy, S) from the
+    prefix rows (for the whole universe, read from the stored per-date accumulators)
+    and kept with its own prefix sums; after that any date range is O(1).
+    """
+
+    def __init__(self, path: Path = AGGREGATES_PATH, max_portfolios: int = 64):
+        with open(path / META) as f:
+            meta = json.load(f)
+        self.path = path
+        self.tickers = meta['tickers']
+        self.strategies = meta['strategies']
+        self.dates = pd.DatetimeIndex(np.load(path / "dates.npy"))
+        # Sharpe ratios are annualized for the stored bar frequency
+        self.periods_per_year = periods_per_year(self.dates)
+        self._index = {t: j for j, t in enumerate(self.tickers)}
+        self._prefix = {}
+        self._portfolios = OrderedDict()
+        self.max_portfolios = max_portfolios
+        # the app shares one instance between session threads (st.cache_resource)
+        self._lock = threading.Lock()
+
+    def _arrays(self, suffix: str) -> dict[str, np.ndarray]:
+        if suffix not in self._prefix:
+            self._prefix[suffix] = {
+                kind: np.load(self.path / f"{suffix}.{kind}.npy", mmap_mode='r') for kind in PREFIXES
+            }
+        return self._prefix[suffix]
+
+    def _span(self, start, end) -> tuple[int, int]:
+        # prefix rows bounding the inclusive date range
+        lo = 0 if start is None else self.dates.searchsorted(pd.Timestamp(start), side='left')
+        hi = len(self.dates) if end is None else self.dates.searchsorted(pd.Timestamp(end), side='right')
+        return lo, max(lo, hi)
+
+    def _columns(self, tickers) -> list[int]:
+        missing = [t for t in tickers if t not in self._index]
+        if missing:
+            raise KeyError(f"No aggregates for: {missing}")
+        return [self._index[t] for t in tickers]
+
+    def ticker_stats(self, suffix: str, tickers: list[str], start=None, end=None) -> pd.DataFrame:
+        """Per-ticker total return, daily mean/std, Sharpe and day count over [start, end]."""
+        arrays = self._arrays(suffix)
+        cols = self._columns(tickers)
+        lo, hi = self._span(start, end)
+        delta = {kind: arrays[kind][hi, cols] - arrays[kind][lo, cols] for kind in PREFIXES}
+        return pd.DataFrame(range_stats(delta['count'], delta['log'], delta['sum'], delta['sumsq'], self.periods_per_year),
+                            index=pd.Index(list(tickers), name='Ticker'))
+
+    def _portfolio(self, suffix: str, tickers: tuple) -> dict[str, np.ndarray]:
+        key = (suffix, tuple(sorted(tickers)))
+        with self._lock:
+            cached = self._portfolios.get(key)
+            if cached is not None:
+                self._portfolios.move_to_end(key)
+                return cached
+        cols = self._columns(key[1])
+        if len(cols) == len(self.tickers) and (self.path / f"{suffix}.port_sum.npy").exists():
+            # the whole universe: the stored per-date accumulators
+            total = np.load(self.path / f"{suffix}.port_sum.npy")
+            count = np.load(self.path / f"{suffix}.port_count.npy")
+        else:
+            # per-date sums over the selection, from the row differences of the prefix sums
+            arrays = self._arrays(suffix)
+            total = np.diff(arrays['sum'][:, cols], axis=0).sum(axis=1)
+            count = np.diff(arrays['count'][:, cols], axis=0).sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            daily = np.where(count > 0, total / count, np.nan)
+        cached = {'daily': daily, **prefix_rows(daily[:, None])}
+        for kind in PREFIXES:
+            cached[kind] = np.concatenate([[0], cached[kind][:, 0]])
+        with self._lock:
+            self._portfolios[key] = cached
+            self._portfolios.move_to_end(key)
+            if len(self._portfolios) > self.max_portfolios:
+                self._portfolios.popitem(last=False)
+        return cached
+
+    def portfolio_stats(self, suffix: str, tickers: list[str], start=None, end=None) -> dict:
+        """Equal-weight portfolio total return, daily mean/std, Sharpe and day count over [start, end]."""
+        port = self._portfolio(suffix, tickers)
+        lo, hi = self._span(start, end)
+        delta = {kind: port[kind][hi] - port[kind][lo] for kind in PREFIXES}
+        stats = range_stats(delta['count'], delta['log'], delta['sum'], delta['sumsq'], self.periods_per_year)
+        return {k: float(v) for k, v in stats.items()}
+
+    def portfolio_daily(self, suffix: str, tickers: list[str] = None, start=None, end=None) -> pd.Series:
+        """Equal-weight portfolio daily return over [start, end] (NaN where no ticker has a return); all tickers by default."""
+        port = self._portfolio(suffix, self.tickers if tickers is None else tickers)
+        lo, hi = self._span(start, end)
+        return pd.Series(port['daily'][lo:hi], index=self.dates[lo:hi], name=suffix)
+
+    def portfolio_metrics(self, suffix: str) -> dict[str, float]:
+        """metrics.compute_metrics of the whole-universe portfolio over the full history."""
+        return portfolio_metrics({kind: np.load(self.path / f"{suffix}.port_{kind}.npy")
+                                  for kind in ('sum', 'count', 'exposure', 'turnover')}, self.periods_per_year)
+
+    def portfolio_cumulative(self, suffix: str, tickers: list[str], start=None, end=None) -> pd.Series:
+        """Equal-weight portfolio growth of 1 over [start, end], per date (NaN where no ticker has a return)."""
+        port = self._portfolio(suffix, tickers)
+        lo, hi = self._span(start, end)
+        daily = port['daily'][lo:hi]
+        cum = np.exp(port['log'][lo + 1:hi + 1] - port['log'][lo])
+        cum[np.isnan(daily)] = np.nan
+        return pd.Series(cum, index=self.dates[lo:hi], name='port_cumulative_rtn')
@@ -0,0 +1,268 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import psutil
+from WrangleData import wrangle_data
+from TradingStrats import STRATEGY_REGISTRY
+from matrix_engine import PriceMatrix, Segments, compute_returns_matrix
+from indicators import INDICATOR_CACHE
+from price_store import build_store
+from precompute_signals import precompute_signals, STRATEGIES
+from signal_store import load_signals, date_bounds
+from aggregates import SignalAggregates
+
+BENCH_DIR = Path("bench_data")
+BENCH_OUTPUT = Path("bench_output.json")
+BARS_PER_YEAR = 252
+
+
+def synthetic_universe(n_tickers: int, years: int, out_dir: Path, seed: int = 0) -> int:
+    """
+    Write n_tickers daily OHLCV CSVs (geometric random walks) into out_dir/data, laid
+    out like the real ones. The first ticker spans the whole period; the others list
+    at random dates in its first 60%, so the panel is ragged like META vs MSFT.
+    Returns the number of bars written.
+    """
+    data_dir = out_dir / "data"
+    data_dir.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    n_dates = years * BARS_PER_YEAR
+    dates = pd.bdate_range(end="2024-12-31", periods=n_dates).strftime("%Y-%m-%d")
+    starts = rng.integers(0, int(n_dates * 0.6) + 1, n_tickers)
+    starts[0] = 0
+    rows = 0
+    for j, start in enumerate(starts):
+        n = n_dates - start
+        close = 20 * np.exp(np.cumsum(rng.normal(0.0004, 0.02, n)))
+        spread = np.abs(rng.normal(0, 0.01, (3, n)))
+        pd.DataFrame({
+            'Date': dates[start:],
+            'Open': close * (1 + rng.normal(0, 0.005, n)),
+            'High': close * (1 + spread[0]),
+            'Low': close * (1 - spread[1]),
+            'Close': close,
+            'Volume': rng.integers(1_000_000, 10_000_000, n),
+        }).to_csv(data_dir / f"T{j:05d}.csv", index=False)
+        rows += n
+    return rows
+
+
+class _PeakRSS():
+    """Samples this process's RSS on a background thread; `peak` is the highest seen."""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.proc = psutil.Process()
+        self.peak = self.proc.memory_info().rss
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, self.proc.memory_info().rss)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.proc.memory_info().rss)
+
+
+@contextmanager
+def _chdir(path: Path):
+    # the pipeline modules resolve data/, price_store/ and the parquet relative to cwd
+    prev = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(prev)
+
+
+def time_stage(fn, rows: int = None) -> tuple[dict, object]:
+    """
+    Run fn() once and return its stats (wall time, peak RSS, growth over the RSS at
+    the start, rows/sec) along with its result. `rows` may also be a function of
+    the result.
+    """
+    start_rss = psutil.Process().memory_info().rss
+    with _PeakRSS() as rss:
+        start = time.perf_counter()
+        result = fn()
+        wall = time.perf_counter() - start
+    rows = rows(result) if callable(rows) else rows
+    stats = {
+        'wall_s': round(wall, 4),
+        'peak_rss_mb': round(rss.peak / 2**20, 1),
+        'rss_growth_mb': round((rss.peak - start_rss) / 2**20, 1),
+        'rows': rows,
+        'rows_per_s': round(rows / wall) if rows and wall > 0 else None,
+    }
+    return stats, result
+
+
+def bench_segmented(df: pd.DataFrame, window: int = 50, period: int = 14) -> dict:
+    """
+    Time the segmented rolling mean / Wilder EWM against pandas groupby on the same
+    long frame, checking they agree with the per-ticker groupby reference.
+    """
+    stages = {}
+    close = df['Close'].astype(np.float64)
+    alpha = 1.0 / period
+    stages['segmented.rolling_mean'], seg_ma = time_stage(
+        lambda: Segments.from_frame(df).rolling_mean(close, window), rows=len(df))
+    stages['groupby.rolling_mean'], ref_ma = time_stage(
+        lambda: close.groupby(df['Ticker']).rolling(window, min_periods=window).mean()
+                     .reset_index(level=0, drop=True).to_numpy(), rows=len(df))
+    stages['segmented.ewm_mean'], seg_ewm = time_stage(
+        lambda: Segments.from_frame(df).ewm_mean(close, alpha, min_periods=period), rows=len(df))
+    stages['groupby.ewm_mean'], ref_ewm = time_stage(
+        lambda: close.groupby(df['Ticker']).ewm(alpha=alpha, min_periods=period, adjust=False).mean()
+                     .reset_index(level=0, drop=True).to_numpy(), rows=len(df))
+    for name, got, expected in [('rolling_mean', seg_ma, ref_ma), ('ewm_mean', seg_ewm, ref_ewm)]:
+        if not np.allclose(got, expected, rtol=1e-10, atol=0, equal_nan=True):
+            raise AssertionError(f"segmented {name} disagrees with the groupby reference")
+    return stages
+
+
+def _portfolio_view(aggregates: SignalAggregates, suffix: str, tickers: list[str], start, end) -> pd.Series:
+    # the chart + stats queries parquet_cache.py makes, minus the widgets
+    aggregates.portfolio_stats(suffix, tickers, start, end)
+    return aggregates.portfolio_cumulative(suffix, tickers, start, end)
+
+
+def bench_universe(universe_dir: Path, engines: list[str], workers: int = 1) -> dict:
+    """Time each pipeline stage on the universe in universe_dir (run from inside it)."""
+    stages = {}
+    with _chdir(universe_dir):
+        tickers = sorted(f.stem for f in Path("data").glob("*.csv"))
+        # CSV parse into the price store, then the warm read every later call makes
+        stages['build_store'], _ = time_stage(build_store)
+        stages['wrangle_data'], df = time_stage(lambda: wrangle_data(tickers), rows=len)
+        n_rows = len(df)
+        stages['build_store'].update(rows=n_rows, rows_per_s=round(n_rows / stages['build_store']['wall_s']))
+        stages.update(bench_segmented(df))
+
+        for name, strategy_cls in STRATEGY_REGISTRY.items():
+            strat = strategy_cls()
+            if 'pandas' in engines:
+                stats, signals = time_stage(lambda: strat.compute_signals(df.copy()), rows=n_rows)
+                stages[f'{name}.compute_signals'] = stats
+                stages[f'{name}.compute_returns'], _ = time_stage(lambda: strat.compute_returns(signals), rows=n_rows)
+            if 'matrix' in engines:
+                INDICATOR_CACHE.clear()
+                pm = PriceMatrix.from_long(df)
+                stats, signals = time_stage(lambda: strat.compute_signals_matrix(pm), rows=n_rows)
+                stages[f'{name}.compute_signals_matrix'] = stats
+                stages[f'{name}.compute_returns_matrix'], _ = time_stage(
+                    lambda: compute_returns_matrix(pm, signals['pos']), rows=n_rows)
+        del df, signals
+
+        INDICATOR_CACHE.clear()
+        stages['precompute_signals'], _ = time_stage(lambda: precompute_signals(workers), rows=n_rows)
+
+        # a typical app query: every ticker over the last half of the history
+        first, last = date_bounds()
+        start = first + (last - first) / 2
+        aggregates = SignalAggregates()
+        for suffix in STRATEGIES:
+            stats, df_filt = time_stage(lambda: load_signals(suffix, tickers, start, last), rows=len)
+            stages[f'parquet_cache.{suffix}.load'] = stats
+            # first query for a ticker selection builds its portfolio series; later ranges are lookups
+            stages[f'parquet_cache.{suffix}.portfolio'], _ = time_stage(
+                lambda: _portfolio_view(aggregates, suffix, tickers, start, last), rows=len(df_filt))
+            stages[f'parquet_cache.{suffix}.portfolio_range'], _ = time_stage(
+                lambda: _portfolio_view(aggregates, suffix, tickers, first, last), rows=len(df_filt))
+    return {'rows': n_rows, 'stages': stages}
+
+
+def _git_commit() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                               capture_output=True, text=True).stdout.strip()
+        return out.stdout.strip() + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(tickers: list[int], years: list[int], engines: list[str], workers: int = 1,
+                   bench_dir: Path = BENCH_DIR, seed: int = 0) -> dict:
+    """
+    Benchmark every (tickers, years) universe. Generated universes are kept in
+    bench_dir and reused by later runs with the same size and seed.
+    """
+    report = {
+        'commit': _git_commit(),
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'cpus': os.cpu_count(),
+        'engines': engines,
+        'workers': workers,
+        'universes': {},
+    }
+    for n_tickers in tickers:
+        for n_years in years:
+            key = f"{n_tickers}x{n_years}y"
+            universe_dir = (bench_dir / f"{key}-seed{seed}").resolve()
+            if not (universe_dir / "data").exists():
+                print(f"generating {key} ...", flush=True)
+                synthetic_universe(n_tickers, n_years, universe_dir, seed)
+            print(f"benchmarking {key} ...", flush=True)
+            result = bench_universe(universe_dir, engines, workers)
+            report['universes'][key] = {'tickers': n_tickers, 'years': n_years, **result}
+            for stage, stats in result['stages'].items():
+                print(f"  {stage:<45} {stats['wall_s']:>9.3f}s {stats['peak_rss_mb']:>9.1f}MB "
+                      f"{stats['rows_per_s'] or 0:>14,} rows/s", flush=True)
+    return report
+
+
+def compare(report: dict, baseline: dict, threshold: float = 1.1) -> list[str]:
+    """Stages that got more than `threshold` times slower than in `baseline`."""
+    slower = []
+    for key, universe in report['universes'].items():
+        base = baseline['universes'].get(key)
+        if base is None:
+            continue
+        for stage, stats in universe['stages'].items():
+            old = base['stages'].get(stage)
+            if old and old['wall_s'] > 0 and stats['wall_s'] > threshold * old['wall_s']:
+                slower.append(f"{key} {stage}: {old['wall_s']:.3f}s -> {stats['wall_s']:.3f}s "
+                              f"({stats['wall_s'] / old['wall_s']:.2f}x)")
+    return slower
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the backtest pipeline on synthetic universes.")
+    parser.add_argument("--tickers", type=int, nargs="+", default=[7, 100], help="universe sizes (7 to 5000)")
+    parser.add_argument("--years", type=int, nargs="+", default=[1, 10], help="years of daily bars (1 to 30)")
+    parser.add_argument("--engines", nargs="+", choices=["pandas", "matrix"], default=["pandas", "matrix"])
+    parser.add_argument("--workers", type=int, default=1, help="workers for precompute_signals")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--bench-dir", type=Path, default=BENCH_DIR, help="where generated universes are kept")
+    parser.add_argument("--output", type=Path, default=BENCH_OUTPUT, help="JSON results file")
+    parser.add_argument("--compare", type=Path, help="earlier JSON results to flag regressions against")
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.tickers, args.years, args.engines, args.workers, args.bench_dir, args.seed)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"wrote {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            slower = compare(report, json.load(f))
+        print("\n".join(["regressions:"] + slower) if slower else "no regressions")
@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+
+# Date is stored as int32 days since this origin
+DATE_ORIGIN = np.datetime64('1970-01-01', 'D')
+# columns (and per-strategy f'{col}_{suffix}' columns) holding -1/0/1
+INT8_COLS = ('signal', 'pos')
+# float32 keeps 24 significant bits, i.e. a relative rounding error of at most
+# 2**-24 (about 6e-8) per value. A float column is only narrowed if every value
+# round-trips within this relative tolerance (it can't when values overflow or
+# underflow float32); otherwise it stays float64.
+FLOAT32_RTOL = 1e-6
+
+
+def compact_dates(dates) -> np.ndarray:
+    """Day offsets (int32) from DATE_ORIGIN. Only for daily data: intraday bars raise ValueError."""
+    stamps = pd.DatetimeIndex(dates).to_numpy()
+    if (stamps != stamps.astype('datetime64[D]')).any():
+        raise ValueError("The compact schema stores days only; keep intraday bars in the wide schema")
+    days = (stamps.astype('datetime64[D]') - DATE_ORIGIN).astype(np.int64)
+    return days.astype(np.int32)
+
+
+def expand_dates(days) -> pd.DatetimeIndex:
+    return pd.DatetimeIndex((DATE_ORIGIN + np.asarray(days).astype('timedelta64[D]')).astype('datetime64[ns]'))
+
+
+def _is_int8_col(col: str) -> bool:
+    return any(col == name or col.startswith(f'{name}_') for name in INT8_COLS)
+
+
+def _fits_float32(values: np.ndarray, rtol: float) -> bool:
+    narrowed = values.astype(np.float32).astype(np.float64)
+    with np.errstate(invalid='ignore', over='ignore'):
+        return bool(np.allclose(narrowed, values, rtol=rtol, atol=0, equal_nan=True))
+
+
+def to_compact(df: pd.DataFrame, rtol: float = FLOAT32_RTOL) -> pd.DataFrame:
+    """
+    Compact copy of a long frame: Ticker categorical, Date as int32 day offsets,
+    signal/pos columns as int8 and float64 columns as float32 where they fit within
+    `rtol`. Other columns are kept as they are. from_compact undoes it.
+    """
+    out = {}
+    for col in df.columns:
+        values = df[col]
+        if col == 'Ticker':
+            values = values.astype('category')
+        elif col == 'Date' and pd.api.types.is_datetime64_any_dtype(values):
+            values = compact_dates(values)
+        elif _is_int8_col(col) and values.notna().all():
+            arr = values.to_numpy()
+            if (arr == np.round(arr)).all() and arr.min() >= -128 and arr.max() <= 127:
+                values = arr.astype(np.int8)
+        elif values.dtype == np.float64 and _fits_float32(values.to_numpy(), rtol):
+            values = values.to_numpy(dtype=np.float32)
+        out[col] = values
+    return pd.DataFrame(out, index=df.index)
+
+
+def from_compact(df: pd.DataFrame) -> pd.DataFrame:
+    """Back to the wide types: datetime Date, object Ticker, float64 floats and int64 ints."""
+    out = df.copy()
+    if 'Date' in out and pd.api.types.is_integer_dtype(out['Date']):
+        out['Date'] = expand_dates(out['Date'])
+    if 'Ticker' in out and isinstance(out['Ticker'].dtype, pd.CategoricalDtype):
+        out['Ticker'] = out['Ticker'].astype(object)
+    for col in out.columns:
+        if out[col].dtype == np.float32:
+            out[col] = out[col].astype(np.float64)
+        elif out[col].dtype == np.int8:
+            out[col] = out[col].astype(np.int64)
+    return out
+
+
+def tolerance_report(full: pd.DataFrame, compact: pd.DataFrame) -> pd.DataFrame:
+    """
+    Per numeric column of `full`: dtype before/after and the largest absolute and
+    relative difference after the compact round trip. NaNs must line up exactly.
+    """
+    rows = []
+    for col in full.columns:
+        if col in ('Date', 'Ticker') or not pd.api.types.is_numeric_dtype(full[col]):
+            continue
+        a = full[col].to_numpy(dtype=np.float64)
+        b = compact[col].to_numpy(dtype=np.float64)
+        nan_match = bool(np.array_equal(np.isnan(a), np.isnan(b)))
+        diff = np.abs(a - b)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            rel = np.where(diff == 0, 0.0, diff / np.abs(a))
+        rows.append({
+            'column': col,
+            'dtype': str(full[col].dtype),
+            'compact_dtype': str(compact[col].dtype),
+            'max_abs_err': float(np.nanmax(diff, initial=0.0)),
+            'max_rel_err': float(np.nanmax(rel, initial=0.0)),
+            'nan_match': nan_match,
+        })
+    return pd.DataFrame(rows).set_index('column')
+
+
+def check_tolerance(full: pd.DataFrame, compact: pd.DataFrame, rtol: float = FLOAT32_RTOL) -> pd.DataFrame:
+    """
+    Raise ValueError if any column of `compact` is further than `rtol` (relative)
+    from `full`, or if the key columns don't round-trip exactly. Returns the report.
+    """
+    report = tolerance_report(full, compact)
+    bad = report[(report['max_rel_err'] > rtol) | ~report['nan_match']]
+    if 'Date' in full and not expand_dates(compact['Date']).equals(pd.DatetimeIndex(full['Date'])):
+        raise ValueError("Date does not round-trip")
+    if 'Ticker' in full and not (compact['Ticker'].astype(object).to_numpy() == full['Ticker'].to_numpy()).all():
+        raise ValueError("Ticker does not round-trip")
+    if len(bad):
+        raise ValueError(f"Compact columns outside rtol={rtol}:\n{bad}")
+    return report
+
+
+if __name__ == "__main__":
+    from signal_store import load_signals
+    full = load_signals()
+    compact = to_compact(full)
+    print(check_tolerance(full, compact).to_string())
+    before = full.memory_usage(deep=True).sum()
+    after = compact.memory_usage(deep=True).sum()
+    print(f"\n{len(full)} rows: {before / 2**20:.1f}MB -> {after / 2**20:.1f}MB ({before / after:.1f}x smaller)")
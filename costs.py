@@ -0,0 +1,56 @@
+import numpy as np
+
+BPS = 1e-4
+
+
+class CostModel():
+    """
+    Trading costs in basis points of the position traded, charged against the
+    return of the bar a position change takes effect on (the bar after the signal):
+      fee_bps       fixed cost per trade, i.e. per bar a ticker's position changes
+      spread_bps    quoted bid-ask spread; half of it is paid per unit of turnover
+      slippage_bps  further cost per unit of turnover (market impact, etc.)
+    Going from -1 to 1 is one trade with turnover 2. All zero is frictionless.
+    """
+
+    def __init__(self, fee_bps: float = 0.0, spread_bps: float = 0.0, slippage_bps: float = 0.0):
+        self.fee_bps = fee_bps
+        self.spread_bps = spread_bps
+        self.slippage_bps = slippage_bps
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, CostModel) and vars(self) == vars(other)
+
+    def __repr__(self) -> str:
+        return f"CostModel(fee_bps={self.fee_bps}, spread_bps={self.spread_bps}, slippage_bps={self.slippage_bps})"
+
+    @property
+    def per_trade(self) -> float:
+        return self.fee_bps * BPS
+
+    @property
+    def per_turnover(self) -> float:
+        return (self.spread_bps / 2 + self.slippage_bps) * BPS
+
+    def costs(self, turnover: np.ndarray) -> np.ndarray:
+        """Cost, as a fraction of the position, for each cell of a turnover array."""
+        return self.per_trade * (turnover > 0) + self.per_turnover * turnover
+
+
+def turnover(pos: np.ndarray, last: np.ndarray = None, present: np.ndarray = None) -> np.ndarray:
+    """
+    |change in position| per bar along the dates axis (the second to last axis, so a
+    leading config axis works too). `last` is the position before the first row
+    (default flat). With `present` (dates x tickers, e.g. PriceMatrix.present) only a
+    ticker's own bars trade: each is compared with the ticker's previous present bar
+    and the cells it has no bar on have zero turnover, as in the long (per-row) path.
+    """
+    axis = pos.ndim - 2
+    prev = np.zeros_like(np.take(pos, [0], axis=axis)) if last is None else np.expand_dims(last, axis)
+    if present is None:
+        return np.abs(np.diff(pos, axis=axis, prepend=prev))
+    # row of each ticker's previous present bar (-1 before its first)
+    rows = np.where(present, np.arange(len(present))[:, None], -1)
+    rows = np.vstack([np.full((1, present.shape[1]), -1), np.maximum.accumulate(rows, axis=0)[:-1]])
+    before = np.take_along_axis(pos, np.expand_dims(np.maximum(rows, 0), tuple(range(axis))), axis=axis)
+    return np.where(present, np.abs(pos - np.where(rows >= 0, before, prev)), 0)
@@ -0,0 +1,138 @@
+import numpy as np
+import pandas as pd
+from matrix_engine import PriceMatrix
+from perf import timed
+
+# per-strategy columns kept as change events rather than a value per row
+EVENT_COLS = ['signal', 'pos']
+
+
+def _changed(values: np.ndarray, prev: np.ndarray) -> np.ndarray:
+    # NaN to NaN is no change
+    return (values != prev) & ~(np.isnan(values) & np.isnan(prev))
+
+
+@timed('events.position_events')
+def position_events(pm: PriceMatrix, results: dict, last: dict = None) -> pd.DataFrame:
+    """
+    Change events of a strategy's (dates x tickers) EVENT_COLS arrays in `results`:
+    one (Ticker, Date, signal, pos) row per bar where either differs from the ticker's
+    previous bar, i.e. the new values, sorted by Ticker then Date. Only bars a ticker
+    has (pm.present) count. Before its first bar a ticker is taken as flat (0), or at
+    `last` ({col: per-ticker values}, e.g. the end of the stored history) when given.
+    Strategies that trade rarely get a few rows per ticker instead of one per bar;
+    expand_events and events_at undo it.
+    """
+    present = pm.present.T
+    # (tickers x dates) so the selected bars come out ticker-major, date-minor
+    row_tickers, row_dates = np.nonzero(present)
+    first = np.concatenate([[True], row_tickers[1:] != row_tickers[:-1]])
+    changed = np.zeros(len(row_tickers), dtype=bool)
+    values = {}
+    for col in EVENT_COLS:
+        arr = np.asarray(results[col])
+        values[col] = arr.T[present]
+        cur = values[col].astype(np.float64)
+        prev = np.concatenate([[np.nan], cur[:-1]])
+        start = np.zeros(len(pm.tickers)) if last is None else np.asarray(last[col], dtype=np.float64)
+        prev[first] = start[row_tickers[first]]
+        changed |= _changed(cur, prev)
+    return pd.DataFrame({
+        'Ticker': np.asarray(pm.tickers, dtype=object)[row_tickers[changed]],
+        'Date': pm.dates[row_dates[changed]],
+        **{col: values[col][changed] for col in EVENT_COLS},
+    })
+
+
+def last_values(events: pd.DataFrame, tickers: list[str]) -> dict[str, np.ndarray]:
+    """Per-ticker EVENT_COLS values after the last event (0 for tickers without one)."""
+    last = events.drop_duplicates('Ticker', keep='last').set_index('Ticker').reindex(tickers)
+    return {col: last[col].fillna(0).to_numpy() for col in EVENT_COLS}
+
+
+def events_at(events: pd.DataFrame, tickers, dates) -> dict[str, np.ndarray]:
+    """
+    EVENT_COLS values in force at each (tickers[i], dates[i]): those of the ticker's
+    latest event on or before that date, 0 before its first. `events` must be sorted
+    by Ticker then Date. One searchsorted over (ticker, date) keys, no per-ticker loop.
+    """
+    tickers = np.asarray(tickers, dtype=object)
+    dates = pd.DatetimeIndex(dates).as_unit('ns').asi8
+    event_dates = pd.DatetimeIndex(events['Date']).as_unit('ns').asi8
+    # ticker codes over both key sets, and dates as ranks so each key fits one int64
+    codes, names = pd.factorize(np.concatenate([events['Ticker'].to_numpy(dtype=object), tickers]))
+    axis = np.union1d(event_dates, dates)
+    keys = codes * len(axis) + np.searchsorted(axis, np.concatenate([event_dates, dates]))
+    event_keys, query_keys = keys[:len(events)], keys[len(events):]
+    idx = np.searchsorted(event_keys, query_keys, side='right') - 1
+    hit = idx >= 0
+    hit[hit] = codes[idx[hit]] == codes[len(events):][hit]
+    out = {}
+    for col in EVENT_COLS:
+        values = events[col].to_numpy()
+        out[col] = np.where(hit, values[np.maximum(idx, 0)] if len(values) else 0, 0).astype(values.dtype)
+    return out
+
+
+def expand_events(events: pd.DataFrame, dates: pd.DatetimeIndex, tickers: list[str]) -> dict[str, np.ndarray]:
+    """
+    Dense (dates x tickers) EVENT_COLS arrays on any date axis, e.g. a window of the
+    stored history: events before the window carry into it. Cells where a ticker had
+    no bar hold the values in force, so mask with the price matrix's present cells.
+    """
+    grid_dates = np.repeat(pd.DatetimeIndex(dates).to_numpy(), len(tickers))
+    grid_tickers = np.tile(np.asarray(tickers, dtype=object), len(dates))
+    return {col: values.reshape(len(dates), len(tickers))
+            for col, values in events_at(events, grid_tickers, grid_dates).items()}
+
+
+@timed('events.trade_list')
+def trade_list(events: pd.DataFrame, rtn: PriceMatrix) -> pd.DataFrame:
+    """
+    One row per trade of a strategy's events: each run of bars at one non-zero pos.
+    entry_date is the first bar held (it earns that bar's return, so the fill is the
+    previous close, see positions_from_signal) and exit_date the first bar after the
+    last one held (NaT while open). `rtn` holds the strategy's per-bar returns
+    (strat_rtn, or net_rtn for after-cost trades) in its close array; a trade's return
+    compounds them over its bars on that date axis, and bars counts the ones with a
+    return, so trades entered before rtn's first date only count their part inside it.
+    """
+    pos_events = events[_changed(events['pos'].to_numpy(np.float64),
+                                 events.groupby('Ticker')['pos'].shift(fill_value=0).to_numpy(np.float64))]
+    tickers = pos_events['Ticker'].to_numpy(dtype=object)
+    same_next = np.append(tickers[1:] == tickers[:-1], False)
+    held = pos_events['pos'].to_numpy() != 0
+    entry = pd.DatetimeIndex(pos_events['Date'])
+    exit_ = pd.DatetimeIndex(np.where(same_next, np.roll(entry.to_numpy(), -1), np.datetime64('NaT')))[held]
+    entry, tickers, pos = entry[held], tickers[held], pos_events['pos'].to_numpy()[held]
+
+    # running sums of log returns and counts per ticker, with a leading zero row
+    valid = ~np.isnan(rtn.close)
+    log = np.concatenate([np.zeros((1, rtn.shape[1])), np.cumsum(np.log1p(np.where(valid, rtn.close, 0.0)), axis=0)])
+    count = np.concatenate([np.zeros((1, rtn.shape[1]), dtype=np.int64), np.cumsum(valid, axis=0)])
+    col = pd.Index(rtn.tickers).get_indexer(tickers)
+    a = np.searchsorted(rtn.dates, entry)
+    b = np.where(exit_.isna(), len(rtn.dates), np.searchsorted(rtn.dates, exit_))
+    known = col >= 0
+    col = np.maximum(col, 0)
+    return pd.DataFrame({
+        'Ticker': tickers,
+        'pos': pos,
+        'entry_date': entry,
+        'exit_date': exit_,
+        'bars': np.where(known, count[b, col] - count[a, col], 0),
+        'days': (exit_ - entry).days,
+        'return': np.where(known, np.expm1(log[b, col] - log[a, col]), np.nan),
+    })
+
+
+def trade_stats(trades: pd.DataFrame) -> dict:
+    """Summary of a trade_list: closed-trade count, win rate and mean holding period and return."""
+    closed = trades[trades['exit_date'].notna()]
+    return {
+        'trades': len(closed),
+        'open': len(trades) - len(closed),
+        'win_rate': float((closed['return'] > 0).mean()) if len(closed) else np.nan,
+        'mean_return': float(closed['return'].mean()) if len(closed) else np.nan,
+        'mean_bars': float(closed['bars'].mean()) if len(closed) else np.nan,
+    }
@@ -0,0 +1,267 @@
+import numpy as np
+from matrix_engine import PriceMatrix, shift
+import indicators
+from indicators import IndicatorCache
+from perf import timed
+
+
+def _truth(x):
+    # NaN (e.g. an indicator still warming up) is false, not truthy as numpy would have it
+    x = np.asarray(x)
+    return x if x.dtype == bool else (x != 0) & ~np.isnan(x)
+
+
+def _lag(x, periods: int):
+    x = np.asarray(x)
+    return shift(x, periods, fill=False) if x.dtype == bool else shift(x, periods)
+
+
+def _vote(*xs):
+    # sign of the summed signals; a NaN vote abstains
+    return np.sign(sum(np.nan_to_num(np.asarray(x, dtype=np.float64)) for x in xs))
+
+
+# indicators of Close, called as fn(pm, *params, cache); see the indicators module
+INDICATORS = {
+    'sma': indicators.sma,
+    'ema': indicators.ema,
+    'rsi': indicators.wilder_rsi,
+    'roc': indicators.roc,
+}
+# element-wise ops on evaluated arguments (matrices or scalars)
+OPS = {
+    'add': np.add,
+    'sub': np.subtract,
+    'mul': np.multiply,
+    'div': np.divide,
+    'neg': np.negative,
+    'abs': np.abs,
+    'sign': np.sign,
+    'gt': np.greater,
+    'ge': np.greater_equal,
+    'lt': np.less,
+    'le': np.less_equal,
+    'and': lambda a, b: _truth(a) & _truth(b),
+    'or': lambda a, b: _truth(a) | _truth(b),
+    'not': lambda a: ~_truth(a),
+    'where': lambda cond, a, b: np.where(_truth(cond), a, b),
+    'lag': _lag,
+    'vote': _vote,
+}
+# argument order doesn't matter, so `a & b` and `b & a` are one node
+COMMUTATIVE = {'add', 'mul', 'and', 'or', 'vote'}
+# bars of history an indicator needs before its first value; None: recursive, needs the full history
+_WARMUP = {'sma': lambda w: w, 'roc': lambda n: n + 1, 'ema': lambda s: None, 'rsi': lambda p: None}
+
+
+def _key(arg):
+    return arg.key if isinstance(arg, Expr) else arg
+
+
+class Expr():
+    """
+    Node of a signal expression over the price matrix, built with the functions below
+    and Python operators: arithmetic (+ - * / and unary -), comparisons (< <= > >=),
+    and & | ~ for logic (NaN counts as false). Arguments are sub-expressions or plain
+    values. `key` identifies a node by structure, so equal subexpressions are one node
+    wherever they occur; Evaluator computes each once.
+    """
+    __slots__ = ('op', 'args', 'key')
+
+    def __init__(self, op: str, *args):
+        if op not in INDICATORS and op not in OPS and op not in ('close', 'param'):
+            raise ValueError(f"Unknown expression op: {op}")
+        self.op = op
+        # numpy scalars (e.g. from a parameter grid) as Python ones, so keys compare alike
+        self.args = tuple(a.item() if isinstance(a, np.generic) else a for a in args)
+        keys = tuple(_key(a) for a in self.args)
+        if op in COMMUTATIVE:
+            keys = tuple(sorted(keys, key=repr))
+        self.key = (op,) + keys
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Expr) and self.key == other.key
+
+    def __hash__(self) -> int:
+        return hash(self.key)
+
+    def __bool__(self):
+        raise TypeError("Expressions have no truth value; combine them with & | ~ rather than and/or/not")
+
+    def __repr__(self) -> str:
+        if self.op == 'close':
+            return "close"
+        if self.op == 'param':
+            return f"param({self.args[0]!r}, {self.args[1]!r})"
+        return f"{self.op}({', '.join(map(repr, self.args))})"
+
+    def __add__(self, other): return Expr('add', self, other)
+    def __radd__(self, other): return Expr('add', other, self)
+    def __sub__(self, other): return Expr('sub', self, other)
+    def __rsub__(self, other): return Expr('sub', other, self)
+    def __mul__(self, other): return Expr('mul', self, other)
+    def __rmul__(self, other): return Expr('mul', other, self)
+    def __truediv__(self, other): return Expr('div', self, other)
+    def __rtruediv__(self, other): return Expr('div', other, self)
+    def __neg__(self): return Expr('neg', self)
+    def __abs__(self): return Expr('abs', self)
+    def __gt__(self, other): return Expr('gt', self, other)
+    def __ge__(self, other): return Expr('ge', self, other)
+    def __lt__(self, other): return Expr('lt', self, other)
+    def __le__(self, other): return Expr('le', self, other)
+    def __and__(self, other): return Expr('and', self, other)
+    def __rand__(self, other): return Expr('and', other, self)
+    def __or__(self, other): return Expr('or', self, other)
+    def __ror__(self, other): return Expr('or', other, self)
+    def __invert__(self): return Expr('not', self)
+
+    def children(self) -> list["Expr"]:
+        return [a for a in self.args if isinstance(a, Expr)]
+
+    def params(self) -> dict:
+        """{name: default} of the param() leaves, in order of first appearance."""
+        if self.op == 'param':
+            return {self.args[0]: self.args[1]}
+        out = {}
+        for child in self.children():
+            for name, default in child.params().items():
+                out.setdefault(name, default)
+        return out
+
+    def bind(self, values: dict = None):
+        """Copy with each param() replaced by its value in `values` (default: its default)."""
+        if self.op == 'param':
+            return (values or {}).get(self.args[0], self.args[1])
+        return Expr(self.op, *(a.bind(values) if isinstance(a, Expr) else a for a in self.args))
+
+    def warmup(self) -> int:
+        """Bars of history the expression needs; None if it has recursive indicators or time-span windows."""
+        if self.op in _WARMUP:
+            window = self.args[0]
+            return _WARMUP[self.op](int(window)) if isinstance(window, (int, np.integer)) else None
+        needs = [child.warmup() for child in self.children()]
+        if self.op == 'lag':
+            needs = [n + self.args[1] if n is not None else None for n in needs]
+        if any(n is None for n in needs):
+            return None
+        return max(needs, default=1)
+
+
+# ── builders ─────────────────────────────────────────────────────────────────
+
+close = Expr('close')
+
+
+def param(name: str, default):
+    """A named, tunable constant: a strategy parameter of the composites using it."""
+    return Expr('param', name, default)
+
+
+def sma(window) -> Expr:
+    return Expr('sma', window)
+
+
+def ema(span) -> Expr:
+    return Expr('ema', span)
+
+
+def rsi(period) -> Expr:
+    return Expr('rsi', period)
+
+
+def roc(lookback) -> Expr:
+    return Expr('roc', lookback)
+
+
+def sign(x) -> Expr:
+    return Expr('sign', x)
+
+
+def where(cond, a, b) -> Expr:
+    return Expr('where', cond, a, b)
+
+
+def lag(x, periods: int = 1) -> Expr:
+    """`x` as of `periods` bars earlier, e.g. x & ~lag(x) is true on the bar x turns true."""
+    return Expr('lag', x, periods)
+
+
+def vote(*signals) -> Expr:
+    """Majority of the signals: the sign of their sum (NaN abstains)."""
+    return Expr('vote', *signals)
+
+
+# ── evaluation ───────────────────────────────────────────────────────────────
+
+def plan(exprs: list[Expr]) -> list[Expr]:
+    """Distinct nodes of all `exprs` in dependency order (children first): the batch's DAG."""
+    order, seen = [], set()
+
+    def visit(node):
+        if node.key in seen:
+            return
+        seen.add(node.key)
+        for child in node.children():
+            visit(child)
+        order.append(node)
+
+    for expr in exprs:
+        visit(expr)
+    return order
+
+
+class Evaluator():
+    """
+    Evaluates batches of expressions over one price matrix. The batch is planned as a
+    DAG with common subexpressions merged across every expression in it, each node is
+    computed once, and intermediate results are dropped as soon as their last consumer
+    has run. Indicator leaves come from `cache` (default the process-wide
+    INDICATOR_CACHE), so they are shared with classic strategies and later batches too.
+    """
+
+    def __init__(self, pm: PriceMatrix, cache: IndicatorCache = None):
+        self.pm = pm
+        self.cache = cache
+        self.nodes = 0
+        self.references = 0
+
+    def _compute(self, node: Expr, values: dict):
+        if node.op == 'close':
+            return self.pm.close
+        if node.op == 'param':
+            raise ValueError(f"Unbound parameter {node.args[0]!r}; bind() the expression first")
+        args = [values[a.key] if isinstance(a, Expr) else a for a in node.args]
+        if node.op in INDICATORS:
+            return INDICATORS[node.op](self.pm, *args, cache=self.cache)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return OPS[node.op](*args)
+
+    @timed('expressions.evaluate')
+    def evaluate(self, exprs: list[Expr]) -> list[np.ndarray]:
+        """(dates x tickers) values of each expression, in order."""
+        order = plan(exprs)
+        consumers = {}
+        for node in order:
+            for child in node.children():
+                consumers[child.key] = consumers.get(child.key, 0) + 1
+        self.nodes += len(order)
+        self.references += sum(consumers.values()) + len(exprs)
+        roots = {expr.key for expr in exprs}
+        values = {}
+        for node in order:
+            values[node.key] = self._compute(node, values)
+            for child in node.children():
+                consumers[child.key] -= 1
+                if consumers[child.key] == 0 and child.key not in roots:
+                    del values[child.key]
+        return [np.broadcast_to(values[expr.key], self.pm.shape) for expr in exprs]
+
+    def stats(self) -> dict:
+        # references - nodes = evaluations saved by sharing
+        return {'nodes': self.nodes, 'references': self.references}
+
+
+def as_signal(values: np.ndarray) -> np.ndarray:
+    """An expression's value as a signal: booleans are 1/0, NaN is flat, whole numbers are int64."""
+    signal = np.nan_to_num(np.asarray(values, dtype=np.float64))
+    return signal.astype(np.int64) if (signal == np.round(signal)).all() else signal
@@ -0,0 +1,100 @@
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+from matrix_engine import PriceMatrix, bars, rolling_mean, ewm_mean, pct_change
+from matrix_engine import wilder_rsi as _wilder_rsi
+
+
+class IndicatorCache():
+    """
+    LRU cache of indicator matrices keyed by (tickers, data version, indicator, params).
+    Entries are evicted oldest-first once their total size exceeds `max_bytes`.
+    Cached arrays are read-only since they are shared between callers.
+    Safe to share between threads (Streamlit sessions): the bookkeeping runs under a
+    lock, the computation outside it.
+    """
+
+    def __init__(self, max_bytes: int = 256 << 20):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, pm: PriceMatrix, name: str, params: tuple, compute) -> np.ndarray:
+        key = (tuple(pm.tickers), pm.version, name, params)
+        with self._lock:
+            arr = self._entries.get(key)
+            if arr is not None:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return arr
+            self.misses += 1
+        arr = compute()
+        if arr.nbytes <= self.max_bytes:
+            arr.flags.writeable = False
+            self._put(key, arr)
+        return arr
+
+    def _put(self, key: tuple, arr: np.ndarray):
+        with self._lock:
+            # another thread may have computed the same entry meanwhile
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.nbytes -= old.nbytes
+            self._entries[key] = arr
+            self.nbytes += arr.nbytes
+            self._evict()
+
+    def _evict(self):
+        # caller holds the lock
+        while self.nbytes > self.max_bytes:
+            _, arr = self._entries.popitem(last=False)
+            self.nbytes -= arr.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'nbytes': self.nbytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+# process-wide cache: survives Streamlit reruns and is shared by every strategy and sweep
+INDICATOR_CACHE = IndicatorCache(int(os.environ.get("STRAT_INDICATOR_CACHE_MB", 256)) << 20)
+
+
+def sma(pm: PriceMatrix, window: int, cache: IndicatorCache = None) -> np.ndarray:
+    """Simple moving average of Close over `window` bars (or a time span, see matrix_engine.bars)."""
+    window = bars(window, pm.dates)
+    return (cache or INDICATOR_CACHE).get(pm, 'sma', (window,), lambda: rolling_mean(pm.close, window))
+
+
+def ema(pm: PriceMatrix, span: int, cache: IndicatorCache = None) -> np.ndarray:
+    """Exponential moving average of Close (alpha = 2 / (span + 1)), NaN until `span` bars (or a time span)."""
+    span = bars(span, pm.dates)
+    return (cache or INDICATOR_CACHE).get(pm, 'ema', (span,),
+                                          lambda: ewm_mean(pm.close, 2.0 / (span + 1), min_periods=span))
+
+
+def wilder_rsi(pm: PriceMatrix, period: int, cache: IndicatorCache = None) -> np.ndarray:
+    """RSI with Wilder smoothing over `period` bars (or a time span)."""
+    period = bars(period, pm.dates)
+    return (cache or INDICATOR_CACHE).get(pm, 'wilder_rsi', (period,),
+                                          lambda: _wilder_rsi(pm.close, pm.present, period))
+
+
+def roc(pm: PriceMatrix, lookback: int, cache: IndicatorCache = None) -> np.ndarray:
+    """Rate of change (pct_change) of Close over `lookback` bars (or a time span)."""
+    lookback = bars(lookback, pm.dates)
+    return (cache or INDICATOR_CACHE).get(pm, 'roc', (lookback,), lambda: pct_change(pm.close, lookback))
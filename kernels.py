@@ -0,0 +1,206 @@
+import time
+import numpy as np
+
+try:
+    import numba
+    HAVE_NUMBA = True
+except ImportError:
+    numba = None
+    HAVE_NUMBA = False
+
+
+def _drive(kernel, inputs, params, state, signal):
+    for t in range(signal.shape[0]):
+        kernel(t, inputs, params, state, signal)
+
+
+_compiled = {}
+# without numba, universes up to this many tickers run the per-ticker Python loop (see
+# _LOOPS): below it the per-bar NumPy overhead costs more than it vectorizes away
+LOOP_MAX_TICKERS = 32
+
+
+def run_kernel(kernel, inputs: tuple, params: tuple, n_state: int, use_numba: bool = None) -> np.ndarray:
+    """
+    Run a per-bar state-machine kernel over the dates x tickers matrix and return the
+    signal it writes. The kernel is called once per bar as kernel(t, inputs, params, state, signal):
+    `inputs` is a tuple of (dates x tickers) float arrays, `params` a tuple of floats, `state`
+    an (n_state x tickers) array it updates in place, and it writes row t of `signal`.
+    Kernels use NumPy operations over the ticker axis, so without numba they still run as
+    one vectorized step per bar; with numba (optional) the whole bar loop is compiled.
+    Without numba, small universes (up to LOOP_MAX_TICKERS) of kernels with a scalar
+    loop in _LOOPS run that loop instead, which is faster at that size.
+    """
+    inputs = tuple(np.asarray(x, dtype=np.float64) for x in inputs)
+    params = tuple(float(p) for p in params)
+    use_numba = HAVE_NUMBA if use_numba is None else use_numba
+    if not use_numba and kernel in _LOOPS and inputs[0].shape[1] <= LOOP_MAX_TICKERS:
+        return _LOOPS[kernel](*inputs, *params)
+    state = np.zeros((n_state, inputs[0].shape[1]))
+    signal = np.zeros(inputs[0].shape)
+    if use_numba:
+        if kernel not in _compiled:
+            _compiled[kernel] = numba.njit(kernel)
+        if _drive not in _compiled:
+            _compiled[_drive] = numba.njit(_drive)
+        _compiled[_drive](_compiled[kernel], inputs, params, state, signal)
+    else:
+        _drive(kernel, inputs, params, state, signal)
+    return signal
+
+
+def hysteresis_kernel(t, inputs, params, state, signal):
+    """
+    RSI with hysteresis: long below buy_level, short above sell_level, and in
+    between keep whatever was held last (rather than going flat).
+    inputs = (rsi,), params = (buy_level, sell_level), state = [last signal].
+    """
+    rsi = inputs[0][t]
+    buy_level, sell_level = params
+    held = np.where(rsi < buy_level, 1.0, np.where(rsi > sell_level, -1.0, state[0]))
+    state[0] = held
+    signal[t] = held
+
+
+def stops_kernel(t, inputs, params, state, signal):
+    """
+    Follows a raw target signal subject to risk rules, decided on bar t's close:
+      stop_loss     exit once the move against the entry price reaches this fraction
+      trailing_stop exit once the move back from the best price since entry reaches this fraction
+      min_hold      bars a position must be held before the raw signal may close or flip it
+      max_hold      bars after which a position is closed regardless
+    A zero parameter disables its rule. After a stop or timeout the same side is only
+    re-entered once the raw signal has changed.
+    inputs = (close, raw signal), params = (stop_loss, trailing_stop, min_hold, max_hold),
+    state = [position, entry price, best price, bars held, blocked side].
+    """
+    px = inputs[0][t]
+    raw = inputs[1][t]
+    stop_loss, trailing_stop, min_hold, max_hold = params
+    pos = state[0]
+    entry = state[1]
+    best = state[2]
+    held = state[3]
+    blocked = state[4]
+
+    in_pos = pos != 0
+    best = np.where(pos > 0, np.fmax(best, px), np.where(pos < 0, np.fmin(best, px), best))
+    # flat tickers have no entry price: divide by px instead so they read as 0
+    from_entry = pos * (px / np.where(in_pos, entry, px) - 1)
+    from_best = pos * (px / np.where(in_pos, best, px) - 1)
+    exit_now = in_pos & (
+        ((stop_loss > 0) & (from_entry <= -stop_loss))
+        | ((trailing_stop > 0) & (from_best <= -trailing_stop))
+        | ((max_hold > 0) & (held >= max_hold))
+    )
+    blocked = np.where(exit_now, pos, np.where(raw != blocked, 0.0, blocked))
+    target = np.where((blocked != 0) & (raw == blocked), 0.0, raw)
+    locked = in_pos & (held < min_hold)
+    new_pos = np.where(exit_now, 0.0, np.where(locked, pos, target))
+
+    entered = (new_pos != 0) & (new_pos != pos)
+    state[0] = new_pos
+    state[1] = np.where(entered, px, entry)
+    state[2] = np.where(entered, px, best)
+    state[3] = np.where(entered, 1.0, np.where(new_pos != 0, held + 1, 0.0))
+    state[4] = blocked
+    signal[t] = new_pos
+
+
+# ── plain Python references (one ticker, one bar at a time) for checking and benchmarking ──
+
+def hysteresis_reference(rsi: np.ndarray, buy_level: float, sell_level: float) -> np.ndarray:
+    signal = np.zeros(rsi.shape)
+    for j in range(rsi.shape[1]):
+        held = 0.0
+        out = []
+        # Python floats: scalar numpy indexing would dominate the loop
+        for x in rsi[:, j].tolist():
+            if x < buy_level:
+                held = 1.0
+            elif x > sell_level:
+                held = -1.0
+            out.append(held)
+        signal[:, j] = out
+    return signal
+
+
+def stops_reference(close: np.ndarray, raw: np.ndarray, stop_loss: float, trailing_stop: float,
+                    min_hold: float, max_hold: float) -> np.ndarray:
+    signal = np.zeros(close.shape)
+    for j in range(close.shape[1]):
+        pos = entry = best = held = blocked = 0.0
+        out = []
+        for px, r in zip(close[:, j].tolist(), raw[:, j].tolist()):
+            if pos > 0:
+                best = max(best, px)
+            elif pos < 0:
+                best = min(best, px)
+            exit_now = pos != 0 and (
+                (stop_loss > 0 and pos * (px / entry - 1) <= -stop_loss)
+                or (trailing_stop > 0 and pos * (px / best - 1) <= -trailing_stop)
+                or (max_hold > 0 and held >= max_hold)
+            )
+            if exit_now:
+                blocked = pos
+            elif r != blocked:
+                blocked = 0.0
+            target = 0.0 if blocked != 0 and r == blocked else r
+            if exit_now:
+                new_pos = 0.0
+            elif pos != 0 and held < min_hold:
+                new_pos = pos
+            else:
+                new_pos = target
+            if new_pos != 0 and new_pos != pos:
+                entry = best = px
+                held = 1.0
+            else:
+                held = held + 1 if new_pos != 0 else 0.0
+            pos = new_pos
+            out.append(pos)
+        signal[:, j] = out
+    return signal
+
+
+# scalar per-ticker loops run_kernel may use instead of a kernel: called as loop(*inputs, *params)
+_LOOPS = {hysteresis_kernel: hysteresis_reference, stops_kernel: stops_reference}
+
+
+def benchmark(n_dates: int = 5000, n_tickers: int = 500, seed: int = 0) -> dict:
+    """Time the kernels (compiled and NumPy-per-bar) against the plain Python loops."""
+    rng = np.random.default_rng(seed)
+    close = np.exp(np.cumsum(rng.normal(0, 0.02, (n_dates, n_tickers)), axis=0))
+    # trend-following raw signal: long/short on the sign of the 20-bar move
+    raw = np.zeros_like(close)
+    raw[20:] = np.sign(close[20:] - close[:-20])
+    rsi = rng.uniform(0, 100, (n_dates, n_tickers))
+    cases = {
+        'hysteresis': (hysteresis_kernel, (rsi,), (30.0, 70.0), 1,
+                       lambda: hysteresis_reference(rsi, 30.0, 70.0)),
+        'stops': (stops_kernel, (close, raw), (0.1, 0.15, 5.0, 60.0), 5,
+                  lambda: stops_reference(close, raw, 0.1, 0.15, 5.0, 60.0)),
+    }
+    results = {}
+    for name, (kernel, inputs, params, n_state, reference) in cases.items():
+        timings = {}
+        start = time.perf_counter()
+        expected = reference()
+        timings['python_loop'] = time.perf_counter() - start
+        engines = {'numpy': False, 'numba': True} if HAVE_NUMBA else {'numpy': False}
+        for engine, use_numba in engines.items():
+            if use_numba:
+                run_kernel(kernel, inputs, params, n_state, use_numba=True)  # compile outside the timing
+            start = time.perf_counter()
+            got = run_kernel(kernel, inputs, params, n_state, use_numba=use_numba)
+            timings[engine] = time.perf_counter() - start
+            if not np.array_equal(got, expected):
+                raise AssertionError(f"{name} kernel ({engine}) disagrees with the Python loop")
+        results[name] = timings
+    return results
+
+
+if __name__ == "__main__":
+    for name, timings in benchmark().items():
+        base = timings['python_loop']
+        print(name, "  ".join(f"{k}: {v:.3f}s ({base / v:.0f}x)" for k, v in timings.items()))
@@ -0,0 +1,392 @@
+import hashlib
+import numpy as np
+import pandas as pd
+from compact import expand_dates
+from costs import CostModel, turnover as position_turnover
+from perf import timed
+
+
+class PriceMatrix():
+    """
+    Dense dates x tickers view of a long (Date, Ticker) frame.
+    Cells where a ticker has no bar (e.g. META before its IPO) are NaN.
+    Rolling windows count rows on the shared date axis, which matches the
+    long-format groupby path as long as each ticker trades on every date
+    after it lists (true for a common exchange calendar).
+    """
+
+    def __init__(self, dates: pd.DatetimeIndex, tickers: list[str], close: np.ndarray,
+                 rows: np.ndarray = None, cols: np.ndarray = None):
+        self.dates = dates
+        self.tickers = list(tickers)
+        self.close = close
+        self.present = ~np.isnan(close)
+        # position of each long-format row in the matrix (None if built from wide data)
+        self.rows = rows
+        self.cols = cols
+        self._version = None
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return self.close.shape
+
+    @property
+    def version(self) -> str:
+        """Digest of the dates and prices, so caches can tell two matrices' data apart."""
+        if self._version is None:
+            digest = hashlib.blake2b(digest_size=16)
+            digest.update(str((self.close.shape, self.close.dtype.str)).encode())
+            digest.update(np.ascontiguousarray(self.dates.asi8))
+            digest.update(np.ascontiguousarray(self.close))
+            self._version = digest.hexdigest()
+        return self._version
+
+    @classmethod
+    @timed('PriceMatrix.from_long')
+    def from_long(cls, df: pd.DataFrame, value_col: str = 'Close', tickers: list[str] = None) -> "PriceMatrix":
+        """
+        Scatter a long frame into the matrix, remembering where each row came from.
+        `tickers` fixes the column order (tickers absent from df become all-NaN columns).
+        """
+        date_codes, dates = pd.factorize(df['Date'], sort=True)
+        if pd.api.types.is_integer_dtype(dates):
+            # compact frames carry Date as day offsets
+            dates = expand_dates(dates)
+        if tickers is None:
+            ticker_codes, tickers = pd.factorize(df['Ticker'], sort=True)
+        else:
+            ticker_codes = pd.Categorical(df['Ticker'], categories=tickers).codes.astype(np.int64)
+        values = df[value_col].to_numpy()
+        # keep the source dtype (float32 from wrangle_data) so returns match the pandas path bit for bit
+        dtype = values.dtype if values.dtype.kind == 'f' else np.float64
+        close = np.full((len(dates), len(tickers)), np.nan, dtype=dtype)
+        close[date_codes, ticker_codes] = values
+        return cls(pd.DatetimeIndex(dates), list(tickers), close, date_codes, ticker_codes)
+
+    @classmethod
+    def from_wide(cls, wide: pd.DataFrame) -> "PriceMatrix":
+        """Build from a Date-indexed frame with one column per ticker."""
+        return cls(pd.DatetimeIndex(wide.index), list(wide.columns), wide.to_numpy())
+
+    def to_long(self, arr: np.ndarray) -> np.ndarray:
+        """Gather a (dates x tickers) array back into the long row order."""
+        return arr[self.rows, self.cols]
+
+
+# ── array primitives (axis 0 = dates) ────────────────────────────────────────
+
+def shift(arr: np.ndarray, periods: int = 1, fill=np.nan, axis: int = 0) -> np.ndarray:
+    dtype = arr.dtype if arr.dtype.kind == 'f' else np.result_type(arr.dtype, np.asarray(fill).dtype)
+    out = np.empty(arr.shape, dtype=dtype)
+    src = np.moveaxis(arr, axis, 0)
+    dst = np.moveaxis(out, axis, 0)
+    if periods >= len(src):
+        dst[:] = fill
+        return out
+    dst[:periods] = fill
+    dst[periods:] = src[:-periods]
+    return out
+
+
+def pct_change(close: np.ndarray, periods: int = 1) -> np.ndarray:
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return close / shift(close, periods) - 1
+
+
+def rolling_mean(arr: np.ndarray, window: int) -> np.ndarray:
+    """Trailing mean over `window` rows; NaN unless the whole window is populated."""
+    arr = np.asarray(arr, dtype=np.float64)
+    valid = ~np.isnan(arr)
+    csum = np.cumsum(np.where(valid, arr, 0.0), axis=0)
+    ccount = np.cumsum(valid, axis=0)
+    wsum = csum.copy()
+    wcount = ccount.copy()
+    wsum[window:] -= csum[:-window]
+    wcount[window:] -= ccount[:-window]
+    with np.errstate(invalid='ignore'):
+        return np.where(wcount >= window, wsum / window, np.nan)
+
+
+def _ewm_block(x: np.ndarray, valid: np.ndarray, value: np.ndarray, alpha: float) -> np.ndarray:
+    # y[t] = decay * y[t-1] + alpha * x[t] unrolled: y[t] = scale[t] * (y0 + sum(b[s] / scale[s]))
+    # with scale the running product of the decays, so the rows are one cumsum, not a loop
+    started = np.logical_or.accumulate(valid, axis=0) | ~np.isnan(value)
+    before = np.vstack([~np.isnan(value)[None], started[:-1]])
+    if alpha == 1:
+        # no decay: the latest observation
+        rows = np.where(valid, np.arange(len(x))[:, None], -1)
+        last = np.maximum.accumulate(rows, axis=0)
+        return np.where(last >= 0, np.take_along_axis(x, np.maximum(last, 0), axis=0), value)
+    scale = np.cumprod(np.where(valid & before, 1.0 - alpha, 1.0), axis=0)
+    # a column's first observation replaces its (empty) value outright
+    out = np.where(valid, x, 0.0)
+    out *= np.where(before, alpha, 1.0)
+    out /= scale
+    np.cumsum(out, axis=0, out=out)
+    out += np.nan_to_num(value)
+    out *= scale
+    out[~started] = np.nan
+    return out
+
+
+def ewm_mean(arr: np.ndarray, alpha: float, min_periods: int = 0, state: dict = None) -> np.ndarray:
+    """
+    Recursive EWM equivalent to pandas `ewm(alpha=..., adjust=False)` per column.
+    NaNs are skipped (leading ones included), so each column starts at its own first value.
+    `state` ({'value', 'count'} per column) resumes a previous run and is
+    updated in place with the values after the last row.
+    """
+    arr = np.asarray(arr, dtype=np.float64)
+    flat = arr.reshape(len(arr), int(np.prod(arr.shape[1:])))
+    if state and 'value' in state:
+        value = np.asarray(state['value'], dtype=np.float64).reshape(-1)
+        count = np.asarray(state['count']).reshape(-1)
+    else:
+        value = np.full(flat.shape[1], np.nan)
+        count = np.zeros(flat.shape[1], dtype=np.int64)
+    valid = ~np.isnan(flat)
+    out = np.empty_like(flat)
+    # blocks short enough that decay ** rows stays far above underflow (1 / scale must not overflow)
+    decay = 1.0 - alpha
+    rows = max(int(-230 / np.log(decay)) if 0 < decay < 1 else len(flat), 1)
+    for start in range(0, len(flat), rows):
+        block = slice(start, start + rows)
+        out[block] = _ewm_block(flat[block], valid[block], value, alpha)
+        value = out[block][-1]
+    if min_periods > 1:
+        out[count + np.cumsum(valid, axis=0, dtype=np.int32) < min_periods] = np.nan
+    if state is not None:
+        state['value'] = value.reshape(arr.shape[1:])
+        state['count'] = (count + valid.sum(axis=0)).reshape(arr.shape[1:])
+    return out.reshape(arr.shape)
+
+
+def wilder_rsi(close: np.ndarray, present: np.ndarray, period: int, state: dict = None) -> np.ndarray:
+    """
+    RSI with Wilder smoothing, one column per ticker (no cross-ticker bleed).
+    With a populated `state` (from a previous call), row 0 is taken as the last bar
+    already folded into it and the averages carry on from there; the state is
+    updated in place either way.
+    """
+    delta = np.diff(close.astype(np.float64), axis=0, prepend=np.nan)
+    gain = np.where(delta > 0, delta, 0.0)
+    loss = np.where(delta < 0, -delta, 0.0)
+    # a ticker's first bar counts as a zero move, as in the long path; before listing there is no data
+    gain[~present] = np.nan
+    loss[~present] = np.nan
+    gain_state = loss_state = None
+    if state is not None:
+        if state:
+            gain[0] = loss[0] = np.nan
+        gain_state = state.setdefault('gain', {})
+        loss_state = state.setdefault('loss', {})
+    avg_gain = ewm_mean(gain, 1.0 / period, min_periods=period, state=gain_state)
+    avg_loss = ewm_mean(loss, 1.0 / period, min_periods=period, state=loss_state)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return 100.0 - (100.0 / (1.0 + avg_gain / avg_loss))
+
+
+def positions_from_signal(signal: np.ndarray, present: np.ndarray) -> np.ndarray:
+    """
+    Trade on the next bar: per-ticker shift(1) with a flat first position.
+    `signal` may carry a leading parameter axis (configs x dates x tickers).
+    """
+    axis = signal.ndim - 2
+    return shift(np.where(present, signal, 0.0), 1, fill=0.0, axis=axis)
+
+
+# pandas 2.2 renamed the annual period alias
+_PERIOD_ALIASES = {'A': 'Y'}
+
+
+def rebalance_rows(dates: pd.DatetimeIndex, freq: str) -> np.ndarray:
+    """Boolean mask of the first row of each `freq` period ('D', 'W', 'M', 'Q', 'A')."""
+    periods = pd.DatetimeIndex(dates).to_period(_PERIOD_ALIASES.get(freq, freq)).asi8
+    return np.concatenate([[True], periods[1:] != periods[:-1]]) if len(periods) else np.zeros(0, dtype=bool)
+
+
+def bars(window, dates) -> int:
+    """
+    A window length in bars of the date axis `dates`. Numbers are bars already; time
+    spans ('30min', '2h', '5D', pd.Timedelta) are converted: spans under a day by the
+    median spacing of bars within a day, whole days as trading days times the median
+    number of bars per day (so '5D' is 5 daily bars, or 5 x 390 minute bars).
+    """
+    if isinstance(window, (int, np.integer)) or (isinstance(window, float) and window.is_integer()):
+        return int(window)
+    span = pd.Timedelta(window)
+    # nanosecond ticks whatever the index's resolution, to compare with span.value
+    stamps = pd.DatetimeIndex(dates).as_unit('ns')
+    days = stamps.normalize().asi8
+    if span >= pd.Timedelta(days=1):
+        per_day = np.median(np.unique(days, return_counts=True)[1]) if len(days) else 1
+        n = span / pd.Timedelta(days=1) * per_day
+    else:
+        same_day = days[1:] == days[:-1]
+        steps = np.diff(stamps.asi8)[same_day]
+        if not len(steps):
+            raise ValueError(f"Window {window!r} is shorter than a bar")
+        n = span.value / np.median(steps)
+    if round(n) < 1:
+        raise ValueError(f"Window {window!r} is shorter than a bar")
+    return int(round(n))
+
+
+def frame_bars(window, df: pd.DataFrame) -> int:
+    """bars() on the date axis of a long frame."""
+    if isinstance(window, (int, np.integer)):
+        return int(window)
+    dates = np.unique(df['Date'])
+    return bars(window, expand_dates(dates) if pd.api.types.is_integer_dtype(dates) else dates)
+
+
+def top_n_mask(scores: np.ndarray, n: int) -> np.ndarray:
+    """
+    Per row, mark the `n` highest scores (NaN never selected; rows with fewer valid
+    scores select them all). argpartition is O(tickers) per row, unlike a full sort
+    or rank; ties at the cut are broken arbitrarily.
+    """
+    mask = np.zeros(scores.shape, dtype=bool)
+    n = min(int(n), scores.shape[1])
+    if n <= 0 or not scores.size:
+        return mask
+    keyed = np.where(np.isnan(scores), np.inf, -scores)
+    if n < scores.shape[1]:
+        top = np.argpartition(keyed, n - 1, axis=1)[:, :n]
+    else:
+        top = np.broadcast_to(np.arange(n), (len(scores), n))
+    np.put_along_axis(mask, top, True, axis=1)
+    return mask & ~np.isnan(scores)
+
+
+# ── segmented primitives (long format, one row block per ticker) ─────────────
+
+class Segments():
+    """
+    Row blocks of a long frame sorted by ticker (each ticker one contiguous block, in
+    date order), as wrangle_data returns it. Values are padded into a (bars x segments)
+    array by position within the block, so the column-wise primitives above run over
+    every ticker in one pass and their state starts afresh at each block boundary;
+    windows count rows within the ticker, exactly like groupby('Ticker').
+    """
+
+    def __init__(self, keys):
+        # factorize Series/arrays as they are: converting string columns to object arrays costs more
+        codes, uniques = pd.factorize(keys if isinstance(keys, (pd.Series, pd.Index, np.ndarray)) else np.asarray(keys))
+        # factorize numbers keys by first appearance, so blocks are contiguous iff codes never decrease
+        if len(codes) and (np.diff(codes) < 0).any():
+            raise ValueError("Rows must be grouped by ticker (sort by Ticker, then Date)")
+        self.keys = np.asarray(uniques, dtype=object)
+        self.starts = np.searchsorted(codes, np.arange(len(uniques)))
+        self.cols = codes
+        self.rows = np.arange(len(codes)) - self.starts[codes]
+        self.shape = (int(self.rows.max()) + 1 if len(codes) else 0, len(uniques))
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, key: str = 'Ticker') -> "Segments":
+        return cls(df[key])
+
+    def pad(self, values) -> np.ndarray:
+        values = np.asarray(values)
+        # float32 stays float32, as in PriceMatrix.from_long
+        dtype = values.dtype if values.dtype.kind == 'f' else np.float64
+        out = np.full(self.shape, np.nan, dtype=dtype)
+        out[self.rows, self.cols] = values
+        return out
+
+    def gather(self, arr: np.ndarray) -> np.ndarray:
+        return arr[self.rows, self.cols]
+
+    def shift(self, values, periods: int = 1, fill=np.nan) -> np.ndarray:
+        # padding only trails each block, so shifting down never pulls it in
+        return self.gather(shift(self.pad(values), periods, fill))
+
+    def diff(self, values, periods: int = 1) -> np.ndarray:
+        padded = self.pad(values)
+        return self.gather(padded - shift(padded, periods))
+
+    def pct_change(self, values, periods: int = 1) -> np.ndarray:
+        return self.gather(pct_change(self.pad(values), periods))
+
+    def cumprod(self, values) -> np.ndarray:
+        """Running product per ticker skipping NaN (left as NaN), like groupby().cumprod()."""
+        padded = self.pad(values)
+        out = np.nancumprod(padded, axis=0)
+        out[np.isnan(padded)] = np.nan
+        return self.gather(out)
+
+    def rolling_mean(self, values, window: int) -> np.ndarray:
+        return self.gather(rolling_mean(self.pad(values), window))
+
+    def ewm_mean(self, values, alpha: float, min_periods: int = 0) -> np.ndarray:
+        return self.gather(ewm_mean(self.pad(values), alpha, min_periods))
+
+
+def net_returns(strat_rtn: np.ndarray, pos: np.ndarray, cost_model: CostModel = None,
+                last_pos: np.ndarray = None, present: np.ndarray = None) -> dict[str, np.ndarray]:
+    """
+    Per-cell 'turnover' (|change in pos|) and 'net_rtn' (strat_rtn less `cost_model`'s
+    costs; NaN where strat_rtn is). `last_pos` is the position before the first row;
+    with `present` each ticker's turnover is taken between its own bars (costs.turnover).
+    """
+    turnover = position_turnover(pos, last_pos, present)
+    cost = (cost_model or CostModel()).costs(turnover)
+    return {'turnover': turnover, 'net_rtn': strat_rtn - cost}
+
+
+@timed('compute_returns_matrix')
+def compute_returns_matrix(pm: PriceMatrix, pos: np.ndarray, cost_model: CostModel = None,
+                           portfolio=None) -> dict[str, np.ndarray]:
+    """
+    Array version of TradingStrategy.compute_returns.
+    Returns per-cell 'returns', 'strat_rtn' (gross), 'turnover', 'net_rtn' (after
+    `cost_model`), 'cumulative_rtn' and a per-date 'port_cumulative_rtn' (weighted by
+    `portfolio`, a portfolio.PortfolioConstructor; default equal weight across tickers
+    with a return that day); the cumulative ones are gross.
+    """
+    returns = pct_change(pm.close)
+    strat_rtn = pos * returns
+    missing = np.isnan(strat_rtn)
+    cumulative_rtn = np.where(missing, 1.0, np.nancumprod(1 + strat_rtn, axis=0))
+
+    if portfolio is not None:
+        port_daily = portfolio.daily_returns(pm, strat_rtn, returns)
+    else:
+        count = (~missing).sum(axis=1)
+        with np.errstate(invalid='ignore'):
+            port_daily = np.where(count > 0, np.nansum(strat_rtn, axis=1) / count, np.nan)
+    port_cum = np.nancumprod(1 + port_daily)
+    port_cum[np.isnan(port_daily)] = np.nan
+    return {
+        'returns': returns,
+        'strat_rtn': strat_rtn,
+        **net_returns(strat_rtn, pos, cost_model, present=pm.present),
+        'cumulative_rtn': cumulative_rtn,
+        'port_cumulative_rtn': port_cum,
+    }
+
+
+@timed('run_matrix')
+def run_matrix(strategy, df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Run `strategy` on the dense matrix and hand back the same long-format
+    columns as strategy.run(df) on the pandas path, in the original row order.
+    The one exception is a ticker missing bars mid-history: the matrix sees the gap
+    (its first return after it is NaN, windows restart), the pandas path chains
+    the rows on either side of it.
+    """
+    pm = PriceMatrix.from_long(df)
+    signals = strategy.compute_signals_matrix(pm)
+    rtns = compute_returns_matrix(pm, signals['pos'], strategy.cost_model, strategy.portfolio)
+
+    out = df.copy()
+    for col, arr in signals.items():
+        out[col] = pm.to_long(arr)
+    out['returns'] = pm.to_long(rtns['returns'])
+    out['strat_rtn'] = pm.to_long(rtns['strat_rtn'])
+    # float like the pandas path's diff(), also for integer positions
+    out['turnover'] = pm.to_long(rtns['turnover']).astype(np.float64)
+    out['net_rtn'] = pm.to_long(rtns['net_rtn'])
+    out['cumulative_rtn'] = pm.to_long(rtns['cumulative_rtn'])
+    out['port_cumulative_rtn'] = rtns['port_cumulative_rtn'][pm.rows]
+    return out
@@ -0,0 +1,228 @@
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from costs import turnover as position_turnover
+from matrix_engine import PriceMatrix
+from signal_store import SIGNALS_PATH
+
+TRADING_DAYS = 252
+# per (strategy, ticker) metrics for the full history, next to the signals dataset
+METRICS_PATH = SIGNALS_PATH / "_metrics.parquet"
+# Ticker value of the equal-weight portfolio rows
+PORTFOLIO_TICKER = "_portfolio"
+METRICS = ['total_return', 'cagr', 'vol', 'sharpe', 'sortino', 'max_drawdown', 'max_drawdown_days',
+           'calmar', 'hit_rate', 'exposure', 'turnover', 'days']
+
+
+def periods_per_year(dates) -> float:
+    """
+    Bars per year of a date axis, for annualizing: TRADING_DAYS times the median number
+    of bars per day for intraday bars, else TRADING_DAYS over the median number of
+    business days between bars (exactly TRADING_DAYS for daily bars, about 50 for weekly).
+    """
+    days = pd.DatetimeIndex(dates).normalize()
+    if len(days) < 2:
+        return TRADING_DAYS
+    per_day = np.median(np.unique(days.asi8, return_counts=True)[1])
+    if per_day > 1:
+        return TRADING_DAYS * per_day
+    day_stamps = days.to_numpy().astype('datetime64[D]')
+    gap = np.median(np.busday_count(day_stamps[:-1], day_stamps[1:]))
+    return TRADING_DAYS / max(gap, 1)
+
+
+_SUMS = ['rows', 'n', 'sum', 'sumsq', 'downsq', 'up', 'down', 'log', 'peak', 'peak_row', 'under', 'below',
+         'exposure', 'turnover']
+_COUNTS = {'rows', 'n', 'up', 'down', 'peak_row', 'below'}
+
+
+def metric_sums(rtn: np.ndarray, pos: np.ndarray = None, turnover: np.ndarray = None,
+                last: dict = None) -> dict[str, np.ndarray]:
+    """
+    The running sums compute_metrics reduces the dates axis (-2) of `rtn` to (see
+    metrics_from_sums). Passing the sums of the bars before as `last` folds a later
+    stretch of the same series in, so metrics of a growing history never re-read it.
+    """
+    valid = ~np.isnan(rtn)
+    r = np.where(valid, rtn, 0.0)
+    shape = rtn.shape[:-2] + rtn.shape[-1:]
+    if last is None:
+        last = {kind: np.zeros(shape, dtype=np.int64 if kind in _COUNTS else np.float64) for kind in _SUMS}
+        last['peak'] = np.full(shape, -np.inf)
+        if pos is None:
+            last['exposure'] = np.full(shape, np.nan)
+        if turnover is None and pos is None:
+            last['turnover'] = np.full(shape, np.nan)
+    if not rtn.shape[-2]:
+        return {kind: arr.copy() for kind, arr in last.items()}
+    rows = last['rows'][..., None, :] + np.arange(rtn.shape[-2]).reshape(-1, 1)
+    cum = last['log'][..., None, :] + np.cumsum(np.log1p(r), axis=-2)
+    peak = np.maximum(np.maximum.accumulate(cum, axis=-2), last['peak'][..., None, :])
+    under = cum - peak
+    # the latest row at a peak, and bars since it
+    peak_row = np.maximum(np.maximum.accumulate(np.where(under == 0, rows, 0), axis=-2), last['peak_row'][..., None, :])
+    if turnover is None and pos is not None:
+        turnover = position_turnover(pos)
+    return {
+        'rows': rows[..., -1, :] + 1,
+        'n': last['n'] + valid.sum(axis=-2),
+        'sum': last['sum'] + r.sum(axis=-2),
+        'sumsq': last['sumsq'] + (r * r).sum(axis=-2),
+        'downsq': last['downsq'] + (np.minimum(r, 0.0) ** 2).sum(axis=-2),
+        'up': last['up'] + (r > 0).sum(axis=-2),
+        'down': last['down'] + (r < 0).sum(axis=-2),
+        'log': cum[..., -1, :],
+        'peak': peak[..., -1, :],
+        'peak_row': peak_row[..., -1, :],
+        'under': np.minimum(last['under'], under.min(axis=-2)),
+        'below': np.maximum(last['below'], (rows - peak_row).max(axis=-2)),
+        'exposure': last['exposure'] + (0.0 if pos is None else np.where(valid, np.abs(pos), 0.0).sum(axis=-2)),
+        'turnover': last['turnover'] + (0.0 if turnover is None else np.where(valid, turnover, 0.0).sum(axis=-2)),
+    }
+
+
+def metrics_from_sums(sums: dict[str, np.ndarray], periods_per_year: float = TRADING_DAYS) -> dict[str, np.ndarray]:
+    """compute_metrics from the metric_sums of the series."""
+    n = sums['n']
+    # no bars at all: no path either, so no total return or drawdown rather than 0
+    empty = sums['rows'] == 0
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = sums['sum'] / n
+        std = np.sqrt(np.maximum(sums['sumsq'] - n * mean * mean, 0.0) / (n - 1))
+        downside = np.sqrt(sums['downsq'] / n)
+        cagr = np.expm1(sums['log'] * periods_per_year / n)
+        max_drawdown = np.where(empty, np.nan, np.expm1(sums['under']))
+        return {
+            'total_return': np.where(empty, np.nan, np.expm1(sums['log'])),
+            'cagr': cagr,
+            'vol': std * periods_per_year ** 0.5,
+            'sharpe': mean / std * periods_per_year ** 0.5,
+            'sortino': mean / downside * periods_per_year ** 0.5,
+            'max_drawdown': max_drawdown,
+            'max_drawdown_days': sums['below'],
+            'calmar': cagr / -max_drawdown,
+            'hit_rate': sums['up'] / (sums['up'] + sums['down']),
+            'exposure': sums['exposure'] / n,
+            'turnover': sums['turnover'] / n * periods_per_year,
+            'days': n,
+        }
+
+
+def compute_metrics(rtn: np.ndarray, pos: np.ndarray = None, turnover: np.ndarray = None,
+                    periods_per_year: float = TRADING_DAYS) -> dict[str, np.ndarray]:
+    """
+    Metrics of every return series in `rtn` at once: dates on axis -2, series (tickers,
+    strategies, ...) on the last axis and any leading axes, e.g. configs x dates x tickers.
+    NaN means no return that day: it is skipped, and flat for the drawdown path.
+      cagr, vol, sharpe, sortino    annualized; sortino's downside deviation is about 0
+      max_drawdown, _days           deepest fall from a running peak, longest time (bars) below one
+      calmar                        cagr / |max_drawdown|
+      hit_rate                      up days / days with a non-zero return
+      exposure                      mean |pos| over the days with a return (needs pos)
+      turnover                      annualized mean |change in pos| (turnover, or derived from pos)
+    Returns one array per metric with the dates axis reduced (NaN, 0 days, with no dates).
+    """
+    return metrics_from_sums(metric_sums(rtn, pos, turnover), periods_per_year)
+
+
+def portfolio_sums(rtn: np.ndarray, pos: np.ndarray, turnover: np.ndarray = None) -> dict[str, np.ndarray]:
+    """
+    Per-date sums over the tickers (last axis) with a return: of the returns, of |pos|
+    and of turnover, plus their count. Sums of disjoint ticker blocks add up, so the
+    equal-weight portfolio can be accumulated block by block.
+    """
+    valid = ~np.isnan(rtn)
+    if turnover is None:
+        turnover = position_turnover(pos)
+    return {
+        'sum': np.where(valid, rtn, 0.0).sum(axis=-1),
+        'count': valid.sum(axis=-1),
+        'exposure': np.where(valid, np.abs(pos), 0.0).sum(axis=-1),
+        'turnover': np.where(valid, turnover, 0.0).sum(axis=-1),
+    }
+
+
+def portfolio_metrics(sums: dict[str, np.ndarray], periods_per_year: float = TRADING_DAYS) -> dict[str, float]:
+    """compute_metrics of the equal-weight portfolio given its portfolio_sums."""
+    count = sums['count']
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # per-date means over the tickers with a return; NaN where there are none
+        daily = {k: np.where(count > 0, sums[k] / count, np.nan) for k in ('sum', 'exposure', 'turnover')}
+    out = compute_metrics(daily['sum'][:, None], np.nan_to_num(daily['exposure'])[:, None],
+                          np.nan_to_num(daily['turnover'])[:, None], periods_per_year)
+    return {k: v.item() for k, v in out.items()}
+
+
+def weighted_returns(weights: np.ndarray, rtn: np.ndarray) -> np.ndarray:
+    """Portfolio return per date of (dates x tickers) weights and returns; NaN on dates with nothing weighted."""
+    invested = np.abs(weights).sum(axis=1) > 0
+    return np.where(invested, (weights * np.nan_to_num(rtn)).sum(axis=1), np.nan)
+
+
+def weighted_portfolio_metrics(rtn: np.ndarray, pos: np.ndarray, turnover: np.ndarray, weights: np.ndarray,
+                               periods_per_year: float = TRADING_DAYS) -> dict[str, float]:
+    """
+    compute_metrics of the portfolio holding `weights` (dates x tickers, e.g. from
+    PortfolioConstructor.weights) of each ticker's strategy; dates with nothing
+    weighted have no return. Exposure and turnover are weighted the same way.
+    """
+    daily = weighted_returns(weights, rtn)
+    # like portfolio_sums, only tickers with a return that day count
+    held = np.where(np.isnan(rtn), 0.0, np.abs(weights))
+    exposure = (held * np.abs(np.nan_to_num(pos))).sum(axis=1)
+    turned = (held * np.nan_to_num(turnover)).sum(axis=1)
+    out = compute_metrics(daily[:, None], exposure[:, None], turned[:, None], periods_per_year)
+    return {k: v.item() for k, v in out.items()}
+
+
+def metrics_frame(strategy: str, tickers: list[str], metrics: dict) -> pd.DataFrame:
+    """Rows of the metrics table: one per ticker (a scalar metrics dict is one row)."""
+    return pd.DataFrame({'strategy': strategy, 'Ticker': tickers, **{k: metrics[k] for k in METRICS}},
+                        index=range(len(tickers)))
+
+
+def panel_metrics(strategy: str, tickers: list[str], rtn: np.ndarray, pos: np.ndarray,
+                  turnover: np.ndarray = None, periods_per_year: float = TRADING_DAYS,
+                  weights: np.ndarray = None) -> pd.DataFrame:
+    """
+    Metrics table of a (dates x tickers) panel: a row per ticker plus the portfolio,
+    equal weight or holding `weights` (see weighted_portfolio_metrics).
+    """
+    if weights is None:
+        portfolio = portfolio_metrics(portfolio_sums(rtn, pos, turnover), periods_per_year)
+    else:
+        if turnover is None:
+            turnover = position_turnover(pos)
+        portfolio = weighted_portfolio_metrics(rtn, pos, turnover, weights, periods_per_year)
+    return pd.concat([
+        metrics_frame(strategy, tickers, compute_metrics(rtn, pos, turnover, periods_per_year)),
+        metrics_frame(strategy, [PORTFOLIO_TICKER], portfolio),
+    ], ignore_index=True)
+
+
+def frame_metrics(df: pd.DataFrame, suffix: str = None, strategy: str = None, portfolio=None) -> pd.DataFrame:
+    """
+    panel_metrics of a long frame with strat_rtn, pos and turnover columns: either
+    load_signals output (columns f'{col}_{suffix}') or a strategy.run result. If a
+    `portfolio` (portfolio.PortfolioConstructor) is given, the portfolio row holds its
+    weights, set from the frame's Close column.
+    """
+    cols = {col: col if suffix is None else f'{col}_{suffix}' for col in ('strat_rtn', 'pos', 'turnover')}
+    pms = {col: PriceMatrix.from_long(df, name) for col, name in cols.items()}
+    weights = None if portfolio is None else portfolio.weights(PriceMatrix.from_long(df, 'Close', pms['pos'].tickers))
+    return panel_metrics(strategy or suffix, pms['pos'].tickers, *(pm.close for pm in pms.values()),
+                         periods_per_year=periods_per_year(pms['pos'].dates), weights=weights)
+
+
+def write_metrics(table: pd.DataFrame, path: Path = METRICS_PATH):
+    table.reset_index(drop=True).to_parquet(path, index=False)
+
+
+def load_metrics(suffix: str = None, tickers: list[str] = None, path: Path = METRICS_PATH) -> pd.DataFrame:
+    """Stored metrics, for one strategy and/or tickers (PORTFOLIO_TICKER selects the portfolio row)."""
+    filters = []
+    if suffix is not None:
+        filters.append(('strategy', '==', suffix))
+    if tickers is not None:
+        filters.append(('Ticker', 'in', list(tickers)))
+    return pd.read_parquet(path, filters=filters or None)
@@ -0,0 +1,194 @@
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from matrix_engine import PriceMatrix, compute_returns_matrix
+from sweep import param_grid, sweep
+from TradingStrats import CompositeStrategy, composite_signals
+from perf import timed
+
+# the price matrix each worker attached to in _init_worker
+_WORKER_PM = None
+_WORKER_SHM = None
+
+
+def _init_worker(shm_name: str, shape: tuple, dtype: str, dates: pd.DatetimeIndex, tickers: list[str]):
+    global _WORKER_PM, _WORKER_SHM
+    if _WORKER_SHM is not None:
+        if _WORKER_SHM.name == shm_name:
+            return
+        _WORKER_PM = None
+        try:
+            _WORKER_SHM.close()
+        except BufferError:
+            # something still holds a view of the old matrix; it is unmapped once that goes
+            pass
+    # pool workers share the parent's resource tracker, so attaching doesn't take ownership
+    _WORKER_SHM = shared_memory.SharedMemory(name=shm_name)
+    close = np.ndarray(shape, dtype=dtype, buffer=_WORKER_SHM.buf)
+    close.flags.writeable = False
+    _WORKER_PM = PriceMatrix(dates, tickers, close)
+
+
+def _shared_task(matrix: tuple, fn, *args):
+    # attach to the matrix the task was submitted for, if the pool has moved on to another
+    _init_worker(*matrix)
+    return fn(*args)
+
+
+def worker_matrix() -> PriceMatrix:
+    """The shared price matrix, inside a SharedPriceMatrix pool worker."""
+    return _WORKER_PM
+
+
+class SharedPriceMatrix():
+    """
+    Process pool whose workers see the parent's close matrix through shared memory.
+    The matrix is copied into the shared block once; tasks only carry their parameters.
+    share() swaps in another matrix (e.g. the next ticker block) without restarting
+    the workers; tasks for it go through submit(). `pm` may be None to share one later.
+    """
+
+    def __init__(self, pm: PriceMatrix, workers: int):
+        self.pm = pm
+        self.workers = workers
+        self.shm = None
+        self.matrix = None
+
+    def share(self, pm: PriceMatrix):
+        close = pm.close
+        old = self.shm
+        self.pm = pm
+        self.shm = shared_memory.SharedMemory(create=True, size=max(1, close.nbytes))
+        np.ndarray(close.shape, dtype=close.dtype, buffer=self.shm.buf)[:] = close
+        self.matrix = (self.shm.name, close.shape, close.dtype.str, pm.dates, pm.tickers)
+        if old is not None:
+            # workers still attached keep their mapping until they move on
+            old.close()
+            old.unlink()
+
+    def submit(self, fn, *args):
+        """Run fn(*args) in the pool against the matrix currently shared."""
+        return self.pool.submit(_shared_task, self.matrix, fn, *args)
+
+    def __enter__(self) -> ProcessPoolExecutor:
+        if self.pm is not None:
+            self.share(self.pm)
+        self.pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_worker if self.matrix is not None else None,
+            initargs=self.matrix or (),
+        )
+        return self.pool
+
+    def __exit__(self, *exc):
+        self.pool.shutdown()
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+
+
+def _column_block(pm: PriceMatrix, cols: slice) -> PriceMatrix:
+    return PriceMatrix(pm.dates, pm.tickers[cols], pm.close[:, cols])
+
+
+def _signals_task(strategy, cols: slice, pm: PriceMatrix = None) -> tuple[dict, dict]:
+    block = _column_block(pm if pm is not None else _WORKER_PM, cols)
+    state = {}
+    signals = strategy.compute_signals_matrix(block, state=state)
+    # keep per-cell outputs only; anything else can't be stitched back by column
+    return {k: v for k, v in signals.items() if np.shape(v) == block.shape}, state
+
+
+def _composites_task(strategies: dict, cols: slice, pm: PriceMatrix = None) -> dict[str, tuple[dict, dict]]:
+    # one expression batch per ticker block: shared subexpressions run once for all of them
+    block = _column_block(pm if pm is not None else _WORKER_PM, cols)
+    return {name: (signals, {}) for name, signals in composite_signals(strategies, block).items()}
+
+
+def merge_states(parts: list[dict]) -> dict:
+    """Stitch per-ticker state arrays (possibly nested in dicts) back together in block order."""
+    if isinstance(parts[0], dict):
+        return {k: merge_states([part[k] for part in parts]) for k in parts[0]}
+    return np.concatenate(parts, axis=-1)
+
+
+def _sweep_task(strategy_cls, params: pd.DataFrame, costs: dict = None) -> pd.DataFrame:
+    return sweep(strategy_cls, _WORKER_PM, params=params, costs=costs)
+
+
+def _ticker_blocks(n_tickers: int, n_blocks: int) -> list[slice]:
+    bounds = np.linspace(0, n_tickers, min(n_blocks, n_tickers) + 1).astype(int)
+    return [slice(a, b) for a, b in zip(bounds[:-1], bounds[1:])]
+
+
+def _named(part, name: str) -> dict:
+    return part if name is None else {name: part}
+
+
+@timed('run_strategies')
+def run_strategies(strategies: dict, pm: PriceMatrix, workers: int = 1, ticker_blocks: int = None,
+                   states: dict = None, shared: SharedPriceMatrix = None) -> dict[str, dict[str, np.ndarray]]:
+    """
+    Signals + returns for several strategies on the matrix engine, sharded by
+    strategy and by ticker block across a process pool.
+    Each strategy maps to compute_signals_matrix output plus compute_returns_matrix
+    output. Cross-sectional strategies are sharded by strategy only. Composite
+    (expression) strategies go together, one task per ticker block, so what their
+    expressions share is computed once. Blocks are stitched back in ticker order and
+    the portfolio curve is computed afterwards, so the result is bit-identical for any `workers`.
+    If a `states` dict is passed it receives each strategy's end-of-run state.
+    `shared`, an entered SharedPriceMatrix, runs the tasks on its pool (sharing pm
+    with it) instead of starting one, so successive calls reuse the same workers.
+    """
+    if ticker_blocks is None:
+        # enough blocks that every worker has something to do
+        ticker_blocks = -(-workers // max(1, len(strategies)))
+    blocks = _ticker_blocks(len(pm.tickers), ticker_blocks)
+    composites = {name: strat for name, strat in strategies.items() if isinstance(strat, CompositeStrategy)}
+    # (task, its strategy or strategies, ticker block, name for single-strategy tasks);
+    # cross-sectional strategies see the whole universe in one task
+    calls = [(_signals_task, strat, cols, name) for name, strat in strategies.items() if name not in composites
+             for cols in ([slice(None)] if strat.cross_sectional else blocks)]
+    calls += [(_composites_task, composites, cols, None) for cols in (blocks if composites else [])]
+
+    if shared is not None:
+        shared.share(pm)
+        futures = [shared.submit(fn, arg, cols) for fn, arg, cols, _ in calls]
+        parts = [_named(f.result(), name) for f, (_, _, _, name) in zip(futures, calls)]
+    elif workers <= 1:
+        parts = [_named(fn(arg, cols, pm), name) for fn, arg, cols, name in calls]
+    else:
+        with SharedPriceMatrix(pm, workers) as pool:
+            futures = [pool.submit(fn, arg, cols) for fn, arg, cols, _ in calls]
+            parts = [_named(f.result(), name) for f, (_, _, _, name) in zip(futures, calls)]
+
+    results = {}
+    for name in strategies:
+        # every task's output as {name: (signals, state)}, in ticker block order
+        named = [part[name] for part in parts if name in part]
+        signals = {k: np.concatenate([sig[k] for sig, _ in named], axis=1) for k in named[0][0]}
+        results[name] = {**signals, **compute_returns_matrix(pm, signals['pos'], strategies[name].cost_model,
+                                                            strategies[name].portfolio)}
+        if states is not None:
+            states[name] = merge_states([state for _, state in named])
+    return results
+
+
+def parallel_sweep(strategy_cls, df, workers: int = 1, chunk_size: int = None, costs: dict = None,
+                   **grid) -> pd.DataFrame:
+    """
+    sweep() with the parameter grid split into contiguous chunks across a process pool.
+    Rows come back in grid order and match a serial sweep exactly.
+    """
+    pm = df if isinstance(df, PriceMatrix) else PriceMatrix.from_long(df)
+    params = param_grid(strategy_cls, **grid)
+    if workers <= 1:
+        return sweep(strategy_cls, pm, params=params, costs=costs)
+    if chunk_size is None:
+        # a few chunks per worker to even out load; contiguous chunks keep shared windows together
+        chunk_size = max(1, -(-len(params) // (4 * workers)))
+    chunks = [params.iloc[i:i + chunk_size] for i in range(0, len(params), chunk_size)]
+    with SharedPriceMatrix(pm, workers) as pool:
+        futures = [pool.submit(_sweep_task, strategy_cls, chunk, costs) for chunk in chunks]
+        return pd.concat([f.result() for f in futures], ignore_index=True)
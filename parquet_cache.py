@@ -1,16 +1,51 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime
+from signal_store import load_signals, load_events, date_bounds
+from aggregates import SignalAggregates
+from metrics import PORTFOLIO_TICKER, load_metrics, frame_metrics, compute_metrics, periods_per_year
+from portfolio import PORTFOLIO_REGISTRY, get_portfolio, frame_portfolio_daily
+from matrix_engine import PriceMatrix
+from events import trade_list, trade_stats
+from compact import expand_dates
+import perf
 
 # if 'prev_strat' not in st.session_state:
 #     st.session_state.prev_strat = None
 #     st.session_state.prev_stocks = None
 
 @st.cache_data(ttl=None)
-def load_precomputed():
-    return pd.read_parquet("precomputed_signals.parquet")
+def load_precomputed(suffix: str, tickers: tuple, start_ts: pd.Timestamp, end_ts: pd.Timestamp):
+    # only this strategy's columns, for the selected tickers and dates, in the compact
+    # schema since every session holds its own copy
+    return load_signals(suffix, list(tickers), start_ts, end_ts, compact=True)
 
-df_pre = load_precomputed()
+@st.cache_data(ttl=None)
+def load_date_bounds():
+    return date_bounds()
+
+@st.cache_data(ttl=None)
+def load_stored_metrics(suffix: str):
+    # full-history metrics written by precompute_signals
+    return load_metrics(suffix)
+
+@st.cache_data(ttl=None)
+def load_weighted_daily(suffix: str, tickers: tuple, weighting: str, rebalance_freq: str):
+    # weights need the history before the selected range, so they run on every date
+    df = load_signals(suffix, list(tickers), compact=True)
+    return frame_portfolio_daily(df, get_portfolio(weighting, rebalance_freq=rebalance_freq), f'strat_rtn_{suffix}')
+
+@st.cache_data(ttl=None)
+def load_trades(suffix: str, tickers: tuple, start_ts: pd.Timestamp, end_ts: pd.Timestamp):
+    # trades from the stored position changes, with returns over the selected range
+    df = load_precomputed(suffix, tickers, start_ts, end_ts)
+    trades = trade_list(load_events(suffix, list(tickers), end_ts), PriceMatrix.from_long(df, f'strat_rtn_{suffix}'))
+    return trades[trades['exit_date'].isna() | (trades['exit_date'] > start_ts)]
+
+@st.cache_resource
+def load_aggregates():
+    # prefix sums: a new date range or ticker subset is a lookup, not a pivot
+    return SignalAggregates()
 
 #h
 # ── UI: title ───────────────────────────────────────────────────
@@ -42,10 +77,15 @@ all_stocks = ["TSLA","MSFT","AAPL","GOOG","AMZN","NVDA","META"]
 with st.container(border=True):
     selected_stocks = st.multiselect("Stocks", all_stocks, default=all_stocks)
     portfolio_return = st.toggle("portfolio_return", value=True)
+    # equal weight reads the stored prefix sums; the others are computed from the signals
+    weighting = st.selectbox("Portfolio weighting", [name for name in PORTFOLIO_REGISTRY if name != "fixed"])
+    rebalance_freq = st.selectbox("Portfolio Rebalance", options=['D','W','M','Q','A'], index=2,
+                                  disabled=weighting == "equal")
 
 # ── UI: date selection ──────────────────────────────────────────────
-min_date = df_pre['Date'].min().date()
-max_date = df_pre['Date'].max().date()
+first_date, last_date = load_date_bounds()
+min_date = first_date.date()
+max_date = last_date.date()
 
 # Default: full range
 default_start = min_date
@@ -84,10 +124,7 @@ if len(date_range) == 2:
     start_ts = pd.Timestamp(start_date)
     end_ts   = pd.Timestamp(end_date)
 
-    df_filt = df_pre[
-        (df_pre['Date'] >= start_ts) &
-        (df_pre['Date'] <= end_ts)
-    ].copy()
+    df_filt = load_precomputed(suffix, tuple(selected_stocks), start_ts, end_ts)
 
     st.caption(f"Filtered: {len(df_filt)} rows from {start_date} to {end_date}")
 else:
@@ -96,38 +133,27 @@ else:
     # df_filt = df_pre.copy()
 
 if df_filt.empty == False:
-    df_filt['strat_rtn'] = df_filt[f'strat_rtn_{suffix}']
-
-    port_daily = (
-        df_filt.pivot_table(
-            index='Date',
-            columns='Ticker',
-            values='strat_rtn',
-            aggfunc='mean'          # equal weight = average across stocks
-        )
-        .mean(axis=1)               # final portfolio daily return
-        .rename('portfolio_daily_ret')
-    )
-
-    port_cum = (1 + port_daily).cumprod().rename('port_cumulative_rtn')
-
-    df_plot = df_filt.merge(
-        port_cum.to_frame(),
-        left_on='Date',
-        right_index=True,
-        how='left'
-    )
+    aggregates = load_aggregates()
+    tickers = sorted(selected_stocks)
 
-    tab1, tab2 = st.tabs(["Chart", "Dataframe"])
+    tab1, tab2, tab3 = st.tabs(["Chart", "Dataframe", "Trades"])
     if portfolio_return:
+        if weighting != "equal":
+            daily = load_weighted_daily(suffix, tuple(tickers), weighting, rebalance_freq)[start_ts:end_ts]
+            port_cum = (1 + daily).cumprod()
+            metrics = compute_metrics(daily.to_numpy()[:, None], periods_per_year=periods_per_year(daily.index))
+            stats = {k: v.item() for k, v in metrics.items()}
+        else:
+            port_cum = aggregates.portfolio_cumulative(suffix, tickers, start_ts, end_ts)
+            stats = aggregates.portfolio_stats(suffix, tickers, start_ts, end_ts)
+
         # strat return chart
-        tab1.line_chart((df_plot.drop_duplicates(subset='Date').set_index('Date')['port_cumulative_rtn']-1) * 100, height=250)
+        tab1.line_chart((port_cum - 1) * 100, height=250)
         
         # strat return stats
-        sharpe_ratio = (port_daily.mean() / port_daily.std()) * (252**0.5)
-        sharpe_text = f"Sharpe Ratio: {sharpe_ratio:.2f}"
+        sharpe_text = f"Sharpe Ratio: {stats['sharpe']:.2f}"
         
-        total_ret = (port_cum.iloc[-1] - 1 ) *100
+        total_ret = stats['total_return'] * 100
         total_ret_text = f"{total_ret:+.1f}%"
         
         st.markdown(
@@ -135,14 +161,33 @@ if df_filt.empty == False:
     )
         
     else:
-        df_filt['pct_change_close'] = df_filt.groupby('Ticker')['Close'].pct_change()
-        df_filt['avg_pct_change'] = df_filt.groupby('Date')['pct_change_close'].transform('mean')
-        df_filt['base_cum_rtn'] = (1 + df_filt['avg_pct_change']).cumprod()
-        tab1.line_chart(df_filt.drop_duplicates(subset='Date').set_index('Date')['base_cum_rtn'], height=250)
-
-    tab2.dataframe(df_filt, height=250, use_container_width=True)
+        # baseline: equal-weight portfolio of the underlying returns (buy & hold)
+        base_cum = aggregates.portfolio_cumulative("buy_and_hold", tickers, start_ts, end_ts)
+        tab1.line_chart(base_cum.rename('base_cum_rtn'), height=250)
+
+    tab2.dataframe(df_filt.assign(Date=expand_dates(df_filt['Date'])), height=250, use_container_width=True)
+
+    trades = load_trades(suffix, tuple(tickers), start_ts, end_ts)
+    trade_summary = trade_stats(trades)
+    tab3.caption(f"{trade_summary['trades']} closed trades ({trade_summary['open']} open) | "
+                 f"win rate {trade_summary['win_rate']:.0%} | mean {trade_summary['mean_bars']:.1f} bars held")
+    tab3.dataframe(trades, height=250, use_container_width=True)
+
+    # metrics: stored ones for the full history, otherwise computed on the loaded rows in one pass
+    with perf.span("parquet_cache.metrics", rows=len(df_filt)):
+        if (start_date, end_date) == (min_date, max_date):
+            metrics = load_stored_metrics(suffix)
+            keep = tickers + ([PORTFOLIO_TICKER] if tickers == sorted(all_stocks) else [])
+            metrics = metrics[metrics['Ticker'].isin(keep)]
+            if PORTFOLIO_TICKER not in keep:
+                metrics = pd.concat([metrics, frame_metrics(df_filt, suffix).tail(1)])
+        else:
+            metrics = frame_metrics(df_filt, suffix)
+    st.dataframe(metrics.drop(columns='strategy').set_index('Ticker'), use_container_width=True)
 
     # Now use df_plot or port_cum for charts, metrics, etc.
     # st.line_chart(port_cum)
 else:
-    st.info("Please select an end date to see results.")
\ No newline at end of file
+    st.info("Please select an end date to see results.")
+
+perf.render_panel(st)
@@ -1,7 +1,7 @@
-import pandas as pd
+from signal_store import load_signals
 
 # Load and view the first few rows
-df = pd.read_parquet("precomputed_signals.parquet")
+df = load_signals()
 print(df.head(10))                  # first 10 rows
 print(df.tail(5))                   # last few
 print(df.info())                    # column types, memory, non-null counts
@@ -0,0 +1,206 @@
+import cProfile
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+import pandas as pd
+
+try:
+    import psutil
+    _PROC = psutil.Process()
+except ImportError:
+    psutil = None
+    _PROC = None
+
+try:
+    import pyinstrument
+except ImportError:
+    pyinstrument = None
+
+# STRAT_PERF=1 records spans from import on; enable() / disable() switch at runtime
+PERF_ENV = "STRAT_PERF"
+# STRAT_PROFILE=cprofile|pyinstrument captures a profile around each profile() block into STRAT_PROFILE_DIR
+PROFILE_ENV = "STRAT_PROFILE"
+PROFILE_DIR_ENV = "STRAT_PROFILE_DIR"
+
+_enabled = os.environ.get(PERF_ENV, "") not in ("", "0")
+_lock = threading.Lock()
+_stats = {}
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def _rss() -> int:
+    return _PROC.memory_info().rss if _PROC is not None else 0
+
+
+def _record(name: str, wall: float, rows, mem_delta: int):
+    with _lock:
+        entry = _stats.get(name)
+        if entry is None:
+            entry = _stats[name] = {'calls': 0, 'total_s': 0.0, 'max_s': 0.0, 'rows': 0, 'mem_delta_mb': 0.0}
+        entry['calls'] += 1
+        entry['total_s'] += wall
+        entry['max_s'] = max(entry['max_s'], wall)
+        entry['rows'] += rows or 0
+        entry['mem_delta_mb'] += mem_delta / 2**20
+
+
+class _Span():
+    __slots__ = ('name', 'rows', '_start', '_rss')
+
+    def __init__(self, name: str, rows: int = None):
+        self.name = name
+        self.rows = rows
+
+    def __enter__(self):
+        self._rss = _rss()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        _record(self.name, time.perf_counter() - self._start, self.rows, _rss() - self._rss)
+
+
+class _NoSpan():
+    __slots__ = ()
+    rows = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name: str, rows: int = None):
+    """
+    Time a block: wall time, rows processed and RSS change are added to `name`'s stats.
+    `rows` can also be set on the returned span inside the block. A no-op when disabled.
+    """
+    return _Span(name, rows) if _enabled else _NO_SPAN
+
+
+def _count_rows(obj) -> int:
+    # long frames count rows, matrices (PriceMatrix or arrays) count cells
+    if isinstance(obj, pd.DataFrame):
+        return len(obj)
+    close = getattr(obj, 'close', obj)
+    return getattr(close, 'size', None)
+
+
+def timed(name: str = None, rows=None):
+    """
+    Decorator recording each call as a span named `name` (default the function's
+    qualified name). `rows` is a function of the result; by default the first
+    DataFrame/PriceMatrix argument is counted. Disabled, it costs one flag check.
+    """
+    def wrap(fn):
+        label = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with _Span(label) as s:
+                result = fn(*args, **kwargs)
+                if rows is not None:
+                    s.rows = rows(result)
+                else:
+                    s.rows = next((n for n in map(_count_rows, args) if n is not None), None)
+            return result
+        wrapper.__perf_timed__ = True
+        return wrapper
+    return wrap
+
+
+def instrument(cls, methods: list[str]):
+    """Wrap the `methods` cls itself defines with timed(), named f'{cls.__name__}.{method}'."""
+    for method in methods:
+        fn = cls.__dict__.get(method)
+        if callable(fn) and not getattr(fn, '__perf_timed__', False):
+            setattr(cls, method, timed(f'{cls.__name__}.{method}')(fn))
+
+
+def stats() -> pd.DataFrame:
+    """Aggregated spans, slowest total first."""
+    with _lock:
+        table = pd.DataFrame.from_dict(_stats, orient='index')
+    if table.empty:
+        return table
+    table['mean_s'] = table['total_s'] / table['calls']
+    table['rows_per_s'] = table['rows'] / table['total_s'].where(table['total_s'] > 0)
+    return table.rename_axis('span').sort_values('total_s', ascending=False)
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+
+
+def dump_json(path: Path):
+    """Write the aggregated spans as {span: stats}."""
+    with _lock:
+        data = {name: dict(entry) for name, entry in _stats.items()}
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2)
+
+
+@contextmanager
+def profile(label: str):
+    """
+    Capture a profile of the block when STRAT_PROFILE is set: 'cprofile' writes
+    <label>.prof (for pstats/snakeviz), 'pyinstrument' (if installed) <label>.html,
+    into STRAT_PROFILE_DIR (default perf/).
+    """
+    mode = os.environ.get(PROFILE_ENV, "").lower()
+    if mode not in ("cprofile", "pyinstrument") or (mode == "pyinstrument" and pyinstrument is None):
+        yield
+        return
+    out_dir = Path(os.environ.get(PROFILE_DIR_ENV, "perf"))
+    out_dir.mkdir(parents=True, exist_ok=True)
+    if mode == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(out_dir / f"{label}.prof")
+    else:
+        profiler = pyinstrument.Profiler()
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            (out_dir / f"{label}.html").write_text(profiler.output_html())
+
+
+def render_panel(st):
+    """Optional Streamlit "perf" panel; pass the streamlit module (or a container)."""
+    with st.expander("perf"):
+        if not _enabled:
+            st.caption(f"Instrumentation is off; set {PERF_ENV}=1 to record spans.")
+            return
+        st.dataframe(stats(), use_container_width=True)
+        if st.button("Reset perf stats"):
+            reset()
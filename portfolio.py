@@ -0,0 +1,249 @@
+import numpy as np
+import pandas as pd
+from matrix_engine import PriceMatrix, pct_change, rebalance_rows
+from metrics import periods_per_year, weighted_returns
+
+
+def _prefix(arr: np.ndarray) -> np.ndarray:
+    # running sums along the dates axis with a leading zero row: window [a, b) is prefix[b] - prefix[a]
+    return np.concatenate([np.zeros((1,) + arr.shape[1:]), np.cumsum(arr, axis=0)])
+
+
+def _window_sums(arr: np.ndarray, rows: np.ndarray, lookback: int) -> np.ndarray:
+    """Sums of the `lookback` rows of `arr` before each of `rows` (fewer near the start)."""
+    prefix = _prefix(arr)
+    return prefix[rows] - prefix[np.maximum(rows - lookback, 0)]
+
+
+def _normalize(raw: np.ndarray) -> np.ndarray:
+    # rows of non-negative scores to weights summing to 1 (all-zero rows stay in cash)
+    total = raw.sum(axis=1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(total > 0, raw / total, 0.0)
+
+
+def rolling_covariance(returns: np.ndarray, rows: np.ndarray, lookback: int, batch_size: int = None):
+    """
+    Yield (k, cov) with the sample covariances (len(k) x tickers x tickers) of the
+    `lookback` returns before each rows[k], in order. NaN returns count as 0, so only
+    entries of tickers with a full window are meaningful.
+    Each block of rows is one gather of its (rows x lookback x tickers) windows and a
+    batched matrix product, which runs at BLAS speed even for daily rebalancing of
+    hundreds of tickers; blocks hold `batch_size` rows (default about 64MB of windows).
+    """
+    x = np.nan_to_num(np.asarray(returns, dtype=np.float64))
+    rows = np.asarray(rows)
+    n = x.shape[1]
+    if batch_size is None:
+        batch_size = max(1, (64 << 20) // (8 * n * max(n, lookback)))
+    offsets = np.arange(-lookback, 0)
+    for start in range(0, len(rows), batch_size):
+        k = np.arange(start, min(start + batch_size, len(rows)))
+        # rows too early for a full window read from row 0 on; their tickers aren't eligible anyway
+        windows = x[np.maximum(rows[k, None] + offsets, 0)]
+        windows -= windows.mean(axis=1, keepdims=True)
+        yield k, np.matmul(windows.transpose(0, 2, 1), windows) / (lookback - 1)
+
+
+def risk_parity_weights(cov: np.ndarray, budgets: np.ndarray, eligible: np.ndarray, start: np.ndarray = None,
+                        max_iter: int = 100, tol: float = 1e-8) -> np.ndarray:
+    """
+    Weights whose risk contributions w_i (cov w)_i are proportional to `budgets`, for a
+    batch of covariances (batch x tickers x tickers), over the `eligible` tickers only.
+    Minimizes the strictly convex 1/2 y'cov y - sum b log y, whose optimum has
+    y_i (cov y)_i = b_i, by cyclical coordinate descent (each coordinate's minimum is
+    the root of a quadratic); then w = y / sum y. Coordinates are visited one at a time
+    but every step covers the whole batch.
+    Descent starts from the weights `start` (e.g. the previous rebalance's, which are
+    close for daily rebalancing) where they are positive, else from inverse volatility.
+    """
+    b = _normalize(np.where(eligible, budgets, 0.0))
+    var = np.where(eligible, np.diagonal(cov, axis1=1, axis2=2), 1.0)
+    y = _normalize(np.where(eligible, b / np.sqrt(var), 0.0))
+    if start is not None:
+        y = np.where(eligible & (start > 0), start, y)
+    # best scale of the starting direction: y'cov y = sum b
+    marginal = np.matmul(cov, y[:, :, None])[:, :, 0]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        scale = np.nan_to_num(1 / np.sqrt((y * marginal).sum(axis=1, keepdims=True)), posinf=0.0)
+    y *= scale
+    marginal *= scale
+    # per-coordinate slices as contiguous rows: (tickers x batch)
+    y, marginal = np.ascontiguousarray(y.T), np.ascontiguousarray(marginal.T)
+    var, four_vb, mask = var.T.copy(), 4 * (var * b).T, eligible.T.astype(np.float64)
+    cov = np.ascontiguousarray(cov.transpose(1, 2, 0))
+    active = np.flatnonzero(eligible.any(axis=0))
+    for _ in range(max_iter):
+        before = y.copy()
+        for i in active:
+            c = marginal[i] - var[i] * y[i]
+            new = (np.sqrt(c * c + four_vb[i]) - c) / (2 * var[i]) * mask[i]
+            marginal += cov[i] * (new - y[i])
+            y[i] = new
+        if np.abs(y - before).max(initial=0.0) <= tol * np.abs(y).max(initial=0.0):
+            break
+    return _normalize(y.T)
+
+
+class PortfolioConstructor():
+    """
+    Per-date ticker weights for combining per-ticker strategy returns, set at the first
+    row of each `rebalance_freq` period ('D', 'W', 'M', 'Q', 'A') and held until the next.
+    Weights at a rebalance use returns up to the bar before, so nothing looks ahead.
+    Ragged listings are explicit: a ticker is weighted only if it has a return on the
+    rebalance row and on the `lookback` rows before it, so a new listing joins at the
+    first rebalance after it has the history; until then its share is spread over the
+    others. A weighted ticker without a return on some day (a gap or delisting) earns
+    nothing that day, as if held in cash.
+    """
+    name: str = "Unspecified portfolio"
+    lookback: int = 0
+
+    def __init__(self, rebalance_freq: str = 'M'):
+        self.rebalance_freq = rebalance_freq
+
+    def eligible(self, returns: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        """(rebalance rows x tickers) mask of the tickers that can be weighted."""
+        valid = ~np.isnan(returns)
+        ok = valid[rows]
+        if self.lookback:
+            ok &= _window_sums(valid, rows, self.lookback) == self.lookback
+        return ok
+
+    def target_weights(self, pm: PriceMatrix, returns: np.ndarray, rows: np.ndarray,
+                       eligible: np.ndarray) -> np.ndarray:
+        """(rebalance rows x tickers) weights, zero where not `eligible`."""
+        raise NotImplementedError
+
+    def weights(self, pm: PriceMatrix, returns: np.ndarray = None) -> np.ndarray:
+        """(dates x tickers) weights; `returns` defaults to the close-to-close returns of pm."""
+        returns = pct_change(pm.close) if returns is None else returns
+        rows = np.flatnonzero(rebalance_rows(pm.dates, self.rebalance_freq))
+        target = self.target_weights(pm, returns, rows, self.eligible(returns, rows))
+        held = np.searchsorted(rows, np.arange(len(pm.dates)), side='right') - 1
+        return target[held]
+
+    def daily_returns(self, pm: PriceMatrix, strat_rtn: np.ndarray, returns: np.ndarray = None) -> np.ndarray:
+        """Portfolio return per date from per-ticker returns; NaN on dates with nothing weighted."""
+        return weighted_returns(self.weights(pm, returns), strat_rtn)
+
+
+class EqualWeight(PortfolioConstructor):
+    name = "Equal weight"
+
+    def __init__(self, rebalance_freq: str = 'D'):
+        # daily: the mean over the tickers with a return that day, as compute_returns did
+        super().__init__(rebalance_freq)
+
+    def target_weights(self, pm, returns, rows, eligible):
+        return _normalize(eligible.astype(np.float64))
+
+
+class FixedWeights(PortfolioConstructor):
+    name = "Fixed weights"
+
+    def __init__(self, weights: dict[str, float], renormalize: bool = True, rebalance_freq: str = 'M'):
+        # renormalize=False keeps a missing ticker's weight in cash instead of spreading it
+        super().__init__(rebalance_freq)
+        self.fixed = weights
+        self.renormalize = renormalize
+
+    def target_weights(self, pm, returns, rows, eligible):
+        fixed = np.array([self.fixed.get(t, 0.0) for t in pm.tickers], dtype=np.float64)
+        target = np.where(eligible, fixed, 0.0)
+        if self.renormalize:
+            target = _normalize(np.abs(target)) * np.sign(target) * np.abs(fixed).sum()
+        return target
+
+
+class InverseVolatility(PortfolioConstructor):
+    name = "Inverse volatility"
+
+    def __init__(self, lookback: int = 63, rebalance_freq: str = 'M'):
+        super().__init__(rebalance_freq)
+        self.lookback = lookback
+
+    def target_weights(self, pm, returns, rows, eligible):
+        r = np.nan_to_num(returns)
+        total, total_sq = _window_sums(r, rows, self.lookback), _window_sums(r * r, rows, self.lookback)
+        var = np.maximum(total_sq - total * total / self.lookback, 0.0) / (self.lookback - 1)
+        ok = eligible & (var > 0)
+        return _normalize(np.where(ok, 1 / np.sqrt(np.where(ok, var, 1.0)), 0.0))
+
+
+class RiskParity(PortfolioConstructor):
+    name = "Risk parity"
+
+    def __init__(self, lookback: int = 63, budgets: dict[str, float] = None, rebalance_freq: str = 'M',
+                 max_iter: int = 100, tol: float = 1e-8, batch_size: int = None):
+        # equal risk contributions unless per-ticker risk `budgets` are given
+        super().__init__(rebalance_freq)
+        self.lookback = lookback
+        self.budgets = budgets
+        self.max_iter = max_iter
+        self.tol = tol
+        self.batch_size = batch_size
+
+    def target_weights(self, pm, returns, rows, eligible):
+        budgets = np.ones(len(pm.tickers)) if self.budgets is None else \
+            np.array([self.budgets.get(t, 0.0) for t in pm.tickers], dtype=np.float64)
+        target = np.zeros(eligible.shape)
+        last = None
+        for k, cov in rolling_covariance(returns, rows, self.lookback, self.batch_size):
+            ok = eligible[k] & (np.diagonal(cov, axis1=1, axis2=2) > 0)
+            target[k] = risk_parity_weights(cov, budgets, ok, last, self.max_iter, self.tol)
+            last = target[k[-1]]
+        return target
+
+
+class VolatilityTarget(PortfolioConstructor):
+    name = "Volatility target"
+
+    def __init__(self, target_vol: float = 0.10, base: PortfolioConstructor = None, lookback: int = 63,
+                 max_leverage: float = 1.0, rebalance_freq: str = 'M', batch_size: int = None):
+        # scales `base` (default equal weight) so its ex-ante annualized volatility is target_vol
+        super().__init__(rebalance_freq)
+        self.target_vol = target_vol
+        self.base = base or EqualWeight(rebalance_freq)
+        self.lookback = lookback
+        self.max_leverage = max_leverage
+        self.batch_size = batch_size
+
+    def eligible(self, returns, rows):
+        return super().eligible(returns, rows) & self.base.eligible(returns, rows)
+
+    def target_weights(self, pm, returns, rows, eligible):
+        base = self.base.target_weights(pm, returns, rows, eligible)
+        scale = np.full(len(rows), float(self.max_leverage))
+        periods = periods_per_year(pm.dates)
+        for k, cov in rolling_covariance(returns, rows, self.lookback, self.batch_size):
+            vol = np.sqrt(np.maximum(np.einsum('bi,bij,bj->b', base[k], cov, base[k]), 0.0) * periods)
+            with np.errstate(divide='ignore'):
+                scale[k] = np.minimum(self.target_vol / vol, self.max_leverage)
+        return base * scale[:, None]
+
+
+PORTFOLIO_REGISTRY = {
+    "equal": EqualWeight,
+    "fixed": FixedWeights,
+    "inverse_vol": InverseVolatility,
+    "risk_parity": RiskParity,
+    "vol_target": VolatilityTarget,
+}
+
+
+def get_portfolio(name: str, **params) -> PortfolioConstructor:
+    portfolio_class = PORTFOLIO_REGISTRY.get(name)
+    if not portfolio_class:
+        raise ValueError(f"Unknown portfolio construction: {name}")
+    return portfolio_class(**params)
+
+
+def frame_portfolio_daily(df: pd.DataFrame, portfolio: PortfolioConstructor, rtn_col: str = 'strat_rtn') -> pd.Series:
+    """
+    Daily portfolio returns of a long frame with Close and a per-ticker return column
+    (a strategy.run result, or load_signals output with rtn_col=f'strat_rtn_{suffix}').
+    """
+    pm = PriceMatrix.from_long(df)
+    strat_rtn = PriceMatrix.from_long(df, rtn_col, pm.tickers).close
+    return pd.Series(portfolio.daily_returns(pm, strat_rtn), index=pm.dates, name='portfolio_daily_ret')
@@ -1,46 +1,290 @@
+import argparse
+import pickle
+from contextlib import nullcontext
+import numpy as np
 import pandas as pd
 from pathlib import Path
 from TradingStrats import STRATEGY_REGISTRY, get_strategy, BuyAndHold, MovingAverageCrossover, RSIMeanReversion, TimeSeriesMomentum
-from WrangleData import wrangle_data
+from WrangleData import wrangle_data, first_closes
+from matrix_engine import PriceMatrix, compute_returns_matrix, net_returns
+from parallel import SharedPriceMatrix, run_strategies, merge_states
+from price_store import load_dates
+from signal_store import SIGNALS_PATH, DENSE_COLS, reset_store, write_part, write_events, load_events
+from events import position_events, last_values
+from aggregates import AGGREGATES_PATH, AggregatesWriter, SignalAggregates, append_aggregates
+from metrics import (METRICS_PATH, PORTFOLIO_TICKER, metric_sums, metrics_from_sums, metrics_frame, periods_per_year,
+                     write_metrics)
+from costs import CostModel
+import perf
 
 DATA_DIR = Path("data")
-OUTPUT_PARQUET = Path("precomputed_signals.parquet")
-
-def precompute_signals():
-    tickers = [f.stem for f in DATA_DIR.glob("*.csv")]
-    df = wrangle_data(tickers)
-    strategies = {
-        "buy_and_hold": BuyAndHold(),
-        "mavg_50_200": MovingAverageCrossover(short_win=50, long_win=200),
-        "rsi_14_30_70": RSIMeanReversion(period=14, buy_level=30, sell_level=70),
-        "momentum_126_0": TimeSeriesMomentum(lookback=126, threshold=0.0),
+# ticker-partitioned parquet dataset, see signal_store
+OUTPUT_PARQUET = SIGNALS_PATH
+# rolling state for incremental updates (leading underscore: parquet readers skip it)
+STATE_FILE = OUTPUT_PARQUET / "_state.pkl"
+# bumped when the state's layout changes: an older state falls back to a full run
+STATE_VERSION = 2
+
+# costs behind the net_rtn columns: a liquid large-cap assumption
+COSTS = CostModel(spread_bps=2.0, slippage_bps=1.0)
+
+STRATEGIES = {
+    "buy_and_hold": BuyAndHold(cost_model=COSTS),
+    "mavg_50_200": MovingAverageCrossover(short_win=50, long_win=200, cost_model=COSTS),
+    "rsi_14_30_70": RSIMeanReversion(period=14, buy_level=30, sell_level=70, cost_model=COSTS),
+    "momentum_126_0": TimeSeriesMomentum(lookback=126, threshold=0.0, cost_model=COSTS),
+}
+
+@perf.timed('assemble_output')
+def assemble_output(df: pd.DataFrame, pm: PriceMatrix, results: dict) -> pd.DataFrame:
+    """
+    Build the output table: one shared (Date, Ticker) key, sorted by Ticker then Date,
+    with each strategy's columns gathered from its (dates x tickers) arrays by position.
+    No joins, so cost grows linearly with the number of strategies. signal/pos are
+    left out: they are stored as change events (see _events).
+    """
+    order = np.lexsort((pm.rows, pm.cols))
+    flat = (pm.rows * len(pm.tickers) + pm.cols)[order]
+    columns = {
+        'Date': df['Date'].to_numpy()[order],
+        'Ticker': df['Ticker'].to_numpy()[order],
+        'Close': df['Close'].to_numpy()[order],
+    }
+    for name, res in results.items():
+        for col in DENSE_COLS:
+            columns[f'{col}_{name}'] = res[col].ravel()[flat]
+    return pd.DataFrame(columns)
+
+
+def _events(pm: PriceMatrix, results: dict, last: dict = None) -> pd.DataFrame:
+    """Every strategy's signal/pos change events, continuing from `last` (per strategy) if given."""
+    return pd.concat([
+        position_events(pm, res, None if last is None else last[name]).assign(strategy=name)
+        for name, res in results.items()
+    ], ignore_index=True)
+
+
+def _last_pos(pos: np.ndarray, present: np.ndarray, before: np.ndarray = None) -> np.ndarray:
+    """Each ticker's pos on its last present bar (`before`, default flat, if it has none)."""
+    rows = len(present) - 1 - np.argmax(present[::-1], axis=0)
+    last = pos[rows, np.arange(pos.shape[1])]
+    return np.where(present.any(axis=0), last, 0 if before is None else before)
+
+
+def _ticker_metrics(name: str, pm: PriceMatrix, sums: dict) -> pd.DataFrame:
+    return metrics_frame(name, pm.tickers, metrics_from_sums(sums, periods_per_year(pm.dates)))
+
+
+@perf.timed('write_metrics')
+def _write_metrics(ticker_tables: list[pd.DataFrame]):
+    """Store the per-ticker metrics plus each strategy's whole-universe portfolio row."""
+    aggregates = SignalAggregates(AGGREGATES_PATH)
+    portfolio = [metrics_frame(name, [PORTFOLIO_TICKER], aggregates.portfolio_metrics(name)) for name in STRATEGIES]
+    table = pd.concat(ticker_tables + portfolio).sort_values(['strategy', 'Ticker'], kind='stable')
+    write_metrics(table, METRICS_PATH)
+
+
+def _strategy_config(strategies: dict) -> dict:
+    return {name: (type(strat).__name__, vars(strat)) for name, strat in strategies.items()}
+
+
+def _save_state(pm: PriceMatrix, base: dict, carry: dict, strategies: dict, part: int):
+    """
+    Keep only what the next update needs: the trailing closes covering every
+    strategy's warmup, each ticker's first close (`base`, to normalize new bars
+    like the stored ones) plus, per strategy, its indicator state, the running
+    cumulative return, the last position and the metric sums per ticker (`carry`).
+    """
+    warmup = max(strat.warmup_bars() for strat in strategies.values())
+    state = {
+        'version': STATE_VERSION,
+        'config': _strategy_config(strategies),
+        'tickers': pm.tickers,
+        'tail_dates': pm.dates[-warmup:],
+        'tail_close': pm.close[-warmup:],
+        'base': base,
+        'part': part,
+        'strategies': carry,
     }
-    
-    results_dfs = []
-    
-    for name, strat in strategies.items():
-        strat_df = strat.run(df.copy())
-        keep_cols = ['Date', 'Ticker', 'Close', 'signal', 'pos', 'strat_rtn', 'cumulative_rtn']
-        strat_df = strat_df[keep_cols]
-        strat_df = strat_df.rename(columns={
-            'signal': f'signal_{name}',
-            'pos': f'pos_{name}',
-            'strat_rtn': f'strat_rtn_{name}',
-            'cumulative_rtn': f'cumulative_rtn_{name}'
-            # 'strat_cumulative_rtn': f'strat_cumulative_rtn_{name}'
-        })
-        results_dfs.append(strat_df)
-        
-        # Merge all strategies on data and ticker
-        df_all = results_dfs[0]
-        for other in results_dfs[1:]:
-            df_all = df_all.merge(
-                other.drop(columns=['Close']),
-                on = ['Date', 'Ticker'],
-                how = 'outer'
-            )
-    df_all = df_all.sort_values(['Ticker', 'Date']).reset_index(drop=True)
-    df_all.to_parquet(OUTPUT_PARQUET, index=False, compression='snappy')
+    with open(STATE_FILE, 'wb') as f:
+        pickle.dump(state, f)
+
+
+def _load_state() -> dict:
+    if not STATE_FILE.exists():
+        return None
+    with open(STATE_FILE, 'rb') as f:
+        return pickle.load(f)
+
+
+@perf.timed('precompute_signals')
+def precompute_signals(workers: int = 1, chunk_size: int = None):
+    """
+    Run every strategy config over data/*.csv and write OUTPUT_PARQUET with its
+    signal/pos change events, plus the per-ticker prefix sums the app's range queries read (see aggregates) and the
+    full-history metrics table (see metrics).
+    workers > 1 shards the strategies (and ticker blocks) over a process pool;
+    the output is identical to a serial run.
+    chunk_size streams the universe through in blocks of that many tickers: each
+    block is loaded, run and written before the next is read, and the portfolio
+    is kept as per-date accumulators, so peak memory follows the block size rather
+    than the universe. The output is identical to a single-block run.
+    """
+    tickers = sorted(f.stem for f in DATA_DIR.glob("*.csv"))
+    dates = load_dates()
+    chunk_size = chunk_size or len(tickers)
+    if chunk_size < len(tickers) and any(strat.cross_sectional for strat in STRATEGIES.values()):
+        raise ValueError("Cross-sectional strategies need the whole universe; run without chunk_size")
+    resumable = all(strat.warmup_bars() is not None for strat in STRATEGIES.values())
+    warmup = max(strat.warmup_bars() for strat in STRATEGIES.values()) if resumable else 0
+    tail_dates = dates[max(len(dates) - warmup, 0):]
+    tail_close = None
+    states = {name: [] for name in STRATEGIES}
+    cums = {name: [] for name in STRATEGIES}
+    last_pos = {name: [] for name in STRATEGIES}
+    sums = {name: [] for name in STRATEGIES}
+    base = {}
+    metric_tables = []
+    event_tables = []
+
+    reset_store(OUTPUT_PARQUET)
+    writer = AggregatesWriter(dates, tickers, list(STRATEGIES), AGGREGATES_PATH)
+    # one process pool for every block: each block's matrix is shared with the same workers
+    shared = SharedPriceMatrix(None, workers) if workers > 1 else None
+    with shared or nullcontext():
+        for start in range(0, len(tickers), chunk_size):
+            block = tickers[start:start + chunk_size]
+            df = wrangle_data(block, columns=['Close'])
+            # a column for every ticker, also one whose CSV has no bars yet
+            pm = PriceMatrix.from_long(df, tickers=block)
+            block_states = {}
+            results = run_strategies(STRATEGIES, pm, workers=workers, states=block_states, shared=shared)
+            write_part(assemble_output(df, pm, results), 0, OUTPUT_PARQUET)
+            event_tables.append(_events(pm, results))
+            writer.add(pm, results)
+            block_sums = {name: metric_sums(res['strat_rtn'], res['pos'], res['turnover']) for name, res in results.items()}
+            metric_tables += [_ticker_metrics(name, pm, block_sums[name]) for name in STRATEGIES]
+            if resumable:
+                # this block's slice of the trailing closes kept for incremental updates
+                if tail_close is None:
+                    tail_close = np.full((len(tail_dates), len(tickers)), np.nan, dtype=pm.close.dtype)
+                src = pm.dates.get_indexer(tail_dates)
+                tail_close[src >= 0, start:start + len(block)] = pm.close[src[src >= 0]]
+                base.update(first_closes(block))
+                for name in STRATEGIES:
+                    states[name].append(block_states[name])
+                    # running product, not the 1.0 written for rows without a return
+                    cums[name].append(np.nancumprod(1 + results[name]['strat_rtn'], axis=0)[-1])
+                    last_pos[name].append(_last_pos(results[name]['pos'], pm.present))
+                    sums[name].append(block_sums[name])
+            del df, pm, results, block_sums
+    writer.close()
+    write_events(pd.concat(event_tables, ignore_index=True), OUTPUT_PARQUET)
+    _write_metrics(metric_tables)
+
+    if resumable:
+        carry = {
+            name: {
+                'indicators': merge_states(states[name]),
+                'cum': np.concatenate(cums[name]),
+                'pos': np.concatenate(last_pos[name]),
+                'metrics': merge_states(sums[name]),
+            }
+            for name in STRATEGIES
+        }
+        _save_state(PriceMatrix(tail_dates, tickers, tail_close), base, carry, STRATEGIES, part=0)
+
+
+@perf.timed('update_signals')
+def update_signals(workers: int = 1, chunk_size: int = None):
+    """
+    Append-only refresh: read and compute rows only for bars dated after the last
+    precomputed date and write them as a new part file; the strategies' warmup
+    comes from the trailing closes kept in the state.
+    Falls back to a full precompute_signals() when there is no usable state
+    (first run, ticker set or strategy configs changed). Assumes the CSVs are
+    refreshed together, i.e. no ticker gets a bar back-filled before that date.
+    The per-ticker metrics fold the new rows into the sums kept in the state, so
+    the stored rows are never read back.
+    """
+    state = _load_state()
+    tickers = sorted(f.stem for f in DATA_DIR.glob("*.csv"))
+    if (state is None or state.get('version') != STATE_VERSION or state['tickers'] != tickers
+            or state['config'] != _strategy_config(STRATEGIES)):
+        return precompute_signals(workers, chunk_size)
+
+    after = state['tail_dates'][-1]
+    df = wrangle_data(tickers, columns=['Close'], start=after, base=state['base'])
+    new = df[df['Date'] > after].reset_index(drop=True)
+    if new.empty:
+        return
+    new_pm = PriceMatrix.from_long(new, tickers=tickers)
+    base = dict(state['base'])
+    listed = [t for t in new['Ticker'].unique() if np.isnan(base[t])]
+    if listed:
+        base.update(first_closes(listed))
+
+    # trailing history followed by the new bars
+    ext = PriceMatrix(
+        state['tail_dates'].append(new_pm.dates),
+        tickers,
+        np.vstack([state['tail_close'], new_pm.close]),
+    )
+    n_tail = len(state['tail_dates'])
+    results, carry, metric_tables = {}, {}, []
+    for name, strat in STRATEGIES.items():
+        saved = state['strategies'][name]
+        lead = min(strat.warmup_bars(), n_tail)
+        window = PriceMatrix(ext.dates[n_tail - lead:], tickers, ext.close[n_tail - lead:])
+        indicators = saved['indicators']
+        signals = strat.compute_signals_matrix(window, state=indicators)
+        strat_rtn = compute_returns_matrix(window, signals['pos'])['strat_rtn'][lead:]
+        pos = signals['pos'][lead:]
+        cum = np.nancumprod(np.vstack([saved['cum'], 1 + strat_rtn]), axis=0)[1:]
+        results[name] = {
+            'signal': signals['signal'][lead:],
+            'pos': pos,
+            'strat_rtn': strat_rtn,
+            # turnover continues from the last stored position, not the window's flat start
+            **net_returns(strat_rtn, pos, strat.cost_model, saved['pos'], window.present[lead:]),
+            'cumulative_rtn': np.where(np.isnan(strat_rtn), 1.0, cum),
+        }
+        sums = metric_sums(strat_rtn, pos, results[name]['turnover'], last=saved['metrics'])
+        metric_tables.append(_ticker_metrics(name, ext, sums))
+        carry[name] = {
+            'indicators': indicators,
+            'cum': cum[-1],
+            'pos': _last_pos(pos, window.present[lead:], saved['pos']),
+            'metrics': sums,
+        }
+
+    part = state['part'] + 1
+    write_part(assemble_output(new, new_pm, results), part, OUTPUT_PARQUET)
+    # the events file is small: append the new changes and rewrite it
+    events = load_events(path=OUTPUT_PARQUET)
+    last = {name: last_values(events[events['strategy'] == name], tickers) for name in STRATEGIES}
+    write_events(pd.concat([events, _events(new_pm, results, last)], ignore_index=True), OUTPUT_PARQUET)
+    append_aggregates(new_pm, results, AGGREGATES_PATH)
+    _write_metrics(metric_tables)
+    _save_state(ext, base, carry, STRATEGIES, part)
+
 
 if __name__ == "__main__":
-    precompute_signals()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Precompute strategy signals into a parquet dataset.")
+    parser.add_argument("--workers", type=int, default=1, help="processes to spread the strategies over")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only compute bars newer than the last run and append them")
+    parser.add_argument("--chunk-size", type=int, default=None,
+                        help="stream the universe through in blocks of this many tickers")
+    parser.add_argument("--perf-json", type=Path, default=None,
+                        help="record timing spans for each stage and write them to this JSON file")
+    args = parser.parse_args()
+    if args.perf_json:
+        perf.enable()
+    with perf.profile("precompute_signals"):
+        if args.incremental:
+            update_signals(workers=args.workers, chunk_size=args.chunk_size)
+        else:
+            precompute_signals(workers=args.workers, chunk_size=args.chunk_size)
+    if args.perf_json:
+        perf.dump_json(args.perf_json)
@@ -0,0 +1,304 @@
+import hashlib
+import json
+import os
+import shutil
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from perf import timed
+
+DATA_DIR = Path("data")
+PRICE_STORE = Path("price_store")
+# intraday CSVs (e.g. minute bars) get a store of their own, resampled on demand
+INTRADAY_DATA_DIR = Path("data_intraday")
+INTRADAY_STORE = Path("price_store_intraday")
+MANIFEST = "manifest.json"
+STORE_VERSION = 1
+# how a column aggregates into coarser bars; any other column takes the last value
+RESAMPLE_AGG = {'Open': 'first', 'High': 'max', 'Low': 'min', 'Close': 'last', 'Volume': 'sum'}
+
+
+def _file_hash(path: Path) -> str:
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _read_manifest(store: Path) -> dict:
+    try:
+        with open(store / MANIFEST) as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    return manifest if manifest.get('version') == STORE_VERSION else None
+
+
+def _sources_changed(manifest: dict, data_dir: Path) -> tuple[bool, dict]:
+    """
+    Compare data/*.csv with what the store was built from. mtime/size are checked
+    first; a file whose mtime moved is only treated as changed if its hash did too.
+    Returns (changed, refreshed source entries).
+    """
+    csvs = {f.stem: f for f in sorted(data_dir.glob("*.csv"))}
+    if manifest is None or sorted(csvs) != sorted(manifest['sources']):
+        return True, {}
+    sources = {}
+    for ticker, path in csvs.items():
+        old = manifest['sources'][ticker]
+        stat = path.stat()
+        entry = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'sha1': old['sha1']}
+        if stat.st_mtime_ns != old['mtime_ns'] or stat.st_size != old['size']:
+            entry['sha1'] = _file_hash(path)
+            if entry['sha1'] != old['sha1']:
+                return True, {}
+        sources[ticker] = entry
+    return False, sources
+
+
+def _parse_dates(values: pd.Series) -> pd.Series:
+    # intraday exports stamp each bar with the exchange's UTC offset, which moves with DST;
+    # dropping it keeps the local wall-clock time, so sessions line up across the year
+    if pd.api.types.is_string_dtype(values):
+        values = values.str.replace(r'([+-]\d\d:\d\d|Z)$', '', regex=True)
+    return pd.to_datetime(values)
+
+
+@timed('price_store.build_store')
+def build_store(data_dir: Path = DATA_DIR, store: Path = PRICE_STORE):
+    """
+    Parse every CSV once into a shared date axis plus one float64 (dates x tickers)
+    matrix per numeric column, saved as .npy in column-major order so a ticker's
+    history is contiguous on disk and memory-maps cheaply. Streams one ticker at a
+    time: each parsed CSV is spilled to a scratch .npz while the date axis is
+    collected, then scattered into the memory-mapped matrices, so neither the frames
+    nor the dense matrices are ever in memory as a whole.
+    """
+    store.mkdir(exist_ok=True)
+    scratch = store / "_build"
+    shutil.rmtree(scratch, ignore_errors=True)
+    scratch.mkdir()
+    paths = sorted(data_dir.glob("*.csv"))
+    tickers = [path.stem for path in paths]
+    dates, columns, sources = None, {}, {}
+    for j, path in enumerate(paths):
+        stat = path.stat()
+        df = pd.read_csv(path).rename(columns={'Datetime': 'Date'})
+        stamps = _parse_dates(df['Date']).to_numpy()
+        dates = np.unique(stamps) if dates is None else np.union1d(dates, stamps)
+        numeric = {}
+        for col in df.columns:
+            if col != 'Date' and pd.api.types.is_numeric_dtype(df[col]):
+                columns.setdefault(col, str(df[col].dtype))
+                numeric[col] = df[col].to_numpy(dtype=np.float64)
+        # positional keys: column names (e.g. 'Adj Close') needn't be valid npz names
+        np.savez(scratch / f"{j}.npz", stamps, *numeric.values(), names=np.array(list(numeric)))
+        sources[path.stem] = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'sha1': _file_hash(path)}
+    dates = pd.DatetimeIndex(dates)
+
+    matrices = {}
+    for col in columns:
+        matrices[col] = np.lib.format.open_memmap(store / f"{col}.tmp.npy", mode='w+', dtype=np.float64,
+                                                  shape=(len(dates), len(tickers)), fortran_order=True)
+        matrices[col][:] = np.nan
+    for j in range(len(paths)):
+        with np.load(scratch / f"{j}.npz") as part:
+            rows = dates.get_indexer(part['arr_0'])
+            for k, col in enumerate(part['names']):
+                matrices[col][rows, j] = part[f'arr_{k + 1}']
+    for col in columns:
+        matrices.pop(col).flush()
+        os.replace(store / f"{col}.tmp.npy", store / f"{col}.npy")
+    shutil.rmtree(scratch)
+    _save_array(store / "dates.npy", dates.to_numpy())
+
+    manifest = {'version': STORE_VERSION, 'tickers': tickers, 'columns': columns, 'sources': sources}
+    _write_manifest(store, manifest)
+    return manifest
+
+
+def _save_array(path: Path, arr: np.ndarray):
+    tmp = path.with_suffix('.tmp.npy')
+    np.save(tmp, arr)
+    os.replace(tmp, path)
+
+
+def _write_manifest(store: Path, manifest: dict):
+    # written last: a store without a current manifest gets rebuilt
+    tmp = store / (MANIFEST + '.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(tmp, store / MANIFEST)
+
+
+def bar_store(store: Path, rule: str) -> Path:
+    """Where the `rule` bars resampled from `store` live."""
+    return store / f"bars_{rule}"
+
+
+def _bar_labels(dates: pd.DatetimeIndex, rule: str) -> pd.DatetimeIndex:
+    # fixed spans ('5min', '1h', '1D') floor the timestamp; calendar ones ('W', 'M') start their period
+    try:
+        return dates.floor(rule)
+    except ValueError:
+        return dates.to_period(rule).to_timestamp()
+
+
+def _resample_block(block: np.ndarray, starts: np.ndarray, how: str) -> np.ndarray:
+    """Aggregate the row runs of `block` beginning at `starts`, per column, skipping NaN."""
+    valid = ~np.isnan(block)
+    if how == 'sum':
+        out = np.add.reduceat(np.where(valid, block, 0.0), starts, axis=0)
+    elif how == 'max':
+        out = np.fmax.reduceat(block, starts, axis=0)
+    elif how == 'min':
+        out = np.fmin.reduceat(block, starts, axis=0)
+    else:
+        rows = np.arange(len(block))[:, None]
+        if how == 'first':
+            pick = np.minimum.reduceat(np.where(valid, rows, len(block) - 1), starts, axis=0)
+        else:
+            pick = np.maximum.reduceat(np.where(valid, rows, 0), starts, axis=0)
+        out = np.take_along_axis(block, pick, axis=0)
+    # no source bar for the ticker in this bar: no bar
+    return np.where(np.add.reduceat(valid, starts, axis=0) > 0, out, np.nan)
+
+
+@timed('price_store.resample_store')
+def resample_store(store: Path, rule: str, block_rows: int = None) -> dict:
+    """
+    Resample every column of `store` into `rule` bars ('5min', '1h', '1D', 'W', ...;
+    labelled by the bar's start) saved as a store of their own in bar_store(store, rule).
+    OHLCV columns aggregate as in RESAMPLE_AGG. The source matrices are memory-mapped
+    and read `block_rows` rows at a time (default about 64MB), cut on bar boundaries,
+    and each output column is written through a memory map, so the fine bars are never
+    in memory as a whole.
+    """
+    manifest = _read_manifest(store)
+    dates = pd.DatetimeIndex(np.load(store / "dates.npy"))
+    labels = _bar_labels(dates, rule)
+    starts = np.flatnonzero(np.concatenate([[True], labels[1:] != labels[:-1]])) if len(dates) else np.zeros(0, int)
+    if block_rows is None:
+        block_rows = max(1, (64 << 20) // (8 * max(1, len(manifest['tickers']))))
+    # runs of whole bars spanning about block_rows source rows each
+    bounds = np.append(starts, len(dates))
+    cuts = [0]
+    while cuts[-1] < len(starts):
+        fit = np.searchsorted(bounds, bounds[cuts[-1]] + block_rows, side='right') - 1
+        cuts.append(min(max(fit, cuts[-1] + 1), len(starts)))
+
+    dst = bar_store(store, rule)
+    dst.mkdir(exist_ok=True)
+    for col in manifest['columns']:
+        src = np.load(store / f"{col}.npy", mmap_mode='r')
+        tmp = dst / f"{col}.tmp.npy"
+        out = np.lib.format.open_memmap(tmp, mode='w+', dtype=np.float64,
+                                        shape=(len(starts), src.shape[1]), fortran_order=True)
+        for a, b in zip(cuts[:-1], cuts[1:]):
+            block = np.asarray(src[bounds[a]:bounds[b]])
+            out[a:b] = _resample_block(block, starts[a:b] - bounds[a], RESAMPLE_AGG.get(col, 'last'))
+        out.flush()
+        del out
+        os.replace(tmp, dst / f"{col}.npy")
+    _save_array(dst / "dates.npy", labels[starts].to_numpy())
+
+    bars = {**manifest, 'rule': rule}
+    _write_manifest(dst, bars)
+    return bars
+
+
+def _same_sources(a: dict, b: dict) -> bool:
+    return {t: s['sha1'] for t, s in a.items()} == {t: s['sha1'] for t, s in b.items()}
+
+
+def ensure_store(data_dir: Path = DATA_DIR, store: Path = PRICE_STORE, rule: str = None) -> dict:
+    """
+    Return the store manifest, rebuilding the store first if any source CSV changed.
+    With a resampling `rule` it is the manifest of those bars, resampled again
+    whenever the source store was rebuilt.
+    """
+    manifest = _read_manifest(store)
+    changed, sources = _sources_changed(manifest, data_dir)
+    if changed:
+        manifest = build_store(data_dir, store)
+    elif sources != manifest['sources']:
+        # touched but identical files: remember the new mtimes to skip hashing next time
+        manifest['sources'] = sources
+        _write_manifest(store, manifest)
+    if rule is None:
+        return manifest
+    bars = _read_manifest(bar_store(store, rule))
+    if bars is None or bars.get('rule') != rule or not _same_sources(bars['sources'], manifest['sources']):
+        bars = resample_store(store, rule)
+    return bars
+
+
+def _columns_of(manifest: dict, store: Path, column: str, tickers: list[str], rows: slice = slice(None)) -> np.ndarray:
+    index = {t: j for j, t in enumerate(manifest['tickers'])}
+    missing = [t for t in tickers if t not in index]
+    if missing:
+        raise FileNotFoundError(f"No CSV for: {missing}")
+    matrix = np.load(store / f"{column}.npy", mmap_mode='r')[rows]
+    if list(tickers) == manifest['tickers']:
+        return matrix
+    # column-major on disk, so each selected ticker is one contiguous read
+    return matrix[:, [index[t] for t in tickers]]
+
+
+def load_matrix(tickers: list[str], column: str = 'Close', data_dir: Path = DATA_DIR,
+                store: Path = PRICE_STORE, rule: str = None) -> tuple[pd.DatetimeIndex, np.ndarray]:
+    """
+    (dates x tickers) float64 matrix for one column, restricted to `tickers` (in that
+    order), along with the shared date axis. NaN where a ticker has no bar. Asking for
+    every ticker returns the memory map itself. `rule` reads resampled bars (see
+    resample_store).
+    """
+    manifest = ensure_store(data_dir, store, rule)
+    store = store if rule is None else bar_store(store, rule)
+    dates = pd.DatetimeIndex(np.load(store / "dates.npy"))
+    return dates, _columns_of(manifest, store, column, tickers)
+
+
+def load_dates(data_dir: Path = DATA_DIR, store: Path = PRICE_STORE, rule: str = None) -> pd.DatetimeIndex:
+    """The store's shared date axis: every date on which any ticker has a bar."""
+    ensure_store(data_dir, store, rule)
+    store = store if rule is None else bar_store(store, rule)
+    return pd.DatetimeIndex(np.load(store / "dates.npy"))
+
+
+@timed('price_store.load_long', rows=len)
+def load_long(tickers: list[str], columns: list[str] = None, data_dir: Path = DATA_DIR,
+              store: Path = PRICE_STORE, rule: str = None, start=None) -> pd.DataFrame:
+    """
+    Long (Date, ..., Ticker) frame sorted by Ticker then Date, with the CSV's numeric
+    columns in their original order and dtypes; the store-backed stand-in for
+    concatenating pd.read_csv over the tickers. `columns` limits what is read, and
+    `rule` reads resampled bars (e.g. hourly from a minute store). `start` keeps only
+    the bars dated on or after it; the rows before it are not read.
+    """
+    manifest = ensure_store(data_dir, store, rule)
+    store = store if rule is None else bar_store(store, rule)
+    tickers = sorted(tickers)
+    columns = list(manifest['columns']) if columns is None else columns
+    dates = pd.DatetimeIndex(np.load(store / "dates.npy"))
+    rows = slice(None if start is None else dates.searchsorted(pd.Timestamp(start)), None)
+    dates = dates[rows]
+    close = np.asarray(_columns_of(manifest, store, 'Close', tickers, rows))
+    # (tickers x dates) so boolean selection comes out ticker-major, date-minor
+    present = ~np.isnan(close).T
+    row_tickers, row_dates = np.nonzero(present)
+    out = {'Date': dates[row_dates]}
+    for col in columns:
+        values = close if col == 'Close' else np.asarray(_columns_of(manifest, store, col, tickers, rows))
+        values = values.T[present]
+        dtype = np.dtype(manifest['columns'][col])
+        # integer columns (Volume) round-trip through float64 exactly
+        out[col] = values.astype(dtype) if dtype.kind in 'iu' and not np.isnan(values).any() else values
+    out['Ticker'] = np.asarray(tickers, dtype=object)[row_tickers]
+    return pd.DataFrame(out)
+
+
+def read_ticker(stock: str, data_dir: Path = DATA_DIR, store: Path = PRICE_STORE) -> pd.DataFrame:
+    """One ticker's rows as pd.read_csv would give them, with Date already parsed."""
+    return load_long([stock], data_dir=data_dir, store=store).drop(columns='Ticker')
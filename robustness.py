@@ -0,0 +1,122 @@
+import argparse
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from aggregates import AGGREGATES_PATH, TRADING_DAYS, SignalAggregates
+from metrics import periods_per_year
+
+METRICS = ['total_return', 'sharpe', 'max_drawdown']
+BENCHMARK = "buy_and_hold"
+
+
+def load_portfolio_returns(strategies: list[str] = None, tickers: list[str] = None, start=None, end=None,
+                           path: Path = AGGREGATES_PATH) -> pd.DataFrame:
+    """
+    Equal-weight portfolio daily returns, one column per precomputed strategy, over
+    the dates where at least one of them has a return (NaN elsewhere is no position).
+    """
+    aggregates = SignalAggregates(path)
+    strategies = aggregates.strategies if strategies is None else strategies
+    returns = pd.concat([aggregates.portfolio_daily(name, tickers, start, end) for name in strategies], axis=1)
+    return returns.dropna(how='all').fillna(0.0)
+
+
+def _metrics(n_dates: int, total_log, total, total_sq, drawdown, periods: float) -> dict[str, np.ndarray]:
+    # Sharpe from the sum and sum of squares of the daily returns (std with ddof=1)
+    mean = total / n_dates
+    with np.errstate(invalid='ignore', divide='ignore'):
+        std = np.sqrt(np.maximum(total_sq - n_dates * mean * mean, 0.0) / (n_dates - 1))
+        sharpe = mean / std * periods ** 0.5
+    return {'total_return': np.expm1(total_log), 'sharpe': sharpe, 'max_drawdown': drawdown}
+
+
+def _max_drawdown(log_paths: np.ndarray) -> np.ndarray:
+    """Largest peak-to-trough fall along the last axis of daily log returns."""
+    cum = np.cumsum(log_paths, axis=-1)
+    return np.expm1((cum - np.maximum.accumulate(cum, axis=-1)).min(axis=-1))
+
+
+def _observed(returns: np.ndarray, periods: float) -> dict[str, np.ndarray]:
+    log = np.log1p(returns)
+    return _metrics(len(returns), log.sum(axis=0), returns.sum(axis=0), (returns * returns).sum(axis=0),
+                    _max_drawdown(log.T), periods)
+
+
+def _resample_task(returns: np.ndarray, n: int, block: int, seed: np.random.SeedSequence,
+                   periods: float = TRADING_DAYS) -> dict[str, np.ndarray]:
+    """Metrics of `n` circular block-bootstrap paths, the same dates for every strategy."""
+    n_dates = len(returns)
+    n_blocks = -(-n_dates // block)
+    starts = np.random.default_rng(seed).integers(0, n_dates, (n, n_blocks))
+    # the last block is cut so every path is n_dates long
+    lengths = np.full(n_blocks, block)
+    lengths[-1] = n_dates - block * (n_blocks - 1)
+    log = np.log1p(returns)
+
+    # sums only need each block's total: prefix sums of the series wrapped around by one block
+    sums = []
+    for series in (log, returns, returns * returns):
+        wrapped = np.concatenate([series, series[:block]])
+        prefix = np.concatenate([np.zeros((1, series.shape[1])), np.cumsum(wrapped, axis=0)])
+        sums.append((prefix[starts + lengths] - prefix[starts]).sum(axis=1))
+
+    # drawdown needs the whole path; gather it as (strategies x paths x dates) so the scans are contiguous
+    idx = ((starts[:, :, None] + np.arange(block)) % n_dates).reshape(n, -1)[:, :n_dates]
+    drawdown = _max_drawdown(np.ascontiguousarray(log.T)[:, idx]).T
+    return _metrics(n_dates, *sums, drawdown, periods)
+
+
+def bootstrap(returns: pd.DataFrame, n_resamples: int = 10_000, block: int = 21, seed: int = 0,
+              alpha: float = 0.05, benchmark: str = BENCHMARK, workers: int = 1,
+              batch_size: int = None) -> pd.DataFrame:
+    """
+    Circular block bootstrap of daily strategy returns (dates x strategies, e.g. from
+    load_portfolio_returns). Blocks of `block` days keep short-range autocorrelation,
+    and every strategy is resampled on the same dates so comparisons stay paired.
+    Per strategy and metric: the historical value, a (1 - alpha) percentile interval
+    and, against `benchmark`, the one-sided p-value of the strategy doing no better
+    (bootstrap differences recentred on the observed one).
+    Resamples run in batches with a child seed each, so the result depends on `seed`
+    and `batch_size` but not on `workers`.
+    """
+    values = returns.to_numpy(dtype=np.float64)
+    # Sharpe annualized for the bar frequency of a dated index (daily otherwise)
+    periods = periods_per_year(returns.index) if isinstance(returns.index, pd.DatetimeIndex) else TRADING_DAYS
+    if batch_size is None:
+        # keep each (resamples x dates x strategies) float64 block around 64MB
+        batch_size = max(1, (64 << 20) // (8 * values.size))
+    sizes = [min(batch_size, n_resamples - start) for start in range(0, n_resamples, batch_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    if workers <= 1:
+        parts = [_resample_task(values, n, block, s, periods) for n, s in zip(sizes, seeds)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(_resample_task, [values] * len(sizes), sizes, [block] * len(sizes), seeds,
+                                  [periods] * len(sizes)))
+    samples = {m: np.concatenate([part[m] for part in parts]) for m in METRICS}
+    observed = _observed(values, periods)
+
+    out = {}
+    bench = list(returns.columns).index(benchmark) if benchmark in returns.columns else None
+    for m in METRICS:
+        out[m] = observed[m]
+        out[f'{m}_lo'], out[f'{m}_hi'] = np.nanquantile(samples[m], [alpha / 2, 1 - alpha / 2], axis=0)
+        if bench is not None:
+            diff = observed[m] - observed[m][bench]
+            diffs = samples[m] - samples[m][:, [bench]]
+            p = np.mean(diffs - diff >= diff, axis=0)
+            p[bench] = np.nan
+            out[f'{m}_p'] = p
+    return pd.DataFrame(out, index=pd.Index(returns.columns, name='strategy'))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Block-bootstrap confidence intervals for the precomputed strategies.")
+    parser.add_argument("--resamples", type=int, default=10_000)
+    parser.add_argument("--block", type=int, default=21, help="block length in days")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=1, help="processes to spread the resamples over")
+    args = parser.parse_args()
+    result = bootstrap(load_portfolio_returns(), args.resamples, args.block, args.seed, workers=args.workers)
+    print(result.to_string(float_format=lambda v: f"{v:.4f}"))
@@ -0,0 +1,295 @@
+import argparse
+import asyncio
+import hashlib
+import inspect
+import json
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+import numpy as np
+import pandas as pd
+import uvicorn
+from fastapi import FastAPI, HTTPException
+from pydantic import BaseModel
+from TradingStrats import STRATEGY_REGISTRY
+from WrangleData import wrangle_data
+from costs import CostModel
+from matrix_engine import PriceMatrix, compute_returns_matrix
+from metrics import panel_metrics, periods_per_year, weighted_returns
+from parallel import SharedPriceMatrix, worker_matrix
+from portfolio import PORTFOLIO_REGISTRY, PortfolioConstructor, get_portfolio
+from price_store import ensure_store
+from perf import timed
+
+
+class BacktestRequest(BaseModel):
+    strategy: str
+    params: dict = {}
+    # None means every ticker in the price store / the whole history
+    tickers: list[str] | None = None
+    start: str | None = None
+    end: str | None = None
+    costs: dict | None = None
+    # a PORTFOLIO_REGISTRY name: weights the portfolio curves and the portfolio metrics row
+    portfolio: str = "equal"
+    portfolio_params: dict = {}
+
+
+def _defaults(strategy_cls) -> dict:
+    return strategy_cls.param_defaults()
+
+
+def _portfolio_params(portfolio_cls) -> dict:
+    # required parameters map to Parameter.empty; a nested constructor (vol_target's
+    # base) can't be given in a request, so it keeps its default
+    return {
+        name: p.default
+        for name, p in list(inspect.signature(portfolio_cls.__init__).parameters.items())[1:]
+        if p.annotation is not PortfolioConstructor
+    }
+
+
+def canonical_request(request: BacktestRequest, tickers: list[str], pm: PriceMatrix = None) -> dict:
+    """
+    Validated request with every default filled in, so requests that mean the same
+    backtest compare (and hash) equal. Raises ValueError on anything unknown, and on
+    a window with no bars of the selected tickers in `pm` (when given).
+    """
+    strategy_cls = STRATEGY_REGISTRY.get(request.strategy)
+    if strategy_cls is None:
+        raise ValueError(f"Unknown strategy: {request.strategy}")
+    params = _defaults(strategy_cls)
+    unknown = set(request.params) - set(params)
+    if unknown:
+        raise ValueError(f"{strategy_cls.__name__} has no parameter(s): {sorted(unknown)}")
+    params.update(request.params)
+    portfolio_cls = PORTFOLIO_REGISTRY.get(request.portfolio)
+    if portfolio_cls is None:
+        raise ValueError(f"Unknown portfolio construction: {request.portfolio}")
+    portfolio_params = _portfolio_params(portfolio_cls)
+    unknown = set(request.portfolio_params) - set(portfolio_params)
+    if unknown:
+        raise ValueError(f"{portfolio_cls.__name__} has no parameter(s): {sorted(unknown)}")
+    portfolio_params.update(request.portfolio_params)
+    required = sorted(name for name, v in portfolio_params.items() if v is inspect.Parameter.empty)
+    if required:
+        raise ValueError(f"{portfolio_cls.__name__} needs parameter(s): {required}")
+    selected = sorted(set(tickers if request.tickers is None else request.tickers))
+    missing = sorted(set(selected) - set(tickers))
+    if missing or not selected:
+        raise ValueError(f"No price data for: {missing or 'an empty ticker list'}")
+    start, end = (None if d is None else pd.Timestamp(d).strftime('%Y-%m-%d') for d in (request.start, request.end))
+    if start is not None and end is not None and start > end:
+        raise ValueError(f"start {start} is after end {end}")
+    if pm is not None:
+        index = {t: j for j, t in enumerate(pm.tickers)}
+        dates = pm.dates[~np.isnan(pm.close[:, [index[t] for t in selected]]).all(axis=1)]
+        in_window = np.ones(len(dates), dtype=bool)
+        if start is not None:
+            in_window &= dates >= pd.Timestamp(start)
+        if end is not None:
+            in_window &= dates <= pd.Timestamp(end)
+        if not in_window.any():
+            raise ValueError(f"No bars for the selected tickers between {start} and {end}")
+    return {
+        'strategy': request.strategy,
+        'params': params,
+        'tickers': selected,
+        'start': start,
+        'end': end,
+        'costs': vars(CostModel(**(request.costs or {}))),
+        'portfolio': {'name': request.portfolio, 'params': portfolio_params},
+    }
+
+
+def request_key(canonical: dict) -> str:
+    return hashlib.sha256(json.dumps(canonical, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _json_values(arr: np.ndarray) -> list:
+    # JSON has no NaN
+    return [None if np.isnan(v) else float(v) for v in arr]
+
+
+def _cumulative(daily: np.ndarray) -> np.ndarray:
+    curve = np.nancumprod(1 + daily)
+    curve[np.isnan(daily)] = np.nan
+    return curve
+
+
+@timed('service.run_backtest')
+def run_backtest(request: dict, pm: PriceMatrix = None) -> dict:
+    """
+    Run a canonical request on the shared price matrix (the pool worker's when `pm` is
+    None). Signals use the full history of the selected tickers, as the Streamlit apps
+    do; metrics and the portfolio curves cover [start, end] only. Portfolio weights,
+    like signals, are set on the full history.
+    """
+    pm = worker_matrix() if pm is None else pm
+    index = {t: j for j, t in enumerate(pm.tickers)}
+    close = pm.close[:, [index[t] for t in request['tickers']]]
+    # only the dates on which a selected ticker trades, as wrangle_data(tickers) would give
+    rows = ~np.isnan(close).all(axis=1)
+    sub = PriceMatrix(pm.dates[rows], request['tickers'], close[rows])
+
+    portfolio = get_portfolio(request['portfolio']['name'], **request['portfolio']['params'])
+    strategy = STRATEGY_REGISTRY[request['strategy']](cost_model=CostModel(**request['costs']), portfolio=portfolio,
+                                                      **request['params'])
+    pos = strategy.compute_signals_matrix(sub)['pos']
+    rtns = compute_returns_matrix(sub, pos, strategy.cost_model)
+    weights = portfolio.weights(sub)
+
+    window = np.ones(len(sub.dates), dtype=bool)
+    if request['start'] is not None:
+        window &= sub.dates >= pd.Timestamp(request['start'])
+    if request['end'] is not None:
+        window &= sub.dates <= pd.Timestamp(request['end'])
+    pos, turnover, weights = pos[window], rtns['turnover'][window], weights[window]
+    metrics = panel_metrics(request['strategy'], request['tickers'], rtns['strat_rtn'][window], pos, turnover,
+                            periods_per_year(sub.dates), weights=weights)
+    return {
+        'request': request,
+        'dates': [d.strftime('%Y-%m-%d') for d in sub.dates[window]],
+        'port_cumulative_rtn': _json_values(_cumulative(weighted_returns(weights, rtns['strat_rtn'][window]))),
+        'port_net_cumulative_rtn': _json_values(_cumulative(weighted_returns(weights, rtns['net_rtn'][window]))),
+        'metrics': metrics.astype(object).where(metrics.notna(), None).to_dict('records'),
+    }
+
+
+class ResultCache():
+    """LRU cache of backtest results by request key, holding at most `max_entries`."""
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def get(self, key: str) -> dict:
+        result = self._entries.get(key)
+        if result is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return result
+
+    def put(self, key: str, result: dict):
+        self._entries[key] = result
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {'entries': len(self._entries), 'max_entries': self.max_entries,
+                'hits': self.hits, 'misses': self.misses}
+
+
+class BacktestService():
+    """
+    Backtests on one shared in-process price matrix (every ticker in the price store,
+    normalized as wrangle_data does). Runs go to a pool of `workers` processes that
+    see the matrix through shared memory (workers=0 runs them on a thread of this
+    process instead), finished results are cached by request key, and identical
+    requests arriving while one is running wait for that run rather than starting
+    their own. Call start() inside the event loop and close() when done.
+    """
+
+    def __init__(self, workers: int = 1, cache_size: int = 256):
+        self.workers = workers
+        self.cache = ResultCache(cache_size)
+        self.coalesced = 0
+        self.tickers = ensure_store()['tickers']
+        self.pm = PriceMatrix.from_long(wrangle_data(self.tickers, columns=['Close']))
+        self._shared = None
+        self._pool = None
+        self._inflight = {}
+
+    def start(self):
+        if self.workers > 0 and self._pool is None:
+            self._shared = SharedPriceMatrix(self.pm, self.workers)
+            self._pool = self._shared.__enter__()
+
+    def close(self):
+        if self._shared is not None:
+            self._shared.__exit__(None, None, None)
+            self._shared = self._pool = None
+
+    async def _run(self, key: str, request: dict) -> dict:
+        loop = asyncio.get_running_loop()
+        if self._pool is None:
+            result = await loop.run_in_executor(None, run_backtest, request, self.pm)
+        else:
+            result = await loop.run_in_executor(self._pool, run_backtest, request)
+        self.cache.put(key, result)
+        return result
+
+    async def backtest(self, request: BacktestRequest) -> dict:
+        canonical = canonical_request(request, self.tickers, self.pm)
+        key = request_key(canonical)
+        result = self.cache.get(key)
+        if result is not None:
+            return result
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._inflight[key] = asyncio.ensure_future(self._run(key, canonical))
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        # a client going away must not cancel the run other clients are waiting on
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        return {'workers': self.workers, 'inflight': len(self._inflight), 'coalesced': self.coalesced,
+                'cache': self.cache.stats()}
+
+
+def create_app(service: BacktestService) -> FastAPI:
+    @asynccontextmanager
+    async def lifespan(app):
+        service.start()
+        yield
+        service.close()
+
+    app = FastAPI(title="strat_test backtests", lifespan=lifespan)
+
+    @app.get("/strategies")
+    def strategies():
+        return {name: {'name': cls.name, 'params': _defaults(cls)} for name, cls in STRATEGY_REGISTRY.items()}
+
+    @app.get("/portfolios")
+    def portfolios():
+        # required parameters (fixed's weights) are listed as null
+        return {name: {'name': cls.name, 'params': {k: None if v is inspect.Parameter.empty else v
+                                                    for k, v in _portfolio_params(cls).items()}}
+                for name, cls in PORTFOLIO_REGISTRY.items()}
+
+    @app.get("/tickers")
+    def tickers():
+        return {'tickers': service.tickers, 'start': service.pm.dates[0].strftime('%Y-%m-%d'),
+                'end': service.pm.dates[-1].strftime('%Y-%m-%d')}
+
+    @app.post("/backtest")
+    async def backtest(request: BacktestRequest):
+        try:
+            return await service.backtest(request)
+        except (ValueError, TypeError) as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    @app.get("/stats")
+    def stats():
+        return service.stats()
+
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless backtest service over the shared price store.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1, help="backtest processes (0 runs them in-process)")
+    parser.add_argument("--cache-size", type=int, default=256, help="results kept in memory")
+    args = parser.parse_args()
+    uvicorn.run(create_app(BacktestService(args.workers, args.cache_size)), host=args.host, port=args.port)
@@ -0,0 +1,123 @@
+import shutil
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+from pathlib import Path
+from compact import to_compact
+from events import EVENT_COLS, events_at
+from perf import timed
+
+# hive-partitioned parquet dataset: Ticker=<ticker>/part-<n>-<i>.parquet,
+# part 0 from the full run and one more part per incremental update
+SIGNALS_PATH = Path("precomputed_signals.parquet")
+# per-strategy columns, stored as f'{col}_{strategy name}'; strat_rtn is gross, net_rtn after costs
+OUTPUT_COLS = ['signal', 'pos', 'strat_rtn', 'turnover', 'net_rtn', 'cumulative_rtn']
+# signal/pos change rarely, so they are stored as change events (see events) in this
+# file next to the partitions (leading underscore: parquet readers skip it) and only
+# the other columns per row; load_signals puts them back together
+EVENTS_FILE = "_events.parquet"
+DENSE_COLS = [col for col in OUTPUT_COLS if col not in EVENT_COLS]
+KEY_COLS = ['Date', 'Ticker', 'Close']
+# rows are Date-sorted within a ticker, so each row group covers a few years and
+# its Date min/max statistics let date-range reads skip the rest
+ROWS_PER_GROUP = 1024
+
+_PARTITIONING = ds.partitioning(pa.schema([('Ticker', pa.string())]), flavor='hive')
+
+
+def reset_store(path: Path = SIGNALS_PATH):
+    """Remove any previous output (dataset directory or the old single-file layout)."""
+    if path.is_dir():
+        shutil.rmtree(path)
+    elif path.exists():
+        path.unlink()
+    path.mkdir()
+
+
+@timed('signal_store.write_part')
+def write_part(df_out: pd.DataFrame, part: int, path: Path = SIGNALS_PATH):
+    """Write one batch of rows (sorted by Ticker then Date) into the ticker partitions."""
+    ds.write_dataset(
+        pa.Table.from_pandas(df_out, preserve_index=False),
+        path,
+        format='parquet',
+        partitioning=_PARTITIONING,
+        basename_template=f"part-{part:05d}-{{i}}.parquet",
+        existing_data_behavior='overwrite_or_ignore',
+        max_rows_per_group=ROWS_PER_GROUP,
+        min_rows_per_group=ROWS_PER_GROUP,
+        file_options=ds.ParquetFileFormat().make_write_options(compression='snappy'),
+    )
+
+
+def write_events(events: pd.DataFrame, path: Path = SIGNALS_PATH):
+    """Store the (strategy, Ticker, Date, signal, pos) change events of every strategy."""
+    events = events[['strategy', 'Ticker', 'Date'] + EVENT_COLS].sort_values(['strategy', 'Ticker', 'Date'], kind='stable')
+    events = events.reset_index(drop=True)
+    events.to_parquet(path / EVENTS_FILE, index=False)
+
+
+def load_events(suffix: str = None, tickers: list[str] = None, end=None, path: Path = SIGNALS_PATH) -> pd.DataFrame:
+    """
+    Stored change events, for one strategy and/or tickers, up to `end` (inclusive).
+    There is no start: the events before a date range set the values it starts with.
+    """
+    filters = []
+    if suffix is not None:
+        filters.append(('strategy', '==', suffix))
+    if tickers is not None:
+        filters.append(('Ticker', 'in', list(tickers)))
+    if end is not None:
+        filters.append(('Date', '<=', pd.Timestamp(end)))
+    return pd.read_parquet(path / EVENTS_FILE, filters=filters or None)
+
+
+def _dataset(path: Path) -> ds.Dataset:
+    return ds.dataset(path, format='parquet', partitioning=_PARTITIONING)
+
+
+@timed('signal_store.load_signals', rows=len)
+def load_signals(suffix: str = None, tickers: list[str] = None, start=None, end=None,
+                 path: Path = SIGNALS_PATH, compact: bool = False) -> pd.DataFrame:
+    """
+    Read Date/Ticker/Close plus the columns of one strategy (e.g. suffix='mavg_50_200'),
+    for the given tickers and inclusive date range. Ticker and date filters are pushed
+    down to partition pruning and row-group statistics, so only matching data is read.
+    Omitted arguments mean everything. compact=True returns the compact schema
+    (see compact.to_compact). signal/pos columns are expanded from the stored
+    change events onto the rows read.
+    """
+    dataset = _dataset(path)
+    if suffix is None:
+        suffixes = [name[len('strat_rtn_'):] for name in dataset.schema.names if name.startswith('strat_rtn_')]
+    else:
+        suffixes = [suffix]
+    columns = KEY_COLS + [f'{col}_{s}' for s in suffixes for col in OUTPUT_COLS]
+    # stores written before the events file keep every column per row
+    expand = [col for col in columns if col not in dataset.schema.names]
+    filt = None
+    for cond in (
+        ds.field('Ticker').isin(list(tickers)) if tickers is not None else None,
+        ds.field('Date') >= pd.Timestamp(start) if start is not None else None,
+        ds.field('Date') <= pd.Timestamp(end) if end is not None else None,
+    ):
+        if cond is not None:
+            filt = cond if filt is None else filt & cond
+    df = dataset.to_table(columns=[col for col in columns if col not in expand], filter=filt).to_pandas()
+    df['Ticker'] = df['Ticker'].astype(object)
+    df = df.sort_values(['Ticker', 'Date']).reset_index(drop=True)
+    if expand:
+        events = load_events(suffix, tickers, end, path)
+        for s in suffixes:
+            values = events_at(events[events['strategy'] == s], df['Ticker'], df['Date'])
+            for col in EVENT_COLS:
+                df[f'{col}_{s}'] = values[col]
+        df = df[columns]
+    return to_compact(df) if compact else df
+
+
+def date_bounds(path: Path = SIGNALS_PATH) -> tuple[pd.Timestamp, pd.Timestamp]:
+    """First and last Date in the store, reading only the Date column."""
+    bounds = pc.min_max(_dataset(path).to_table(columns=['Date'])['Date'])
+    return pd.Timestamp(bounds['min'].as_py()), pd.Timestamp(bounds['max'].as_py())
@@ -1,8 +1,11 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-from TradingStrats import STRATEGY_REGISTRY, get_strategy
+from TradingStrats import STRATEGY_REGISTRY, CompositeStrategy, get_strategy
 from WrangleData import wrangle_data
+from metrics import frame_metrics
+from portfolio import PORTFOLIO_REGISTRY, get_portfolio
+import perf
 # from strat import wrangle_data, add_signals_per_stock, find_returns
 
 st.write("MAG 7 - strategy backtester")
@@ -12,32 +15,66 @@ with st.container(border=True):
     selected_stocks = st.multiselect("Stocks", all_stocks, default=all_stocks)
     portfolio_return = st.toggle("portfolio_return")
     
-all_strats = ["buy_and_hold", "mavg", "rsi", "momentum"]
+# registered expression strategies get an input per parameter
+composites = [name for name, cls in STRATEGY_REGISTRY.items() if issubclass(cls, CompositeStrategy)]
+all_strats = ["buy_and_hold", "mavg", "rsi", "momentum", "xs_momentum"] + composites
 with st.container(border=True):
     strat = st.selectbox("Strategy", all_strats, index=0)
-    if strat == "Simple MA Crossover":
-        short_win = st.number_input("Short Window", min_value=1, max_value=100, value=20)
-        long_win = st.number_input("Long Window", min_value=1, max_value=200, value=50)
-    if strat == "RSI Oversold/Overbought":
-        rsi_period = st.number_input("RSI Period", min_value=1, max_value=50, value=14)
-        rsi_buy = st.number_input("RSI Buy Threshold", min_value=1, max_value=50, value=30)
-        rsi_sell = st.number_input("RSI Sell Threshold", min_value=50, max_value=100, value=70)
-    if strat == "Momentum (ROC)":
-        lookback = st.number_input("ROC Period", min_value=1, max_value=252, value=126)
-        threshold = st.number_input("ROC Threshold", min_value=-100.0, max_value=100.0, value=0.0)
-        rebalance_freq = st.selectbox("Rebalance Frequency", options=['D','W','M','Q','A'], index=2)
+    params = {}
+    if strat == "mavg":
+        params['short_win'] = st.number_input("Short Window", min_value=1, max_value=100, value=20)
+        params['long_win'] = st.number_input("Long Window", min_value=1, max_value=200, value=50)
+    if strat == "rsi":
+        params['period'] = st.number_input("RSI Period", min_value=1, max_value=50, value=14)
+        params['buy_level'] = st.number_input("RSI Buy Threshold", min_value=1, max_value=50, value=30)
+        params['sell_level'] = st.number_input("RSI Sell Threshold", min_value=50, max_value=100, value=70)
+    if strat == "momentum":
+        params['lookback'] = st.number_input("ROC Period", min_value=1, max_value=252, value=126)
+        params['threshold'] = st.number_input("ROC Threshold", min_value=-100.0, max_value=100.0, value=0.0)
+    if strat == "xs_momentum":
+        params['lookback'] = st.number_input("ROC Period", min_value=1, max_value=252, value=126)
+        params['top_n'] = st.number_input("Top N", min_value=1, max_value=len(all_stocks), value=3)
+        params['rebalance_freq'] = st.selectbox("Rebalance Frequency", options=['D','W','M','Q','A'], index=2)
+    if strat in composites:
+        st.caption(repr(STRATEGY_REGISTRY[strat].template))
+        for name, default in STRATEGY_REGISTRY[strat].template.params().items():
+            params[name] = st.number_input(name, value=default)
+
+# fixed weights need a weight per ticker, so they're left to code
+all_weightings = [name for name in PORTFOLIO_REGISTRY if name != "fixed"]
+with st.container(border=True):
+    weighting = st.selectbox("Portfolio weighting", all_weightings, index=0)
+    portfolio_params = {}
+    if weighting != "equal":
+        portfolio_params['rebalance_freq'] = st.selectbox("Portfolio Rebalance", options=['D','W','M','Q','A'], index=2)
+        portfolio_params['lookback'] = st.number_input("Volatility Lookback", min_value=2, max_value=252, value=63)
+    if weighting == "vol_target":
+        portfolio_params['target_vol'] = st.number_input("Target Volatility", min_value=0.01, max_value=1.0, value=0.10)
+        portfolio_params['max_leverage'] = st.number_input("Max Leverage", min_value=0.1, max_value=5.0, value=1.0)
 
 
     
-df = wrangle_data(selected_stocks)
-my_strat = get_strategy(strat)
-strat_df = my_strat.run(df)
-port_series = strat_df.drop_duplicates(subset='Date').set_index('Date')['port_cumulative_rtn']
-
-tab1, tab2 = st.tabs(["Chart", "Dataframe"])
-if portfolio_return:
-    tab1.line_chart(port_series, height=250)
-else:
-    tab1.line_chart(df['Close'], height=250)
-
-tab2.dataframe(df, height=250, use_container_width=True)
\ No newline at end of file
+# STRAT_PERF=1 records each stage's spans into the perf panel below; STRAT_PROFILE captures a profile
+with perf.profile("st_lit"):
+    df = wrangle_data(selected_stocks)
+    my_strat = get_strategy(strat, portfolio=get_portfolio(weighting, **portfolio_params), **params)
+    # matrix engine: indicators come from the process-wide cache, so e.g. moving only
+    # the RSI thresholds reuses the RSI computed on the previous rerun
+    strat_df = my_strat.run(df, engine="matrix")
+    port_series = strat_df.drop_duplicates(subset='Date').set_index('Date')['port_cumulative_rtn']
+    with perf.span("st_lit.metrics", rows=len(strat_df)):
+        # per ticker and the portfolio under the selected weighting, all in one vectorized pass
+        metrics = frame_metrics(strat_df, strategy=strat, portfolio=my_strat.portfolio)
+        metrics = metrics.drop(columns='strategy').set_index('Ticker')
+
+    with perf.span("st_lit.render", rows=len(df)):
+        tab1, tab2, tab3 = st.tabs(["Chart", "Dataframe", "Metrics"])
+        if portfolio_return:
+            tab1.line_chart(port_series, height=250)
+        else:
+            tab1.line_chart(df['Close'], height=250)
+
+        tab2.dataframe(df, height=250, use_container_width=True)
+        tab3.dataframe(metrics, use_container_width=True)
+
+perf.render_panel(st)
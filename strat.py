@@ -1,5 +1,6 @@
 import pandas as pd
 import numpy as np
+from price_store import read_ticker
 
 
 def wrangle_data(selected_stocks: list[str]) -> pd.DataFrame:
@@ -10,12 +11,8 @@ def wrangle_data(selected_stocks: list[str]) -> pd.DataFrame:
     all_data = []
     
     for stock in selected_stocks:
-        # Load with Date as index if it's the first column
-        df = pd.read_csv(
-            f"data/{stock}.csv",
-            index_col=0,                    # assume first column = Date
-            parse_dates=True                # auto-convert to datetime
-        )
+        # Load from the binary price store with Date as index
+        df = read_ticker(stock).set_index('Date')
         
         # Rename index to 'Date' if needed (some CSVs use 'date', 'timestamp', etc.)
         if not isinstance(df.index.name, str) or df.index.name.lower() not in ['date', 'datetime']:
@@ -0,0 +1,139 @@
+import inspect
+import itertools
+import numpy as np
+import pandas as pd
+from matrix_engine import PriceMatrix, pct_change
+from indicators import IndicatorCache
+from costs import CostModel, turnover
+from metrics import periods_per_year
+
+TRADING_DAYS = 252
+
+
+def param_grid(strategy_cls, **grid) -> pd.DataFrame:
+    """
+    Cartesian product of the swept values, one row per config.
+    Parameters that are not swept take the strategy's __init__ default. For strategies
+    these are their own parameters (param_defaults), not cost_model/portfolio; other
+    classes (e.g. CostModel for a cost grid) take every __init__ parameter.
+    """
+    if hasattr(strategy_cls, 'param_defaults'):
+        defaults = strategy_cls.param_defaults()
+    else:
+        defaults = {
+            name: p.default
+            for name, p in inspect.signature(strategy_cls.__init__).parameters.items()
+            if p.default is not inspect.Parameter.empty
+        }
+    unknown = set(grid) - set(defaults)
+    if unknown:
+        raise ValueError(f"{strategy_cls.__name__} has no parameter(s): {sorted(unknown)}")
+    names = list(grid)
+    combos = list(itertools.product(*(list(v) for v in grid.values())))
+    params = pd.DataFrame(combos, columns=names)
+    for name, default in defaults.items():
+        if name not in params:
+            params[name] = default
+    return params
+
+
+def _daily_stats(port_daily: np.ndarray, periods: float = TRADING_DAYS) -> dict[str, np.ndarray]:
+    has_ret = ~np.isnan(port_daily)
+    n = has_ret.sum(axis=1)
+    daily = np.where(has_ret, port_daily, 0.0)
+    mean = daily.sum(axis=1) / n
+    var = (np.where(has_ret, port_daily - mean[:, None], 0.0) ** 2).sum(axis=1) / (n - 1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sharpe = mean / np.sqrt(var) * periods ** 0.5
+
+    cum = np.cumprod(1 + daily, axis=1)
+    drawdown = cum / np.maximum.accumulate(cum, axis=1) - 1
+    return {
+        'total_return': cum[:, -1] - 1,
+        'sharpe': sharpe,
+        'max_drawdown': drawdown.min(axis=1),
+    }
+
+
+def portfolio_daily(pm: PriceMatrix, pos: np.ndarray, returns: np.ndarray = None,
+                    cost_models: list[CostModel] = None) -> np.ndarray:
+    """
+    Equal-weight portfolio daily returns, (configs x dates), for a (configs x dates x
+    tickers) stack of positions: the mean across tickers with a return, NaN on dates
+    with none. Positions must be finite (flat is 0, as every strategy's pos column is).
+    With `cost_models` the returns are net of each model in turn, one row per
+    (config, model) pair, configs outermost.
+    """
+    if returns is None:
+        returns = pct_change(pm.close)
+    # positions are never NaN, so a cell has a strategy return exactly when it has a price return;
+    # the per-date ticker count is shared by every config and the average is a single contraction
+    valid = ~np.isnan(returns)
+    count = valid.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        port_daily = np.einsum('ktn,tn->kt', pos, np.where(valid, returns, 0.0)) / count
+    port_daily[:, count == 0] = np.nan
+    if cost_models is None:
+        return port_daily
+
+    # costs are linear in the per-date trade count and turnover summed over tickers,
+    # so every cost model is a weighted sum of the same two (configs x dates) series
+    turn = turnover(pos)
+    mask = valid.astype(np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        trades = np.einsum('ktn,tn->kt', (turn > 0).astype(np.float64), mask) / count
+        turned = np.einsum('ktn,tn->kt', turn, mask) / count
+    net = np.stack([port_daily - model.per_trade * trades - model.per_turnover * turned
+                    for model in cost_models], axis=1)
+    return net.reshape(-1, net.shape[-1])
+
+
+def portfolio_stats(pm: PriceMatrix, pos: np.ndarray, returns: np.ndarray = None,
+                    cost_models: list[CostModel] = None) -> dict[str, np.ndarray]:
+    """
+    Equal-weight portfolio stats for each row of portfolio_daily (same arguments).
+    Same conventions as parquet_cache.py: daily mean across tickers with a return,
+    Sharpe = mean / std * sqrt(bars per year, 252 for daily bars), total return = final cumulative - 1.
+    """
+    return _daily_stats(portfolio_daily(pm, pos, returns, cost_models), periods_per_year(pm.dates))
+
+
+def sweep(strategy_cls, df, batch_size: int = None, cache: IndicatorCache = None,
+          params: pd.DataFrame = None, costs: dict = None, **grid) -> pd.DataFrame:
+    """
+    Evaluate every combination of the swept parameters in one vectorized pass, e.g.
+        sweep(MovingAverageCrossover, df, short_win=range(5, 100), long_win=range(50, 300))
+    `df` is the long frame from wrangle_data (or a PriceMatrix). Indicators are computed
+    once per distinct parameter value and shared across the grid (and later sweeps)
+    through the indicator cache.
+    A ready-made `params` table (e.g. a slice of param_grid) can be passed instead of the grid.
+    `costs` is a grid of CostModel parameters, e.g. {'spread_bps': [0, 5, 10]}; each
+    config's positions are computed once and netted against every cost model.
+    Returns one row per config (per config and cost model with `costs`): the parameters
+    plus total_return, sharpe, max_drawdown.
+    """
+    pm = df if isinstance(df, PriceMatrix) else PriceMatrix.from_long(df)
+    if params is None:
+        params = param_grid(strategy_cls, **grid)
+    cost_params = None if costs is None else param_grid(CostModel, **costs)
+    models = None if costs is None else [CostModel(**row) for row in cost_params.to_dict('records')]
+    returns = pct_change(pm.close)
+    if batch_size is None:
+        # keep each (configs x dates x tickers) float64 block around 64MB
+        batch_size = max(1, (64 << 20) // (8 * pm.close.size))
+
+    stats = []
+    for start in range(0, len(params), batch_size):
+        batch = params.iloc[start:start + batch_size]
+        pos = strategy_cls.sweep_positions(pm, batch, cache)
+        stats.append(pd.DataFrame(portfolio_stats(pm, pos, returns, models)))
+    stats = pd.concat(stats, ignore_index=True)
+    if models is None:
+        out = params.copy()
+    else:
+        out = params.loc[params.index.repeat(len(models))].reset_index(drop=True)
+        for col in cost_params:
+            out[col] = np.tile(cost_params[col].to_numpy(), len(params))
+    for col in stats:
+        out[col] = stats[col].to_numpy()
+    return out
@@ -0,0 +1,24 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+# the modules live at the repo root rather than in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def ragged():
+    """Long frame sorted by Ticker then Date: tickers listing late, delisting early, or too short for a window."""
+    rng = np.random.default_rng(0)
+    dates = pd.bdate_range("2020-01-01", periods=300)
+    spans = {'AAA': (0, 300), 'BBB': (60, 300), 'CCC': (150, 260), 'DDD': (290, 300)}
+    parts = []
+    for ticker, (a, b) in spans.items():
+        parts.append(pd.DataFrame({
+            'Ticker': ticker,
+            'Date': dates[a:b],
+            'Close': 100 * np.exp(np.cumsum(rng.normal(0, 0.02, b - a))),
+        }))
+    return pd.concat(parts, ignore_index=True)
@@ -0,0 +1,48 @@
+from concurrent.futures import ThreadPoolExecutor
+from itertools import combinations
+import numpy as np
+import pytest
+from aggregates import SignalAggregates, write_aggregates
+from matrix_engine import PriceMatrix, compute_returns_matrix
+from TradingStrats import MovingAverageCrossover
+
+
+@pytest.fixture
+def aggregates(ragged, tmp_path):
+    """(pm, strat_rtn, SignalAggregates) for the MA crossover on the ragged universe."""
+    pm = PriceMatrix.from_long(ragged)
+    pos = MovingAverageCrossover(5, 20).compute_signals_matrix(pm)['pos']
+    rtns = compute_returns_matrix(pm, pos)
+    write_aggregates(pm, {'ma': {'pos': pos, **rtns}}, tmp_path)
+    return pm, rtns['strat_rtn'], SignalAggregates(tmp_path, max_portfolios=2)
+
+
+def _daily(strat_rtn, cols):
+    rtn = strat_rtn[:, cols]
+    count = (~np.isnan(rtn)).sum(axis=1)
+    with np.errstate(invalid='ignore'):
+        return np.where(count > 0, np.nansum(rtn, axis=1) / count, np.nan)
+
+
+def test_range_queries(aggregates):
+    pm, strat_rtn, agg = aggregates
+    start, end = pm.dates[50], pm.dates[200]
+    stats = agg.ticker_stats('ma', ['BBB', 'CCC'], start, end)
+    window = strat_rtn[50:201, 1:3]
+    np.testing.assert_allclose(stats['total_return'], np.nanprod(1 + window, axis=0) - 1, rtol=1e-10)
+    np.testing.assert_array_equal(stats['days'], (~np.isnan(window)).sum(axis=0))
+    daily = agg.portfolio_daily('ma', ['AAA', 'CCC'], start, end).to_numpy()
+    np.testing.assert_allclose(daily, _daily(strat_rtn, [0, 2])[50:201], rtol=1e-12)
+    cum = agg.portfolio_cumulative('ma', ['AAA', 'CCC'], start, end).to_numpy()
+    np.testing.assert_allclose(cum, np.nancumprod(1 + daily), rtol=1e-10)
+
+
+def test_portfolio_cache_shared_between_threads(aggregates):
+    pm, strat_rtn, agg = aggregates
+    # every ticker pair and triple, more than the two portfolios kept
+    selections = [list(c) for n in (2, 3) for c in combinations(pm.tickers, n)] * 10
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(lambda s: (s, agg.portfolio_daily('ma', s)), selections))
+    for s, daily in results:
+        np.testing.assert_allclose(daily.to_numpy(), _daily(strat_rtn, [pm.tickers.index(t) for t in s]), rtol=1e-12)
+    assert len(agg._portfolios) <= agg.max_portfolios
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+from compact import FLOAT32_RTOL, check_tolerance, from_compact, to_compact
+from matrix_engine import PriceMatrix
+from TradingStrats import MovingAverageCrossover
+
+
+@pytest.fixture
+def wide(ragged):
+    """A strategy.run result on the ragged universe: floats, int signal/pos, NaN leads."""
+    return MovingAverageCrossover(5, 20).run(ragged.copy(), engine="matrix")
+
+
+def test_compact_types_and_round_trip(wide):
+    compact = to_compact(wide)
+    assert compact['Date'].dtype == np.int32
+    assert isinstance(compact['Ticker'].dtype, pd.CategoricalDtype)
+    assert compact['pos'].dtype == compact['signal'].dtype == np.int8
+    assert compact['Close'].dtype == np.float32
+    report = check_tolerance(wide, compact)
+    assert (report['max_rel_err'] <= FLOAT32_RTOL).all()
+    back = from_compact(compact)
+    # whatever datetime unit the wide frame had, the days come back exactly
+    assert pd.DatetimeIndex(back['Date']).equals(pd.DatetimeIndex(wide['Date']))
+    back['Date'] = wide['Date']
+    # object Ticker, whichever string dtype the wide frame used
+    assert back['Ticker'].tolist() == wide['Ticker'].tolist()
+    back['Ticker'] = wide['Ticker']
+    # signal/pos come back as int64, exactly
+    pd.testing.assert_frame_equal(back[['pos', 'signal']], wide[['pos', 'signal']], check_dtype=False)
+    pd.testing.assert_frame_equal(back, wide, check_dtype=False, check_exact=False, rtol=FLOAT32_RTOL)
+
+
+def test_column_outside_float32_stays_wide(wide):
+    wide['tiny'] = 1e-300
+    assert to_compact(wide)['tiny'].dtype == np.float64
+
+
+def test_intraday_dates_rejected(wide):
+    wide['Date'] = wide['Date'] + pd.Timedelta(hours=10)
+    with pytest.raises(ValueError):
+        to_compact(wide)
+
+
+def test_matrix_engine_reads_compact(ragged):
+    pm = PriceMatrix.from_long(ragged)
+    compact = PriceMatrix.from_long(to_compact(ragged))
+    assert compact.dates.equals(pm.dates) and list(compact.tickers) == list(pm.tickers)
+    np.testing.assert_array_equal(compact.present, pm.present)
+    np.testing.assert_allclose(compact.close, pm.close, rtol=FLOAT32_RTOL)
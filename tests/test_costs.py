@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+from costs import CostModel, turnover
+from TradingStrats import BuyAndHold, MovingAverageCrossover, RSIMeanReversion, TimeSeriesMomentum
+
+
+def test_turnover_between_a_tickers_own_bars():
+    present = np.array([[False, True], [True, True], [False, True], [True, False]])
+    pos = np.array([[1, 1], [1, -1], [1, -1], [-1, 1]])
+    # the first column trades on rows 1 and 3 only, the second has no bar on row 3
+    expected = np.array([[0, 1], [1, 2], [0, 0], [2, 0]])
+    np.testing.assert_array_equal(turnover(pos, present=present), expected)
+    np.testing.assert_array_equal(turnover(pos, np.array([1, -1]), present)[1], [0, 2])
+    # a leading config axis shares the same present mask
+    stacked = turnover(np.stack([pos, -pos]), present=present)
+    np.testing.assert_array_equal(stacked, np.stack([expected, expected]))
+
+
+@pytest.mark.parametrize('strategy', [BuyAndHold(), MovingAverageCrossover(5, 20), RSIMeanReversion(),
+                                      TimeSeriesMomentum()], ids=lambda s: type(s).__name__)
+def test_matrix_turnover_matches_pandas(ragged, strategy):
+    strategy.cost_model = CostModel(fee_bps=1, spread_bps=4, slippage_bps=2)
+    expected = strategy.run(ragged.copy())
+    got = strategy.run(ragged.copy(), engine="matrix")
+    for col in ['pos', 'turnover', 'net_rtn']:
+        np.testing.assert_allclose(got[col].to_numpy(np.float64), expected[col].to_numpy(np.float64),
+                                   rtol=1e-12, err_msg=col)
+
+
+def test_turnover_independent_of_ticker_blocks(ragged):
+    # a ticker's turnover doesn't depend on which other tickers share its matrix
+    strategy = BuyAndHold(cost_model=CostModel(fee_bps=1))
+    full = strategy.run(ragged.copy(), engine="matrix")
+    for tickers in [['AAA', 'BBB'], ['CCC', 'DDD']]:
+        block = ragged[ragged['Ticker'].isin(tickers)]
+        got = strategy.run(block.copy(), engine="matrix")
+        np.testing.assert_array_equal(got['turnover'].to_numpy(), full.loc[block.index, 'turnover'].to_numpy())
+        np.testing.assert_array_equal(got['net_rtn'].to_numpy(), full.loc[block.index, 'net_rtn'].to_numpy())
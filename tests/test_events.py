@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+from matrix_engine import PriceMatrix, compute_returns_matrix
+from events import position_events, last_values, events_at, expand_events, trade_list
+from TradingStrats import MovingAverageCrossover
+
+
+@pytest.fixture
+def run(ragged):
+    """The ragged universe's price matrix and its MA crossover results."""
+    pm = PriceMatrix.from_long(ragged)
+    signals = MovingAverageCrossover(5, 20).compute_signals_matrix(pm)
+    return pm, {**signals, **compute_returns_matrix(pm, signals['pos'])}
+
+
+def test_events_expand_to_dense(run):
+    pm, results = run
+    events = position_events(pm, results)
+    # one row per present bar whose signal or pos differs from the ticker's previous bar
+    expected = 0
+    for j in range(len(pm.tickers)):
+        rows = np.flatnonzero(pm.present[:, j])
+        changed = [np.diff(np.concatenate([[0], results[col][rows, j]])) != 0 for col in ('signal', 'pos')]
+        expected += (changed[0] | changed[1]).sum()
+    assert len(events) == expected < pm.present.sum()
+    dense = expand_events(events, pm.dates, pm.tickers)
+    for col in ('signal', 'pos'):
+        np.testing.assert_array_equal(dense[col][pm.present], results[col][pm.present], err_msg=col)
+    # a single lookup: the values in force, also between events
+    at = events_at(events, ['BBB', 'DDD'], [pm.dates[150], pm.dates[0]])
+    np.testing.assert_array_equal(at['pos'], [results['pos'][150, 1], 0])
+
+
+def test_events_continue_from_last(run):
+    pm, results = run
+    k = 200
+    head = position_events(PriceMatrix(pm.dates[:k], pm.tickers, pm.close[:k]), {c: v[:k] for c, v in results.items()})
+    tail = position_events(PriceMatrix(pm.dates[k:], pm.tickers, pm.close[k:]), {c: v[k:] for c, v in results.items()},
+                           last_values(head, pm.tickers))
+    joined = pd.concat([head, tail]).sort_values(['Ticker', 'Date'], kind='stable').reset_index(drop=True)
+    pd.testing.assert_frame_equal(joined, position_events(pm, results))
+
+
+def test_trade_list_matches_position_runs(run):
+    pm, results = run
+    rtn = PriceMatrix(pm.dates, pm.tickers, results['strat_rtn'])
+    trades = trade_list(position_events(pm, results), rtn)
+    expected = []
+    for j, ticker in enumerate(pm.tickers):
+        rows = np.flatnonzero(pm.present[:, j])
+        pos = results['pos'][rows, j]
+        starts = np.flatnonzero(np.diff(np.concatenate([[0], pos])) != 0)
+        for a, b in zip(starts, np.append(starts[1:], len(rows))):
+            if pos[a] == 0:
+                continue
+            # the trade earns every bar from its entry up to the next change
+            end = rows[b] if b < len(rows) else len(pm.dates)
+            held = results['strat_rtn'][rows[a]:end, j]
+            held = held[~np.isnan(held)]
+            expected.append((ticker, pos[a], pm.dates[rows[a]], pm.dates[rows[b]] if b < len(rows) else pd.NaT,
+                             len(held), np.prod(1 + held) - 1))
+    expected = pd.DataFrame(expected, columns=['Ticker', 'pos', 'entry_date', 'exit_date', 'bars', 'return'])
+    assert len(trades) == len(expected) > 0
+    # still open: held on the ticker's last bar, also one that has delisted since
+    last_pos = [results['pos'][np.flatnonzero(pm.present[:, j])[-1], j] for j in range(len(pm.tickers))]
+    assert trades['exit_date'].isna().sum() == np.count_nonzero(last_pos)
+    for col in ['Ticker', 'pos', 'entry_date', 'exit_date', 'bars']:
+        np.testing.assert_array_equal(trades[col].to_numpy(), expected[col].to_numpy(), err_msg=col)
+    # differences of running log sums: absolute precision for near-flat trades
+    np.testing.assert_allclose(trades['return'], expected['return'], rtol=1e-12, atol=1e-12)
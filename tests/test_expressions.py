@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+from matrix_engine import PriceMatrix
+from indicators import IndicatorCache, sma
+from expressions import Evaluator, close, lag, param, plan, rsi, vote
+from expressions import sma as sma_expr
+
+
+def test_plan_shares_repeated_subexpressions():
+    fast, slow = sma_expr(5), sma_expr(20)
+    cross = fast > slow
+    exprs = [cross & (rsi(14) < 70), (rsi(14) < 70) & (fast > slow), lag(cross), vote(cross, rsi(14) > 50)]
+    order = plan(exprs)
+    keys = [node.key for node in order]
+    assert len(keys) == len(set(keys))
+    # the first two are one node (and is commutative), built from the same sma/rsi leaves
+    assert exprs[0].key == exprs[1].key
+    assert sum(node.op == 'sma' for node in order) == 2
+    assert sum(node.op == 'rsi' for node in order) == 1
+    # children come before the nodes using them
+    position = {key: i for i, key in enumerate(keys)}
+    for node in order:
+        assert all(position[child.key] < position[node.key] for child in node.children())
+
+
+def test_evaluator_matches_separate_evaluation(ragged):
+    pm = PriceMatrix.from_long(ragged)
+    cross = sma_expr(param('fast', 5)) > sma_expr(20)
+    exprs = [cross.bind(), (cross & (rsi(14) < 70)).bind(), (sma_expr(5) - sma_expr(20)) / close]
+    evaluator = Evaluator(pm, IndicatorCache())
+    batch = evaluator.evaluate(exprs)
+    # sma(5), sma(20) and the comparison are each used twice but computed once
+    assert evaluator.stats() == {'nodes': 9, 'references': 12}
+    for expr, values in zip(exprs, batch):
+        alone = Evaluator(pm, IndicatorCache()).evaluate([expr])[0]
+        np.testing.assert_array_equal(values, alone)
+    with np.errstate(invalid='ignore'):
+        np.testing.assert_array_equal(batch[0], sma(pm, 5) > sma(pm, 20))
+
+
+def test_unbound_param_raises(ragged):
+    with pytest.raises(ValueError):
+        Evaluator(PriceMatrix.from_long(ragged)).evaluate([sma_expr(param('window', 5))])
@@ -0,0 +1,34 @@
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import indicators
+from indicators import IndicatorCache
+from matrix_engine import PriceMatrix, rolling_mean
+
+
+def test_cache_hits_and_evicts_oldest(ragged):
+    pm = PriceMatrix.from_long(ragged)
+    cache = IndicatorCache(max_bytes=2 * pm.close.nbytes)
+    first = indicators.sma(pm, 5, cache)
+    np.testing.assert_array_equal(first, rolling_mean(pm.close, 5))
+    assert indicators.sma(pm, 5, cache) is first
+    assert not first.flags.writeable
+    indicators.sma(pm, 10, cache)
+    indicators.sma(pm, 20, cache)
+    # sma(5) was the oldest entry once the third did not fit
+    assert cache.stats() == {'entries': 2, 'nbytes': 2 * pm.close.nbytes, 'max_bytes': cache.max_bytes,
+                             'hits': 1, 'misses': 3}
+    assert indicators.sma(pm, 5, cache) is not first
+
+
+def test_cache_shared_between_threads(ragged):
+    pm = PriceMatrix.from_long(ragged)
+    # room for three of the eight windows: threads keep evicting each other's entries
+    cache = IndicatorCache(max_bytes=3 * pm.close.nbytes)
+    windows = [2, 3, 5, 8, 13, 21, 34, 55] * 25
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(lambda w: (w, indicators.sma(pm, w, cache)), windows))
+    for w, arr in results:
+        np.testing.assert_array_equal(arr, rolling_mean(pm.close, w))
+    stats = cache.stats()
+    assert stats['hits'] + stats['misses'] == len(windows)
+    assert stats['nbytes'] == stats['entries'] * pm.close.nbytes <= cache.max_bytes
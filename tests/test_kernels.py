@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+import kernels
+from kernels import run_kernel, hysteresis_kernel, stops_kernel, hysteresis_reference, stops_reference
+
+
+def _inputs(n_tickers, n_dates=400, seed=0):
+    rng = np.random.default_rng(seed)
+    close = np.exp(np.cumsum(rng.normal(0, 0.02, (n_dates, n_tickers)), axis=0))
+    raw = np.zeros_like(close)
+    raw[20:] = np.sign(close[20:] - close[:-20])
+    rsi = rng.uniform(0, 100, (n_dates, n_tickers))
+    return close, raw, rsi
+
+
+# one universe on each side of LOOP_MAX_TICKERS
+@pytest.fixture(params=[3, kernels.LOOP_MAX_TICKERS + 8])
+def n_tickers(request):
+    return request.param
+
+
+@pytest.mark.parametrize('use_numba', [False, True])
+def test_hysteresis_matches_reference(n_tickers, use_numba):
+    if use_numba:
+        pytest.importorskip('numba')
+    _, _, rsi = _inputs(n_tickers)
+    got = run_kernel(hysteresis_kernel, (rsi,), (30, 70), 1, use_numba=use_numba)
+    np.testing.assert_array_equal(got, hysteresis_reference(rsi, 30.0, 70.0))
+
+
+@pytest.mark.parametrize('use_numba', [False, True])
+@pytest.mark.parametrize('params', [(0.1, 0.15, 5, 60), (0.05, 0, 0, 0), (0, 0.08, 3, 0), (0, 0, 0, 10)])
+def test_stops_matches_reference(n_tickers, use_numba, params):
+    if use_numba:
+        pytest.importorskip('numba')
+    close, raw, _ = _inputs(n_tickers)
+    got = run_kernel(stops_kernel, (close, raw), params, 5, use_numba=use_numba)
+    np.testing.assert_array_equal(got, stops_reference(close, raw, *map(float, params)))
+
+
+def test_numpy_path_matches_loop_path(monkeypatch):
+    # the vectorized per-bar path, forced on a universe the loop would otherwise take
+    close, raw, rsi = _inputs(5)
+    monkeypatch.setattr(kernels, 'LOOP_MAX_TICKERS', 0)
+    np.testing.assert_array_equal(run_kernel(hysteresis_kernel, (rsi,), (30, 70), 1, use_numba=False),
+                                  hysteresis_reference(rsi, 30.0, 70.0))
+    np.testing.assert_array_equal(run_kernel(stops_kernel, (close, raw), (0.1, 0.15, 5, 60), 5, use_numba=False),
+                                  stops_reference(close, raw, 0.1, 0.15, 5.0, 60.0))
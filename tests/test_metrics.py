@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+from metrics import compute_metrics, metric_sums, metrics_from_sums
+
+
+@pytest.fixture
+def series():
+    """Returns, positions and turnover for 3 series over 300 bars, with gaps."""
+    rng = np.random.default_rng(4)
+    rtn = rng.normal(0, 0.01, (300, 3))
+    rtn[:40, 1] = np.nan
+    rtn[250:, 2] = np.nan
+    rtn[rng.random(rtn.shape) < 0.05] = np.nan
+    pos = rng.integers(0, 2, rtn.shape).astype(float)
+    turnover = np.abs(np.diff(pos, axis=0, prepend=0.0))
+    return rtn, pos, turnover
+
+
+@pytest.mark.parametrize('cuts', [[150], [1, 40, 249, 299], [0, 300]])
+def test_folded_sums_match_full_metrics(series, cuts):
+    rtn, pos, turnover = series
+    sums = None
+    for a, b in zip([0] + cuts, cuts + [len(rtn)]):
+        sums = metric_sums(rtn[a:b], pos[a:b], turnover[a:b], last=sums)
+    folded = metrics_from_sums(sums)
+    for name, arr in compute_metrics(rtn, pos, turnover).items():
+        np.testing.assert_allclose(folded[name], arr, rtol=1e-12, err_msg=name)
+
+
+def test_no_dates_gives_nan_metrics():
+    empty = np.empty((0, 2))
+    out = compute_metrics(empty, empty, empty)
+    assert np.isnan(out['total_return']).all() and np.isnan(out['max_drawdown']).all()
+    assert np.isnan(out['sharpe']).all() and (out['days'] == 0).all()
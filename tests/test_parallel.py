@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+from matrix_engine import PriceMatrix, compute_returns_matrix
+from parallel import SharedPriceMatrix, parallel_sweep, run_strategies
+from sweep import sweep
+from TradingStrats import STRATEGY_REGISTRY, BuyAndHold, MovingAverageCrossover, RSIMeanReversion
+
+
+STRATEGIES = {'bh': BuyAndHold(), 'ma': MovingAverageCrossover(5, 20), 'rsi': RSIMeanReversion()}
+
+
+def _assert_same(got, expected):
+    for name, arrays in expected.items():
+        for col, arr in arrays.items():
+            np.testing.assert_array_equal(got[name][col], arr, err_msg=f"{name}.{col}")
+
+
+def test_run_strategies_is_independent_of_workers(ragged):
+    pm = PriceMatrix.from_long(ragged)
+    serial = run_strategies(STRATEGIES, pm)
+    _assert_same(run_strategies(STRATEGIES, pm, workers=3, ticker_blocks=4), serial)
+    # stitched ticker blocks give what each strategy computes on the whole matrix
+    for name, strat in STRATEGIES.items():
+        signals = strat.compute_signals_matrix(pm)
+        _assert_same({name: serial[name]},
+                     {name: {**signals, **compute_returns_matrix(pm, signals['pos'], strat.cost_model)}})
+
+
+def test_shared_pool_runs_successive_matrices(ragged):
+    blocks = [ragged[ragged['Ticker'].isin(tickers)] for tickers in (['AAA', 'BBB'], ['CCC', 'DDD'], ['AAA'])]
+    shared = SharedPriceMatrix(None, 2)
+    with shared:
+        for block in blocks:
+            pm = PriceMatrix.from_long(block)
+            _assert_same(run_strategies(STRATEGIES, pm, workers=2, shared=shared), run_strategies(STRATEGIES, pm))
+
+
+def test_parallel_sweep_of_composite(ragged):
+    # registered composites are runtime classes: they have to reach the workers by template
+    cls = STRATEGY_REGISTRY['vote_mavg_rsi_momentum']
+    grid = {'short_win': [5, 10], 'long_win': [20], 'period': [14], 'lookback': [10, 30]}
+    pd.testing.assert_frame_equal(parallel_sweep(cls, ragged, workers=2, chunk_size=1, **grid),
+                                  parallel_sweep(cls, ragged, **grid))
+
+
+def test_parallel_sweep_matches_sweep_with_costs(ragged):
+    grid = {'short_win': [5, 10, 15], 'long_win': [20, 40]}
+    costs = {'spread_bps': [0, 10], 'fee_bps': [1]}
+    expected = sweep(MovingAverageCrossover, ragged, costs=costs, **grid)
+    pd.testing.assert_index_equal(expected.index, pd.RangeIndex(len(expected)))
+    pd.testing.assert_frame_equal(parallel_sweep(MovingAverageCrossover, ragged, workers=2, chunk_size=2, costs=costs,
+                                                 **grid), expected)
@@ -0,0 +1,92 @@
+import pickle
+import numpy as np
+import pandas as pd
+import pytest
+import precompute_signals
+from precompute_signals import precompute_signals as precompute, STATE_FILE
+from signal_store import load_signals, load_events
+from metrics import load_metrics
+from aggregates import AGGREGATES_PATH
+
+
+@pytest.fixture
+def universe(tmp_path, monkeypatch):
+    """Daily CSVs for a ragged universe in tmp_path/data, with tmp_path as the working directory."""
+    rng = np.random.default_rng(1)
+    dates = pd.bdate_range("2019-01-01", periods=420)
+    (tmp_path / "data").mkdir()
+    for j, (a, b) in enumerate([(0, 420), (40, 420), (130, 420), (0, 350), (300, 420), (410, 420)]):
+        close = 50 * np.exp(np.cumsum(rng.normal(0, 0.02, b - a)))
+        pd.DataFrame({'Date': dates[a:b].strftime("%Y-%m-%d"), 'Open': close, 'High': close,
+                      'Low': close, 'Close': close, 'Volume': 1000}).to_csv(tmp_path / "data" / f"T{j}.csv", index=False)
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def _outputs():
+    with open(STATE_FILE, 'rb') as f:
+        state = pickle.load(f)
+    return {
+        'signals': load_signals(),
+        'events': load_events().sort_values(['strategy', 'Ticker', 'Date']).reset_index(drop=True),
+        'metrics': load_metrics().sort_values(['strategy', 'Ticker']).reset_index(drop=True),
+        'aggregates': {f.name: np.load(f) for f in sorted(AGGREGATES_PATH.glob("*.npy"))},
+        'state': state,
+    }
+
+
+@pytest.mark.parametrize('chunk_size, workers', [(2, 1), (3, 2)])
+def test_chunked_matches_single_block(universe, chunk_size, workers):
+    precompute()
+    whole = _outputs()
+    precompute(workers=workers, chunk_size=chunk_size)
+    chunked = _outputs()
+
+    # per-ticker values exactly; portfolio sums may add the tickers in another order
+    pd.testing.assert_frame_equal(chunked['signals'], whole['signals'], check_exact=True)
+    pd.testing.assert_frame_equal(chunked['events'], whole['events'], check_exact=True)
+    pd.testing.assert_frame_equal(chunked['metrics'], whole['metrics'], check_exact=False, rtol=1e-12)
+    assert chunked['aggregates'].keys() == whole['aggregates'].keys()
+    for name, arr in whole['aggregates'].items():
+        if arr.dtype.kind == 'f':
+            np.testing.assert_allclose(chunked['aggregates'][name], arr, rtol=1e-12, err_msg=name)
+        else:
+            np.testing.assert_array_equal(chunked['aggregates'][name], arr, err_msg=name)
+    for name, carry in whole['state']['strategies'].items():
+        np.testing.assert_array_equal(chunked['state']['strategies'][name]['pos'], carry['pos'])
+        np.testing.assert_allclose(chunked['state']['strategies'][name]['cum'], carry['cum'], rtol=1e-12)
+
+
+def test_update_matches_full_run(universe, monkeypatch):
+    full = {f: pd.read_csv(f) for f in sorted((universe / "data").glob("*.csv"))}
+    # the last 15 bars arrive after the first run: T3 has delisted by then, T5 lists among them
+    cutoff = sorted(set().union(*(frame['Date'] for frame in full.values())))[-15]
+    for f, frame in full.items():
+        frame[frame['Date'] < cutoff].to_csv(f, index=False)
+    precompute()
+    for f, frame in full.items():
+        frame.to_csv(f, index=False)
+    read = []
+    wrangle = precompute_signals.wrangle_data
+    monkeypatch.setattr(precompute_signals, 'wrangle_data', lambda *a, **kw: read.append(wrangle(*a, **kw)) or read[-1])
+    precompute_signals.update_signals()
+    monkeypatch.setattr(precompute_signals, 'wrangle_data', wrangle)
+    # only the new bars (and the last stored date's) are read
+    assert sum(len(df) for df in read) <= sum((frame['Date'] >= cutoff).sum() + 1 for frame in full.values())
+    updated = _outputs()
+    assert updated['state']['part'] == 1
+    precompute()
+    whole = _outputs()
+
+    pd.testing.assert_frame_equal(updated['signals'], whole['signals'], check_exact=False, rtol=1e-12)
+    pd.testing.assert_frame_equal(updated['events'], whole['events'], check_exact=True)
+    pd.testing.assert_frame_equal(updated['metrics'], whole['metrics'], check_exact=False, rtol=1e-12)
+    for name, arr in whole['aggregates'].items():
+        np.testing.assert_allclose(updated['aggregates'][name].astype(float), arr.astype(float), rtol=1e-12, err_msg=name)
+    for name, carry in whole['state']['strategies'].items():
+        np.testing.assert_array_equal(updated['state']['strategies'][name]['pos'], carry['pos'])
+        np.testing.assert_allclose(updated['state']['strategies'][name]['cum'], carry['cum'], rtol=1e-12)
+        for kind, arr in carry['metrics'].items():
+            np.testing.assert_allclose(updated['state']['strategies'][name]['metrics'][kind], arr, rtol=1e-12, err_msg=kind)
+    assert updated['state']['base'] == whole['state']['base']
+    np.testing.assert_array_equal(updated['state']['tail_close'], whole['state']['tail_close'])
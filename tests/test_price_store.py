@@ -0,0 +1,59 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from price_store import ensure_store, load_long, load_matrix, read_ticker
+
+
+@pytest.fixture
+def csvs(ragged, tmp_path):
+    """The ragged universe as data/<ticker>.csv with OHLCV columns; returns (data dir, store dir)."""
+    data = tmp_path / "data"
+    data.mkdir()
+    for ticker, frame in ragged.groupby('Ticker'):
+        close = frame['Close'].to_numpy()
+        pd.DataFrame({'Date': frame['Date'].dt.strftime("%Y-%m-%d"), 'Open': close * 0.99, 'High': close * 1.01,
+                      'Low': close * 0.98, 'Close': close, 'Volume': np.arange(len(frame)) * 100}
+                     ).to_csv(data / f"{ticker}.csv", index=False)
+    return data, tmp_path / "store"
+
+
+def _read_csvs(data, tickers):
+    return pd.concat([pd.read_csv(data / f"{t}.csv", parse_dates=['Date']).assign(Ticker=t) for t in tickers],
+                     ignore_index=True)
+
+
+def test_load_long_matches_csvs(csvs):
+    data, store = csvs
+    tickers = ['AAA', 'CCC', 'DDD']
+    pd.testing.assert_frame_equal(load_long(tickers, data_dir=data, store=store), _read_csvs(data, tickers))
+    pd.testing.assert_frame_equal(read_ticker('BBB', data, store), pd.read_csv(data / "BBB.csv", parse_dates=['Date']))
+    # from a start date on: the same rows as filtering the full read
+    start = pd.Timestamp("2020-11-02")
+    full = _read_csvs(data, tickers)
+    pd.testing.assert_frame_equal(load_long(tickers, ['Close'], data, store, start=start),
+                                  full.loc[full['Date'] >= start, ['Date', 'Close', 'Ticker']].reset_index(drop=True))
+
+
+def test_load_matrix_has_nan_where_no_bar(csvs, ragged):
+    data, store = csvs
+    dates, close = load_matrix(['DDD', 'AAA'], data_dir=data, store=store)
+    assert dates.equals(pd.DatetimeIndex(np.sort(ragged['Date'].unique())))
+    ddd = pd.read_csv(data / "DDD.csv", parse_dates=['Date'])
+    np.testing.assert_array_equal(close[dates.get_indexer(ddd['Date']), 0], ddd['Close'].to_numpy())
+    assert np.isnan(close[:, 0]).sum() == len(dates) - len(ddd)
+    assert not np.isnan(close[:, 1]).any()
+
+
+def test_store_rebuilds_on_changed_csv(csvs):
+    data, store = csvs
+    built = ensure_store(data, store)
+    # touched but unchanged: kept, with the new mtime remembered
+    os.utime(data / "AAA.csv", ns=(1, 1))
+    assert ensure_store(data, store)['sources']['AAA']['mtime_ns'] == 1
+    frame = pd.read_csv(data / "AAA.csv")
+    frame.loc[0, 'Close'] = 123.0
+    frame.to_csv(data / "AAA.csv", index=False)
+    rebuilt = ensure_store(data, store)
+    assert rebuilt['sources']['AAA']['sha1'] != built['sources']['AAA']['sha1']
+    assert read_ticker('AAA', data, store)['Close'].iloc[0] == 123.0
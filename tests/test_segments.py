@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+import pytest
+from matrix_engine import PriceMatrix, Segments, ewm_mean
+from TradingStrats import RSIMeanReversion
+
+
+def _per_ticker(df, fn):
+    return df.groupby('Ticker', sort=False)['Close'].transform(fn).to_numpy()
+
+
+@pytest.mark.parametrize('window', [1, 5, 20])
+def test_rolling_mean_matches_groupby(ragged, window):
+    got = Segments.from_frame(ragged).rolling_mean(ragged['Close'], window)
+    expected = _per_ticker(ragged, lambda x: x.rolling(window, min_periods=window).mean())
+    np.testing.assert_allclose(got, expected, rtol=1e-12)
+
+
+@pytest.mark.parametrize('alpha, min_periods', [(1 / 14, 14), (2 / 3, 0), (0.01, 5), (1.0, 0)])
+def test_ewm_mean_matches_groupby(ragged, alpha, min_periods):
+    got = Segments.from_frame(ragged).ewm_mean(ragged['Close'], alpha, min_periods)
+    expected = _per_ticker(ragged, lambda x: x.ewm(alpha=alpha, min_periods=min_periods, adjust=False).mean())
+    np.testing.assert_allclose(got, expected, rtol=1e-12)
+
+
+def test_ewm_mean_resumes_from_state(ragged):
+    close = PriceMatrix.from_long(ragged).close
+    state = {}
+    parts = [ewm_mean(close[:100], 0.1, 14, state), ewm_mean(close[100:], 0.1, 14, state)]
+    np.testing.assert_allclose(np.vstack(parts), ewm_mean(close, 0.1, 14), rtol=1e-12)
+    assert (state['count'] == (~np.isnan(close)).sum(axis=0)).all()
+
+
+def test_rsi_matches_groupby(ragged):
+    period = 14
+    delta = ragged.groupby('Ticker', sort=False)['Close'].diff()
+    # a ticker's first bar counts as a zero move
+    gains = pd.DataFrame({'Ticker': ragged['Ticker'], 'gain': delta.where(delta > 0, 0.0),
+                          'loss': (-delta).where(delta < 0, 0.0)})
+    avg = gains.groupby('Ticker', sort=False)[['gain', 'loss']].transform(
+        lambda x: x.ewm(alpha=1 / period, min_periods=period, adjust=False).mean())
+    expected = (100 - 100 / (1 + avg['gain'] / avg['loss'])).to_numpy()
+
+    strategy = RSIMeanReversion(period=period)
+    got = strategy.compute_signals(ragged.copy())['rsi'].to_numpy()
+    np.testing.assert_allclose(got, expected, rtol=1e-10)
+    pm = PriceMatrix.from_long(ragged)
+    got_matrix = pm.to_long(strategy.compute_signals_matrix(pm)['rsi'])
+    np.testing.assert_allclose(got_matrix, expected, rtol=1e-10)
@@ -0,0 +1,137 @@
+import asyncio
+import time
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("fastapi")
+import service as service_module
+from service import BacktestRequest, BacktestService, ResultCache, canonical_request, run_backtest, _defaults
+from matrix_engine import PriceMatrix
+from metrics import frame_metrics, PORTFOLIO_TICKER
+from portfolio import frame_portfolio_daily, get_portfolio
+from TradingStrats import STRATEGY_REGISTRY, get_strategy
+
+
+def test_defaults_are_strategy_parameters():
+    for cls in STRATEGY_REGISTRY.values():
+        assert not {'cost_model', 'portfolio'} & set(_defaults(cls))
+
+
+def test_portfolio_request_validation(ragged):
+    tickers = sorted(ragged['Ticker'].unique())
+    canonical = canonical_request(BacktestRequest(strategy='mavg', portfolio='inverse_vol',
+                                                  portfolio_params={'lookback': 20}), tickers)
+    assert canonical['portfolio'] == {'name': 'inverse_vol', 'params': {'lookback': 20, 'rebalance_freq': 'M'}}
+    assert canonical_request(BacktestRequest(strategy='mavg'), tickers)['portfolio']['name'] == 'equal'
+    with pytest.raises(ValueError):
+        canonical_request(BacktestRequest(strategy='mavg', portfolio='nope'), tickers)
+    with pytest.raises(ValueError):
+        canonical_request(BacktestRequest(strategy='mavg', portfolio_params={'lookback': 5}), tickers)
+    with pytest.raises(ValueError):
+        canonical_request(BacktestRequest(strategy='mavg', portfolio='fixed'), tickers)
+
+
+@pytest.mark.parametrize('weighting', ['equal', 'inverse_vol'])
+def test_backtest_applies_portfolio(ragged, weighting):
+    tickers = sorted(ragged['Ticker'].unique())
+    request = canonical_request(BacktestRequest(strategy='mavg', params={'short_win': 5, 'long_win': 20},
+                                                portfolio=weighting), tickers)
+    result = run_backtest(request, PriceMatrix.from_long(ragged))
+
+    portfolio = get_portfolio(weighting, **request['portfolio']['params'])
+    strat_df = get_strategy('mavg', portfolio=portfolio, short_win=5, long_win=20).run(ragged, engine='matrix')
+    daily = frame_portfolio_daily(strat_df, portfolio).to_numpy()
+    curve = np.nancumprod(1 + daily)
+    curve[np.isnan(daily)] = np.nan
+    np.testing.assert_allclose(np.array(result['port_cumulative_rtn'], dtype=float), curve, rtol=1e-12)
+
+    expected = frame_metrics(strat_df, strategy='mavg', portfolio=portfolio).set_index('Ticker')
+    got = pd.DataFrame(result['metrics']).set_index('Ticker')
+    for col in ['total_return', 'sharpe', 'max_drawdown', 'exposure', 'turnover']:
+        np.testing.assert_allclose(got.loc[PORTFOLIO_TICKER, col], expected.loc[PORTFOLIO_TICKER, col], rtol=1e-9)
+    if weighting == 'equal':
+        # the same row as the unweighted equal-weight portfolio
+        unweighted = frame_metrics(strat_df, strategy='mavg').set_index('Ticker')
+        np.testing.assert_allclose(got.loc[PORTFOLIO_TICKER, 'total_return'],
+                                   unweighted.loc[PORTFOLIO_TICKER, 'total_return'], rtol=1e-9)
+        np.testing.assert_allclose(got.loc[PORTFOLIO_TICKER, 'exposure'],
+                                   unweighted.loc[PORTFOLIO_TICKER, 'exposure'], rtol=1e-9)
+
+
+@pytest.fixture
+def service(ragged, tmp_path, monkeypatch):
+    """An in-process BacktestService (cache of 2) over the ragged universe as data/*.csv."""
+    (tmp_path / "data").mkdir()
+    for ticker, frame in ragged.groupby('Ticker'):
+        frame[['Date', 'Close']].assign(Date=frame['Date'].dt.strftime("%Y-%m-%d")).to_csv(
+            tmp_path / "data" / f"{ticker}.csv", index=False)
+    monkeypatch.chdir(tmp_path)
+    return BacktestService(workers=0, cache_size=2)
+
+
+def test_empty_window_is_rejected(service):
+    last = service.pm.dates[-1]
+    for start, end, tickers in [
+        ((last + pd.Timedelta(days=7)).strftime('%Y-%m-%d'), None, None),
+        ('2020-06-01', '2020-03-01', None),
+        # DDD lists on the 291st bar
+        (None, service.pm.dates[100].strftime('%Y-%m-%d'), ['DDD']),
+    ]:
+        with pytest.raises(ValueError):
+            canonical_request(BacktestRequest(strategy='mavg', start=start, end=end, tickers=tickers),
+                              service.tickers, service.pm)
+    request = canonical_request(BacktestRequest(strategy='mavg', start=last.strftime('%Y-%m-%d'), tickers=['DDD']),
+                                service.tickers, service.pm)
+    assert run_backtest(request, service.pm)['dates'] == [last.strftime('%Y-%m-%d')]
+
+
+def test_identical_requests_run_once(service, monkeypatch):
+    calls = []
+
+    def slow_backtest(request, pm=None):
+        calls.append(request)
+        time.sleep(0.2)
+        return run_backtest(request, pm)
+
+    monkeypatch.setattr(service_module, 'run_backtest', slow_backtest)
+
+    async def clients():
+        request = BacktestRequest(strategy='mavg', params={'short_win': 5, 'long_win': 20})
+        # the same backtest, spelled with its defaults filled in
+        same = BacktestRequest(strategy='mavg', params={'short_win': 5, 'long_win': 20}, portfolio='equal')
+        return await asyncio.gather(*[service.backtest(r) for r in [request, same, request, same]])
+
+    results = asyncio.run(clients())
+    assert len(calls) == 1
+    assert service.coalesced == 3
+    assert all(result is results[0] for result in results)
+    assert service.stats()['inflight'] == 0
+    # finished: now served from the cache
+    asyncio.run(service.backtest(BacktestRequest(strategy='mavg', params={'short_win': 5, 'long_win': 20})))
+    assert len(calls) == 1
+    assert service.cache.stats()['hits'] == 1
+
+
+def test_cache_evicts_least_recently_used(service, monkeypatch):
+    calls = []
+    monkeypatch.setattr(service_module, 'run_backtest', lambda request, pm=None: calls.append(request) or {'n': len(calls)})
+    requests = [BacktestRequest(strategy='mavg', params={'short_win': w}) for w in (5, 6, 7)]
+
+    async def run(*indices):
+        return [await service.backtest(requests[i]) for i in indices]
+
+    # 0 is used again before 2 arrives, so 1 is the one dropped
+    assert asyncio.run(run(0, 1, 0, 2, 0, 1)) == [{'n': 1}, {'n': 2}, {'n': 1}, {'n': 3}, {'n': 1}, {'n': 4}]
+    assert service.cache.stats() == {'entries': 2, 'max_entries': 2, 'hits': 2, 'misses': 4}
+
+
+def test_result_cache():
+    cache = ResultCache(max_entries=2)
+    cache.put('a', {'a': 1})
+    cache.put('b', {'b': 1})
+    assert cache.get('a') == {'a': 1}
+    cache.put('c', {'c': 1})
+    assert cache.get('b') is None
+    assert cache.get('a') == {'a': 1} and cache.get('c') == {'c': 1}
+    assert cache.stats() == {'entries': 2, 'max_entries': 2, 'hits': 3, 'misses': 1}
@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+import pytest
+from matrix_engine import PriceMatrix, compute_returns_matrix
+from precompute_signals import assemble_output, _events
+from signal_store import reset_store, write_part, write_events, load_signals, date_bounds
+from TradingStrats import MovingAverageCrossover
+
+
+@pytest.fixture
+def store(ragged, tmp_path):
+    """The ragged universe's MA crossover rows as a signal store: part 0 up to a date, part 1 after it."""
+    pm = PriceMatrix.from_long(ragged)
+    signals = MovingAverageCrossover(5, 20).compute_signals_matrix(pm)
+    results = {'ma': {**signals, **compute_returns_matrix(pm, signals['pos'])}}
+    out = assemble_output(ragged, pm, results)
+    path = tmp_path / "signals.parquet"
+    reset_store(path)
+    split = pm.dates[200]
+    write_part(out[out['Date'] < split], 0, path)
+    write_part(out[out['Date'] >= split], 1, path)
+    write_events(_events(pm, results), path)
+    return path
+
+
+def test_partitions_per_ticker(store, ragged):
+    assert sorted(p.name for p in store.glob("Ticker=*")) == [f"Ticker={t}" for t in sorted(ragged['Ticker'].unique())]
+    # DDD lists after the split, so it only has the update's part
+    assert [p.name[:10] for p in sorted((store / "Ticker=DDD").iterdir())] == ['part-00001']
+    assert date_bounds(store) == (ragged['Date'].min(), ragged['Date'].max())
+
+
+def test_filtered_reads_match_full_run(store, ragged):
+    expected = MovingAverageCrossover(5, 20).run(ragged.copy(), engine="matrix")
+    expected = expected.sort_values(['Ticker', 'Date']).reset_index(drop=True)
+    start, end = ragged['Date'].sort_values().iloc[[100, -200]]
+    got = load_signals('ma', tickers=['BBB', 'CCC'], start=start, end=end, path=store)
+    rows = expected['Ticker'].isin(['BBB', 'CCC']) & expected['Date'].between(start, end)
+    want = expected[rows].reset_index(drop=True)
+    assert list(got['Ticker'].unique()) == ['BBB', 'CCC']
+    pd.testing.assert_series_equal(got['Date'], want['Date'], check_names=False)
+    for col in ['signal', 'pos', 'strat_rtn', 'turnover', 'net_rtn', 'cumulative_rtn']:
+        np.testing.assert_allclose(got[f'{col}_ma'].astype(float), want[col].astype(float), rtol=1e-12, err_msg=col)
+    # no filters: every row of every ticker
+    assert len(load_signals(path=store)) == len(ragged)
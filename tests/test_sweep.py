@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+from sweep import param_grid, sweep
+from TradingStrats import BuyAndHold, MovingAverageCrossover, RSIMeanReversion, TimeSeriesMomentum
+from costs import CostModel
+
+
+def test_param_grid_takes_only_strategy_parameters():
+    assert list(param_grid(BuyAndHold).columns) == []
+    assert list(param_grid(MovingAverageCrossover, short_win=[5]).columns) == ['short_win', 'long_win']
+    # other classes keep every parameter, e.g. for a cost grid
+    assert list(param_grid(CostModel, fee_bps=[1])) == ['fee_bps', 'spread_bps', 'slippage_bps']
+
+
+def test_sweep_buy_and_hold(ragged):
+    out = sweep(BuyAndHold, ragged)
+    assert list(out.columns) == ['total_return', 'sharpe', 'max_drawdown']
+    assert len(out) == 1
+
+
+def test_cost_grid_rows(ragged):
+    costs = {'spread_bps': [0, 10]}
+    out = sweep(MovingAverageCrossover, ragged, costs=costs, short_win=[5, 10], long_win=[20])
+    pd.testing.assert_index_equal(out.index, pd.RangeIndex(4))
+    assert out[['short_win', 'spread_bps']].values.tolist() == [[5, 0], [5, 10], [10, 0], [10, 10]]
+    # each row matches a sweep of its config under that single cost model
+    for spread in costs['spread_bps']:
+        single = sweep(MovingAverageCrossover, ragged, costs={'spread_bps': [spread]}, short_win=[5, 10], long_win=[20])
+        rows = out[out['spread_bps'] == spread].reset_index(drop=True)
+        np.testing.assert_allclose(rows['total_return'], single['total_return'], rtol=1e-12)
+
+
+def test_sweep_mixed_window_types():
+    # hourly bars, 7 a day: '2h' is 2 bars, '1D' is 7
+    rng = np.random.default_rng(1)
+    days = pd.bdate_range("2021-01-04", periods=60)
+    stamps = (days.values[:, None] + pd.to_timedelta(np.arange(7) + 9, unit='h').values).ravel()
+    df = pd.concat([pd.DataFrame({'Ticker': t, 'Date': stamps,
+                                  'Close': 100 * np.exp(np.cumsum(rng.normal(0, 0.01, len(stamps))))})
+                    for t in ['AAA', 'BBB']], ignore_index=True)
+    cases = [
+        (MovingAverageCrossover, {'short_win': ['2h', 3, 2], 'long_win': ['1D', 7]},
+         {'short_win': [2, 3, 2], 'long_win': [7, 7]}),
+        (RSIMeanReversion, {'period': ['2h', 2, '1D']}, {'period': [2, 2, 7]}),
+        (TimeSeriesMomentum, {'lookback': ['1D', 3]}, {'lookback': [7, 3]}),
+    ]
+    for cls, grid, in_bars in cases:
+        got = sweep(cls, df, **grid)
+        expected = sweep(cls, df, **in_bars)
+        np.testing.assert_allclose(got['total_return'], expected['total_return'], rtol=1e-12)
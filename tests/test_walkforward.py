@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+from metrics import periods_per_year
+from TradingStrats import MovingAverageCrossover
+from walkforward import walk_forward, walk_windows
+
+
+def test_walk_windows():
+    np.testing.assert_array_equal(walk_windows(10, 4, 2), [[0, 4, 6], [2, 6, 8], [4, 8, 10]])
+    # the last test window is cut at the end of the history
+    np.testing.assert_array_equal(walk_windows(9, 4, 3), [[0, 4, 7], [3, 7, 9]])
+    np.testing.assert_array_equal(walk_windows(10, 4, 2, anchored=True), [[0, 4, 6], [0, 6, 8], [0, 8, 10]])
+    # step beyond the test length leaves gaps between test windows
+    np.testing.assert_array_equal(walk_windows(12, 4, 2, step=3), [[0, 4, 6], [3, 7, 9], [6, 10, 12]])
+    assert walk_windows(4, 4, 2).shape == (0, 3)
+
+
+def _sharpe(daily, periods):
+    daily = daily[~np.isnan(daily)]
+    return daily.mean() / daily.std(ddof=1) * periods ** 0.5
+
+
+def test_walk_forward_picks_best_in_sample(ragged):
+    grid = {'short_win': [3, 5, 10], 'long_win': [20, 40]}
+    table, curve = walk_forward(MovingAverageCrossover, ragged, train=100, test=50, **grid)
+
+    # each config's equal-weight portfolio returns, from full strategy runs
+    configs = [(s, l) for s in grid['short_win'] for l in grid['long_win']]
+    daily = {}
+    for s, l in configs:
+        out = MovingAverageCrossover(s, l).run(ragged.copy(), engine="matrix")
+        daily[s, l] = out.groupby('Date')['strat_rtn'].mean().to_numpy()
+    dates = np.sort(ragged['Date'].unique())
+    periods = periods_per_year(pd.DatetimeIndex(dates))
+    stitched = []
+    for k, (train_start, test_start, test_end) in enumerate(walk_windows(len(dates), 100, 50)):
+        scores = [_sharpe(daily[c][train_start:test_start], periods) for c in configs]
+        best = configs[int(np.argmax(scores))]
+        assert tuple(table.loc[k, ['short_win', 'long_win']]) == best
+        np.testing.assert_allclose(table.loc[k, 'is_sharpe'], max(scores), rtol=1e-9)
+        oos = daily[best][test_start:test_end]
+        np.testing.assert_allclose(table.loc[k, 'oos_total_return'], np.nanprod(1 + oos) - 1, rtol=1e-9)
+        assert table.loc[k, 'test_start'] == dates[test_start]
+        stitched.append(oos)
+    np.testing.assert_allclose(curve.to_numpy(), np.cumprod(1 + np.concatenate(stitched)), rtol=1e-9)
+    assert curve.index[0] == dates[100]
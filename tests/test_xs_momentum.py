@@ -0,0 +1,34 @@
+import numpy as np
+from matrix_engine import PriceMatrix, top_n_mask
+from TradingStrats import CrossSectionalMomentum
+
+
+def test_top_n_mask():
+    scores = np.array([[1.0, 3.0, 2.0, np.nan],
+                       [np.nan, np.nan, 5.0, np.nan],
+                       [np.nan] * 4])
+    np.testing.assert_array_equal(top_n_mask(scores, 2), [[False, True, True, False],
+                                                          [False, False, True, False],
+                                                          [False] * 4])
+    # n beyond the ticker count selects every valid score
+    np.testing.assert_array_equal(top_n_mask(scores, 9), ~np.isnan(scores))
+
+
+def test_holds_top_n_between_rebalances(ragged):
+    pm = PriceMatrix.from_long(ragged)
+    out = CrossSectionalMomentum(lookback=20, top_n=2, rebalance_freq='M').compute_signals_matrix(pm)
+    roc = pm.close[20:] / pm.close[:-20] - 1
+    months = pm.dates.to_period('M')
+    for month in months.unique():
+        rows = np.flatnonzero(months == month)
+        first = rows[0]
+        # held all month: whatever ranked top two by 20-bar ROC on its first row
+        held = out['signal'][rows]
+        assert (held == held[0]).all()
+        scores = roc[first - 20] if first >= 20 else np.full(len(pm.tickers), np.nan)
+        valid = np.flatnonzero(~np.isnan(scores))
+        expected = valid[np.argsort(-scores[valid])][:2]
+        assert sorted(np.flatnonzero(held[0])) == sorted(expected)
+    # positions follow the previous bar's signal, where the ticker had that bar
+    np.testing.assert_array_equal(out['pos'][1:], np.where(pm.present[:-1], out['signal'][:-1], 0))
+    assert (out['pos'][0] == 0).all()
@@ -0,0 +1,111 @@
+import numpy as np
+import pandas as pd
+from matrix_engine import PriceMatrix, bars, pct_change
+from indicators import IndicatorCache
+from sweep import param_grid, portfolio_daily
+from aggregates import PREFIXES, prefix_rows, range_stats
+from costs import CostModel
+from metrics import periods_per_year
+
+# range_stats outputs a window can be ranked on
+METRICS = ['total_return', 'mean', 'sharpe']
+
+
+def walk_windows(n_dates: int, train: int, test: int, step: int = None, anchored: bool = False) -> np.ndarray:
+    """
+    (windows x 3) rows of [train start, test start, test end) on the date axis:
+    `train` bars in-sample followed by `test` bars out-of-sample, moved on by `step`
+    (default `test`, i.e. back-to-back test windows). anchored=True keeps every
+    train window starting at row 0. The last test window may be cut short.
+    """
+    step = step or test
+    test_starts = np.arange(train, n_dates, step)
+    train_starts = np.zeros_like(test_starts) if anchored else test_starts - train
+    return np.stack([train_starts, test_starts, np.minimum(test_starts + test, n_dates)], axis=1)
+
+
+def _prefix(daily: np.ndarray) -> dict[str, np.ndarray]:
+    # (dates + 1) x configs running sums with a leading zero row, as in aggregates
+    rows = prefix_rows(daily.T)
+    return {kind: np.vstack([np.zeros((1, daily.shape[0]), dtype=arr.dtype), arr]) for kind, arr in rows.items()}
+
+
+def _window_stats(prefix: dict, start: np.ndarray, end: np.ndarray, periods: float) -> dict[str, np.ndarray]:
+    delta = {kind: prefix[kind][end] - prefix[kind][start] for kind in PREFIXES}
+    return range_stats(delta['count'], delta['log'], delta['sum'], delta['sumsq'], periods)
+
+
+def walk_forward(strategy_cls, df, train: int, test: int, step: int = None, anchored: bool = False,
+                 metric: str = 'sharpe', cost_model: CostModel = None, batch_size: int = None,
+                 cache: IndicatorCache = None, params: pd.DataFrame = None,
+                 **grid) -> tuple[pd.DataFrame, pd.Series]:
+    """
+    Walk-forward evaluation of a parameter grid (as in sweep), e.g.
+        walk_forward(MovingAverageCrossover, df, train=504, test=63,
+                     short_win=range(5, 100, 5), long_win=range(50, 300, 10))
+    Per window (see walk_windows; sizes in bars or time spans such as '90D') the config with the best in-sample
+    `metric` is picked and scored on the test window that follows.
+    Positions and equal-weight portfolio returns are computed once per config over
+    the full history; window stats are differences of per-config prefix sums, so
+    hundreds of overlapping windows cost no more than one.
+    Returns a per-window table (dates, chosen parameters, in-sample metric and
+    out-of-sample stats) and the stitched out-of-sample equity curve, where each date
+    follows the most recent window whose test period covers it.
+    """
+    if metric not in METRICS:
+        raise ValueError(f"metric must be one of {METRICS}")
+    pm = df if isinstance(df, PriceMatrix) else PriceMatrix.from_long(df)
+    if params is None:
+        params = param_grid(strategy_cls, **grid)
+    train, test = bars(train, pm.dates), bars(test, pm.dates)
+    step = None if step is None else bars(step, pm.dates)
+    periods = periods_per_year(pm.dates)
+    windows = walk_windows(len(pm.dates), train, test, step, anchored)
+    if not len(windows):
+        raise ValueError("History too short for a single train/test window")
+    models = None if cost_model is None else [cost_model]
+    returns = pct_change(pm.close)
+    if batch_size is None:
+        # keep each (configs x dates x tickers) float64 block around 64MB
+        batch_size = max(1, (64 << 20) // (8 * pm.close.size))
+
+    # best in-sample config per window, carried across config batches (first one wins ties)
+    best_score = np.full(len(windows), -np.inf)
+    best = np.zeros(len(windows), dtype=np.int64)
+    for start in range(0, len(params), batch_size):
+        batch = params.iloc[start:start + batch_size]
+        daily = portfolio_daily(pm, strategy_cls.sweep_positions(pm, batch, cache), returns, models)
+        scores = _window_stats(_prefix(daily), windows[:, 0], windows[:, 1], periods)[metric]
+        scores = np.where(np.isnan(scores), -np.inf, scores)
+        top = scores.argmax(axis=1)
+        top_score = scores[np.arange(len(windows)), top]
+        better = top_score > best_score
+        best_score[better] = top_score[better]
+        best[better] = start + top[better]
+
+    # only the chosen configs are needed out of sample; their indicators are cached by now
+    chosen, slot = np.unique(best, return_inverse=True)
+    daily = portfolio_daily(pm, strategy_cls.sweep_positions(pm, params.iloc[chosen], cache), returns, models)
+    oos = _window_stats(_prefix(daily), windows[:, 1], windows[:, 2], periods)
+    oos = {k: v[np.arange(len(windows)), slot] for k, v in oos.items()}
+
+    table = pd.DataFrame({
+        'train_start': pm.dates[windows[:, 0]],
+        'train_end': pm.dates[windows[:, 1] - 1],
+        'test_start': pm.dates[windows[:, 1]],
+        'test_end': pm.dates[windows[:, 2] - 1],
+    })
+    table = pd.concat([table, params.iloc[best].reset_index(drop=True)], axis=1)
+    table[f'is_{metric}'] = np.where(np.isinf(best_score), np.nan, best_score)
+    for k, v in oos.items():
+        table[f'oos_{k}'] = v
+
+    # each test date takes the window that starts latest before it
+    rows = np.arange(windows[0, 1], windows[-1, 2])
+    owner = np.searchsorted(windows[:, 1], rows, side='right') - 1
+    stitched = daily[slot[owner], rows]
+    # with step > test some dates fall between test windows
+    stitched[rows >= windows[owner, 2]] = np.nan
+    curve = np.nancumprod(1 + stitched)
+    curve[np.isnan(stitched)] = np.nan
+    return table, pd.Series(curve, index=pm.dates[rows], name='oos_cumulative_rtn')